@@ -2,13 +2,22 @@
 
 Uses centralized settings from app.config for all configuration.
 URL cleanup uses urllib.parse instead of fragile string replacement.
+Pool sizing and PgBouncer/Neon pooler compatibility are driven by the
+DB_POOL_* settings.
 """
+import asyncio
 import logging
 import ssl as _ssl
+import time
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+from uuid import uuid4
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.orm import DeclarativeBase, Session
 
 from app.config import get_settings
 
@@ -74,20 +83,109 @@ if _is_placeholder:
 else:
     _clean_url, _needs_ssl = _clean_database_url(_raw_url)
 
-# --- SSL Context ---
-connect_args: dict = {}
-if _needs_ssl:
-    ssl_ctx = _ssl.create_default_context()
-    ssl_ctx.check_hostname = False
-    ssl_ctx.verify_mode = _ssl.CERT_NONE
-    connect_args["ssl"] = ssl_ctx
+
+def _ssl_connect_args(needs_ssl: bool) -> dict:
+    """asyncpg connect_args carrying the SSL context, if the URL asked for one."""
+    args: dict = {}
+    if needs_ssl:
+        ssl_ctx = _ssl.create_default_context()
+        ssl_ctx.check_hostname = False
+        ssl_ctx.verify_mode = _ssl.CERT_NONE
+        args["ssl"] = ssl_ctx
+    return args
+
+
+# --- Pool ---
+
+def _is_transaction_pooler(url: str) -> bool:
+    """Resolve db_pool_mode; "auto" detects Neon `-pooler` hosts and PgBouncer's port."""
+    if settings.db_pool_mode != "auto":
+        return settings.db_pool_mode == "transaction"
+    parsed = urlparse(url)
+    return "-pooler" in (parsed.hostname or "") or parsed.port == 6432
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait to obtain a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_time_total += waited
+            if waited > self.wait_time_max:
+                self.wait_time_max = waited
+
+
+def _engine_options(url: str, connect_args: dict) -> dict:
+    """Pool and asyncpg options for the given database URL.
+
+    Mutates `connect_args` with the asyncpg statement cache settings.
+    """
+    if not url.startswith("postgresql"):
+        return {}
+
+    if _is_transaction_pooler(url):
+        # PgBouncer/Neon in transaction mode hands each transaction to a different
+        # server connection, so named prepared statements cannot be reused.
+        connect_args.setdefault("statement_cache_size", 0)
+        connect_args.setdefault("prepared_statement_cache_size", 0)
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    if settings.db_statement_cache_size is not None:
+        connect_args["statement_cache_size"] = settings.db_statement_cache_size
+    if settings.db_prepared_statement_cache_size is not None:
+        connect_args["prepared_statement_cache_size"] = settings.db_prepared_statement_cache_size
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def _create_engine(clean_url: str, needs_ssl: bool) -> AsyncEngine:
+    connect_args = _ssl_connect_args(needs_ssl)
+    return create_async_engine(
+        clean_url,
+        echo=settings.database_echo,
+        connect_args=connect_args,
+        **_engine_options(clean_url, connect_args),
+    )
+
 
 # --- Engine & Session ---
-engine = create_async_engine(
-    _clean_url,
-    echo=settings.database_echo,
-    connect_args=connect_args,
-)
+engine = _create_engine(_clean_url, _needs_ssl)
+
+# Optional read replica; GET endpoints fall back to the primary when unset.
+_raw_read_url = settings.async_database_read_url
+if _raw_read_url:
+    read_engine = _create_engine(*_clean_database_url(_raw_read_url))
+else:
+    read_engine = engine
+
+# Optional direct connection for LISTEN/NOTIFY receivers (app.services.versions).
+# A transaction pooler cannot hold LISTEN; this engine bypasses it, unpooled:
+# each worker keeps one connection open on it for its lifetime.
+_raw_listen_url = settings.async_database_listen_url
+if _raw_listen_url:
+    _listen_url, _listen_ssl = _clean_database_url(_raw_listen_url)
+    listen_engine = create_async_engine(
+        _listen_url, connect_args=_ssl_connect_args(_listen_ssl), poolclass=NullPool,
+    )
+else:
+    listen_engine = engine
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -97,5 +195,94 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+
+class ReadOnlySession(Session):
+    """Sync session behind `ReadSessionLocal`: refuses to flush pending writes."""
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("Attempted to write through a read-only session")
+        super().flush(objects)
+
+
+# Read-only sessions: no autoflush, no expire-on-commit bookkeeping, never committed.
+# On PostgreSQL every transaction is also started READ ONLY.
+_read_bind = (
+    read_engine.execution_options(postgresql_readonly=True)
+    if read_engine.dialect.name == "postgresql"
+    else read_engine
+)
+
+ReadSessionLocal = async_sessionmaker(
+    bind=_read_bind,
+    class_=AsyncSession,
+    sync_session_class=ReadOnlySession,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
+
 class Base(DeclarativeBase):
     pass
+
+
+def dialect_insert(session: AsyncSession, table):
+    """`INSERT` construct supporting `on_conflict_do_*` for the session's dialect."""
+    if session.get_bind().dialect.name == "postgresql":
+        return pg_insert(table)
+    return sqlite_insert(table)
+
+
+def supports_listen(target: AsyncEngine = listen_engine) -> bool:
+    """LISTEN/NOTIFY needs PostgreSQL with session-level connections (not a transaction pooler).
+
+    DATABASE_LISTEN_URL is taken to be direct; NOTIFY itself is sent from
+    ordinary transactions and passes through a pooler.
+    """
+    if target.dialect.name != "postgresql" or _is_placeholder:
+        return False
+    if target is listen_engine and listen_engine is not engine:
+        return True
+    return not _is_transaction_pooler(target.url.render_as_string(hide_password=True))
+
+
+def pool_stats(target: AsyncEngine = engine) -> dict:
+    """Live connection pool figures for operators."""
+    pool = target.pool
+    stats = {"pool_class": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(
+            checkouts=pool.checkouts,
+            wait_time_total_s=round(pool.wait_time_total, 6),
+            wait_time_max_s=round(pool.wait_time_max, 6),
+        )
+    return stats
+
+
+async def warm_up_pool(connections: int) -> int:
+    """Open `connections` pooled connections up front so the first requests
+    after a cold start don't pay TCP + TLS + auth. Failures are logged, not raised.
+
+    Returns the number of connections that were established.
+    """
+    if connections <= 0 or _is_placeholder:
+        return 0
+
+    async def _open_one():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    results = await asyncio.gather(
+        *(_open_one() for _ in range(connections)), return_exceptions=True
+    )
+    failures = [r for r in results if isinstance(r, Exception)]
+    if failures:
+        logger.warning("Pool warm-up: %d/%d connections failed: %s", len(failures), connections, failures[0])
+    return connections - len(failures)
@@ -3,7 +3,8 @@ import hmac
 import json
 import logging
 import time
-from typing import List
+from functools import lru_cache
+from typing import Iterable, List, Optional
 from uuid import UUID
 from urllib.parse import unquote, parse_qs
 
@@ -12,13 +13,23 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.config import get_settings
-from app.database import AsyncSessionLocal
+from app.database import AsyncSessionLocal, ReadSessionLocal
+from app.metrics import register_cache
 from app.models import User, UserRole
+from app.services.cache import TTLCache
+from app.services.versions import bump_versions, versions
 
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+# Verified initData → (telegram user dict, resolved User row, "users" version).
+# Keyed by a digest of the full initData string, never by its embedded `hash`.
+# Entries older than the shared "users" version are reloaded, so a role or
+# store-access change reaches every worker as fast as the version does.
+USERS = "users"
+_auth_cache = TTLCache(maxsize=settings.auth_cache_size, ttl=settings.auth_cache_ttl)
+register_cache("auth", _auth_cache.stats)
 
 
 async def get_db() -> AsyncSession:
@@ -31,11 +42,33 @@ async def get_db() -> AsyncSession:
         raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
 
 
-def _validate_telegram_init_data(init_data: str, bot_token: str) -> dict | None:
+async def get_read_db() -> AsyncSession:
+    """Yield a read-only session for GET endpoints.
+
+    Bound to DATABASE_READ_URL when configured, otherwise to the primary.
+    The session is never committed; closing it rolls back the read transaction.
+    Single-object reads that clients make right after a write (GET an order
+    they just created) use `get_db` instead: the replica may lag behind.
+    """
+    try:
+        async with ReadSessionLocal() as session:
+            yield session
+    except Exception as e:
+        logger.error("DB read session error: %s", e)
+        raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
+
+
+@lru_cache(maxsize=4)
+def _webapp_secret_key(bot_token: str) -> bytes:
+    """secret_key = HMAC-SHA256("WebAppData", bot_token) — constant per token."""
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def _verify_telegram_init_data(init_data: str, bot_token: str) -> tuple[dict, Optional[int]] | None:
     """
     Validate Telegram Web App initData using HMAC-SHA256.
-    Returns the parsed user dict if valid, None otherwise.
-    
+    Returns (user dict, auth_date) if valid, None otherwise.
+
     See: https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
     """
     if not init_data or not bot_token:
@@ -53,8 +86,7 @@ def _validate_telegram_init_data(init_data: str, bot_token: str) -> dict | None:
         data_check_parts.append(f"{key}={val}")
     data_check_string = "\n".join(data_check_parts)
 
-    # HMAC: secret_key = HMAC-SHA256("WebAppData", bot_token)
-    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    secret_key = _webapp_secret_key(bot_token)
     computed_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
 
     if not hmac.compare_digest(computed_hash, received_hash):
@@ -71,6 +103,7 @@ def _validate_telegram_init_data(init_data: str, bot_token: str) -> dict | None:
         return None
 
     # Validate auth_date is not too old (replay protection)
+    auth_date = None
     auth_date_str = parsed.get("auth_date", [None])[0]
     if auth_date_str:
         try:
@@ -78,9 +111,47 @@ def _validate_telegram_init_data(init_data: str, bot_token: str) -> dict | None:
             if time.time() - auth_date > settings.init_data_max_age:
                 return None  # initData too old
         except (ValueError, TypeError):
-            pass
+            auth_date = None
+
+    return user_data, auth_date
+
+
+def _validate_telegram_init_data(init_data: str, bot_token: str) -> dict | None:
+    """
+    Validate Telegram Web App initData using HMAC-SHA256.
+    Returns the parsed user dict if valid, None otherwise.
+    """
+    verified = _verify_telegram_init_data(init_data, bot_token)
+    return verified[0] if verified else None
+
 
-    return user_data
+def _auth_cache_ttl(auth_date: Optional[int]) -> float:
+    """Cache no longer than the initData itself stays acceptable."""
+    if auth_date is None:
+        return settings.auth_cache_ttl
+    return auth_date + settings.init_data_max_age - time.time()
+
+
+async def bump_users_version(db: AsyncSession) -> None:
+    """Invalidate cached auth in every worker; call before committing a change to a User.
+
+    Role and allowed-store edits are rare, so every cached user is reloaded.
+    """
+    await bump_versions(db, USERS)
+
+
+def invalidate_cached_user(user_id) -> int:
+    """Drop this worker's cached auth entries for a user whose row has changed.
+
+    Call after committing any change to a User (role, allowed stores, ...);
+    other workers drop theirs through `bump_users_version()`.
+    """
+    return _auth_cache.discard_where(lambda entry: entry[1].id == user_id)
+
+
+def auth_cache_stats() -> dict:
+    """Hit/miss counters for the initData cache."""
+    return _auth_cache.stats()
 
 
 async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)):
@@ -93,9 +164,18 @@ async def get_current_user(request: Request, db: AsyncSession = Depends(get_db))
     # --- Production path: Telegram initData ---
     init_data = request.headers.get("X-Telegram-Init-Data", "")
     if init_data and settings.bot_token:
-        tg_user = _validate_telegram_init_data(init_data, settings.bot_token)
-        if not tg_user:
+        cache_key = hashlib.sha256(init_data.encode()).digest()
+        cached = _auth_cache.get(cache_key, is_current=lambda entry: entry[2] >= versions.get(USERS))
+        if cached is not None:
+            # Re-attach the cached row without a SELECT so handlers can still modify it
+            return await db.merge(cached[1], load=False)
+        # Taken before the row is read: a change committing in between only makes the tag older
+        users_version = versions.get(USERS)
+
+        verified = _verify_telegram_init_data(init_data, settings.bot_token)
+        if not verified:
             raise HTTPException(status_code=401, detail="Invalid Telegram initData signature")
+        tg_user, auth_date = verified
 
         telegram_id = tg_user.get("id")
         if not telegram_id:
@@ -119,6 +199,8 @@ async def get_current_user(request: Request, db: AsyncSession = Depends(get_db))
             await db.commit()
             await db.refresh(user)
             logger.info("AUTO-REGISTERED user: tg_id=%s, username=%s, role=%s", telegram_id, user.username, user.role.value)
+
+        _auth_cache.set(cache_key, (tg_user, user, users_version), ttl=_auth_cache_ttl(auth_date))
         return user
 
     # --- Development fallback (or no BOT_TOKEN specified) ---
@@ -168,6 +250,21 @@ def require_role(allowed_roles: List[str]):
     return role_checker
 
 
+def check_store_access(user: User, store_ids: Iterable[UUID]) -> None:
+    """Raise 403 unless `user` may act on every store in `store_ids`.
+
+    Only store managers with `allowed_store_ids` configured are restricted.
+    """
+    if user.role != UserRole.STORE_MANAGER or not user.allowed_store_ids:
+        return
+    denied = set(store_ids) - set(user.allowed_store_ids)
+    if denied:
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized for this store"
+        )
+
+
 def require_store_access(store_id_param: str = "store_id"):
     """
     Dependency factory: checks that a store_manager can only access their assigned stores.
@@ -185,21 +282,12 @@ def require_store_access(store_id_param: str = "store_id"):
         request: Request,
         current_user: User = Depends(get_current_user),
     ):
-        if current_user.role != UserRole.STORE_MANAGER:
-            return current_user
-
-        if not current_user.allowed_store_ids:
-            return current_user  # No restrictions configured
-
         # Try path params, then query params
         store_id = request.path_params.get(store_id_param)
         if not store_id:
             store_id = request.query_params.get(store_id_param)
 
-        if store_id and UUID(str(store_id)) not in current_user.allowed_store_ids:
-            raise HTTPException(
-                status_code=403,
-                detail="Not authorized for this store"
-            )
+        if store_id:
+            check_store_access(current_user, [UUID(str(store_id))])
         return current_user
     return checker
@@ -1,16 +1,40 @@
+import hmac
+import importlib
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from app.startup import startup_timer, FirstResponseMiddleware
+
+with startup_timer.step("import fastapi"):
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.staticfiles import StaticFiles
+    from fastapi.responses import FileResponse, PlainTextResponse
 
 from app.config import get_settings
-from app.routers import orders, purchases, products, users, stores, categories, stalls, expenses, bills, templates, ai
+
+with startup_timer.step("import app.database (engine)"):
+    from app.database import engine, listen_engine, read_engine, warm_up_pool
+with startup_timer.step("import app.models"):
+    import app.models  # noqa: F401
+from app.metrics import MetricsMiddleware, render_metrics
+from app.query_stats import QueryStatsMiddleware
+from app.services.idempotency import key_sweeper
+from app.services.versions import version_sync
 
 settings = get_settings()
 
+# Router modules, imported one by one so each shows up in the startup report.
+# Heavy optional dependencies (openai, ...) are imported lazily inside them.
+ROUTER_MODULES = (
+    "orders", "purchases", "products", "users", "stores", "categories",
+    "stalls", "expenses", "bills", "templates", "ai", "system", "events",
+)
+routers = {}
+for _name in ROUTER_MODULES:
+    with startup_timer.step(f"import app.routers.{_name}"):
+        routers[_name] = importlib.import_module(f"app.routers.{_name}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -19,7 +43,19 @@ async def lifespan(app: FastAPI):
     Database schema is managed by Alembic migrations.
     Run `alembic upgrade head` before starting the app in a new environment.
     """
+    with startup_timer.step("lifespan: pool warm-up"):
+        await warm_up_pool(settings.db_pool_warmup)
+    with startup_timer.step("lifespan: resource version sync"):
+        await version_sync.start()
+    await key_sweeper.start()
+    startup_timer.mark_ready()
     yield
+    await key_sweeper.stop()
+    await version_sync.stop()
+    await engine.dispose()
+    for extra in (read_engine, listen_engine):
+        if extra is not engine:
+            await extra.dispose()
 
 
 app = FastAPI(title="Eden Core ERP", version="0.3.0", lifespan=lifespan)
@@ -31,20 +67,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Link", "X-Next-Cursor", "Idempotent-Replayed"],
 )
 
+# --- Per-request SQL accounting (Server-Timing, N+1 warnings) ---
+if settings.query_stats_enabled:
+    app.add_middleware(QueryStatsMiddleware)
+
+# --- Prometheus metrics (outermost, so it times everything below) ---
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(request: Request):
+        if settings.metrics_token:
+            supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+            # bytes: compare_digest raises on non-ASCII str, which a client controls
+            if not hmac.compare_digest(supplied.encode(), settings.metrics_token.encode()):
+                raise HTTPException(status_code=401, detail="Invalid metrics token")
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# --- Cold-start profiling: stamps the first response, then a no-op ---
+app.add_middleware(FirstResponseMiddleware)
+
 # --- API Routers (all under /api prefix) ---
-app.include_router(orders.router, prefix="/api")
-app.include_router(purchases.router, prefix="/api")
-app.include_router(products.router, prefix="/api")
-app.include_router(users.router, prefix="/api")
-app.include_router(stores.router, prefix="/api")
-app.include_router(categories.router, prefix="/api")
-app.include_router(stalls.router, prefix="/api")
-app.include_router(expenses.router, prefix="/api")
-app.include_router(bills.router, prefix="/api")
-app.include_router(templates.router, prefix="/api")
-app.include_router(ai.router, prefix="/api")
+for _name in ROUTER_MODULES:
+    app.include_router(routers[_name].router, prefix="/api")
 
 # --- Static Files & SPA Catch-All (Production) ---
 # When deployed to Koyeb, FastAPI serves the React build.
@@ -0,0 +1,290 @@
+"""Prometheus-compatible metrics.
+
+A deliberately small in-process registry rendering the Prometheus text
+exposition format (0.0.4), so the service needs no extra dependency. Request
+metrics are labelled by route template (`/api/orders/{order_id}`), never by
+raw path, to keep label cardinality bounded.
+
+Each worker process keeps its own counters; run one worker per container
+(the Cloud Run default) or scrape every worker.
+"""
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from app.database import engine, read_engine, pool_stats
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]  # (suffix, labels, value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """Yield `(suffix, labels, value)` for every series of this metric."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self):
+        for values, total in self._values.items():
+            yield "", dict(zip(self.labels, values)), total
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values: str) -> None:
+        self._values[label_values] = value
+
+    def samples(self):
+        for values, value in self._values.items():
+            yield "", dict(zip(self.labels, values)), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        state = self._values.get(label_values)
+        if state is None:
+            state = self._values[label_values] = [0.0] * (len(self.buckets) + 2)
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def samples(self):
+        for values, state in self._values.items():
+            labels = dict(zip(self.labels, values))
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield "_count", labels, cumulative
+            yield "_sum", labels, state[-1]
+
+
+class Registry:
+    """Holds metrics plus collectors that are sampled at scrape time."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[_Metric]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        metrics = list(self._metrics)
+        for collector in self._collectors:
+            metrics.extend(collector())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "eden_http_requests_total", "HTTP requests by route template and status.",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "eden_http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "eden_http_requests_in_flight", "HTTP requests currently being served.",
+)
+EVENT_SUBSCRIBERS = REGISTRY.gauge(
+    "eden_event_stream_clients", "Clients connected to the event stream.",
+)
+EVENTS_DROPPED = REGISTRY.counter(
+    "eden_event_stream_overflows_total", "Events not queued because a stream client fell behind.",
+)
+AI_PARSE_LATENCY = REGISTRY.histogram(
+    "eden_ai_parse_duration_seconds", "Latency of LLM order-parsing calls.",
+    ("outcome",), buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0),
+)
+
+# --- Cache statistics (registered by the modules that own the caches) ---
+
+_caches: Dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    """Expose a cache's `stats()` dict (hits, misses, size) at /metrics."""
+    _caches[name] = stats
+
+
+def _collect_caches() -> Iterable[_Metric]:
+    hits = Counter("eden_cache_hits_total", "Cache hits.", ("cache",))
+    misses = Counter("eden_cache_misses_total", "Cache misses.", ("cache",))
+    size = Gauge("eden_cache_entries", "Entries currently cached.", ("cache",))
+    ratio = Gauge("eden_cache_hit_ratio", "Hits / lookups since process start.", ("cache",))
+    for name, stats_fn in _caches.items():
+        stats = stats_fn()
+        hits.inc(name, amount=stats.get("hits", 0))
+        misses.inc(name, amount=stats.get("misses", 0))
+        size.set(stats.get("size", 0), name)
+        ratio.set(stats.get("hit_ratio", 0.0), name)
+    return (hits, misses, size, ratio)
+
+
+def _collect_pools() -> Iterable[_Metric]:
+    checked_out = Gauge("eden_db_pool_checked_out", "Connections checked out of the pool.", ("pool",))
+    overflow = Gauge("eden_db_pool_overflow", "Overflow connections in use.", ("pool",))
+    size = Gauge("eden_db_pool_size", "Configured pool size.", ("pool",))
+    waits = Counter("eden_db_pool_checkouts_total", "Pool checkouts.", ("pool",))
+    wait_time = Counter("eden_db_pool_wait_seconds_total", "Time spent waiting for a connection.", ("pool",))
+    pools = [("primary", engine)]
+    if read_engine is not engine:
+        pools.append(("replica", read_engine))
+    for name, target in pools:
+        stats = pool_stats(target)
+        if "size" not in stats:
+            continue  # SQLite / non-queue pools
+        checked_out.set(stats["checked_out"], name)
+        overflow.set(stats["overflow"], name)
+        size.set(stats["size"], name)
+        if "checkouts" in stats:
+            waits.inc(name, amount=stats["checkouts"])
+            wait_time.inc(name, amount=stats["wait_time_total_s"])
+    return (checked_out, overflow, size, waits, wait_time)
+
+
+REGISTRY.add_collector(_collect_pools)
+REGISTRY.add_collector(_collect_caches)
+
+
+# --- Middleware ---
+
+def route_template(scope) -> str:
+    """`/api/orders/{order_id}` for `/api/orders/3f2a...`; `__unmatched__` if no route matched.
+
+    Rebuilt from the matched path params, which works however routers were included.
+    """
+    if "endpoint" not in scope:
+        return "__unmatched__"
+    path = scope["path"]
+    params = scope.get("path_params")
+    if not params:
+        return path
+    segments = path.split("/")
+    for name, value in params.items():
+        value = str(value)
+        if "/" in value:  # {name:path} parameters swallow the rest of the path
+            joined = "/".join(segments)
+            if value and joined.endswith(value):
+                segments = (joined[: -len(value)] + "{" + name + "}").split("/")
+            continue
+        for i, segment in enumerate(segments):
+            if segment == value:
+                segments[i] = "{" + name + "}"
+                break
+    return "/".join(segments)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts, in-flight requests and latency."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            template = route_template(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, template, status)
+            HTTP_LATENCY.observe(elapsed, method, template)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,33 @@
+"""Shared resource versions for cross-worker cache invalidation.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    resource_versions = op.create_table(
+        "resource_versions",
+        sa.Column("name", sa.String, primary_key=True),
+        sa.Column("version", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.bulk_insert(
+        resource_versions,
+        [{"name": name, "version": 0} for name in ("products", "categories", "stalls", "stores")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("resource_versions")
@@ -0,0 +1,33 @@
+"""Composite indexes for the filtered, keyset-paginated order list.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_purchase_orders_store_status_created",
+        "purchase_orders",
+        ["store_id", "status", "created_at"],
+    )
+    op.create_index(
+        "ix_purchase_orders_delivery_status",
+        "purchase_orders",
+        ["delivery_date", "status"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_purchase_orders_delivery_status", table_name="purchase_orders")
+    op.drop_index("ix_purchase_orders_store_status_created", table_name="purchase_orders")
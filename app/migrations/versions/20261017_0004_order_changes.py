@@ -0,0 +1,29 @@
+"""Backfill purchase_orders.updated_at and index it for the order change feed.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Orders never updated since creation had no updated_at; the feed needs one.
+    op.execute("UPDATE purchase_orders SET updated_at = created_at WHERE updated_at IS NULL")
+    op.create_index(
+        "ix_purchase_orders_updated_id",
+        "purchase_orders",
+        ["updated_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_purchase_orders_updated_id", table_name="purchase_orders")
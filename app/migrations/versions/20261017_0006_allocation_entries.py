@@ -0,0 +1,40 @@
+"""Allocation ledger: batch item shares per order item.
+
+Items costed before this revision keep their totals but have no entries;
+the ledger starts with the next batch.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "allocation_entries",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("batch_item_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("batch_items.id"), nullable=False),
+        sa.Column("order_item_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("order_items.id"), nullable=False),
+        sa.Column("quantity", sa.Numeric(10, 3), nullable=False),
+        sa.Column("cost_uzs", sa.Numeric(12, 2), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_allocation_entries_batch_item_id", "allocation_entries", ["batch_item_id"])
+    op.create_index("ix_allocation_entries_order_item_id", "allocation_entries", ["order_item_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_allocation_entries_order_item_id", table_name="allocation_entries")
+    op.drop_index("ix_allocation_entries_batch_item_id", table_name="allocation_entries")
+    op.drop_table("allocation_entries")
@@ -0,0 +1,25 @@
+"""Indexes for purchase batch history and spend aggregates.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_purchase_batches_purchase_date", "purchase_batches", ["purchase_date"])
+    op.create_index("ix_batch_items_product_id", "batch_items", ["product_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_batch_items_product_id", table_name="batch_items")
+    op.drop_index("ix_purchase_batches_purchase_date", table_name="purchase_batches")
@@ -0,0 +1,92 @@
+"""Product price statistics, backfilled from past purchase batches.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PRICE_WINDOW_DAYS = 7
+
+
+def _price(cost, quantity) -> Decimal:
+    return (Decimal(cost) / Decimal(quantity)).quantize(Decimal("0.01"), ROUND_HALF_UP)
+
+
+def upgrade() -> None:
+    days = op.create_table(
+        "product_price_days",
+        sa.Column("product_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("products.id"), primary_key=True),
+        sa.Column("day", sa.Date, primary_key=True),
+        sa.Column("quantity_bought", sa.Numeric(12, 3), nullable=False),
+        sa.Column("total_cost_uzs", sa.Numeric(14, 2), nullable=False),
+    )
+    stats = op.create_table(
+        "product_price_stats",
+        sa.Column("product_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("products.id"), primary_key=True),
+        sa.Column("last_price", sa.Numeric(12, 2), nullable=False),
+        sa.Column("last_purchased_on", sa.Date, nullable=False),
+        sa.Column("avg_price_7d", sa.Numeric(12, 2), nullable=False),
+        sa.Column("min_price", sa.Numeric(12, 2), nullable=False),
+        sa.Column("max_price", sa.Numeric(12, 2), nullable=False),
+        sa.Column("purchase_count", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+
+    # One pass over the history, oldest batch first; new batches update incrementally.
+    lines = op.get_bind().execute(sa.text(
+        "SELECT bi.product_id, pb.purchase_date, bi.total_quantity_bought, bi.total_cost_uzs "
+        "FROM batch_items bi JOIN purchase_batches pb ON pb.id = bi.purchase_batch_id "
+        "WHERE bi.total_quantity_bought > 0 "
+        "ORDER BY pb.created_at"
+    )).all()
+    by_day = defaultdict(lambda: defaultdict(lambda: [Decimal(0), Decimal(0)]))  # product -> day -> [qty, cost]
+    by_product = {}
+    for product_id, day, quantity, cost in lines:
+        by_day[product_id][day][0] += Decimal(quantity)
+        by_day[product_id][day][1] += Decimal(cost)
+        price = _price(cost, quantity)
+        row = by_product.setdefault(product_id, {
+            "product_id": product_id, "min_price": price, "max_price": price, "purchase_count": 0,
+        })
+        row.update(
+            last_price=price, last_purchased_on=day, purchase_count=row["purchase_count"] + 1,
+            min_price=min(row["min_price"], price), max_price=max(row["max_price"], price),
+        )
+    if not by_product:
+        return
+
+    now = datetime.now(timezone.utc)
+    for product_id, row in by_product.items():
+        last = row["last_purchased_on"]
+        window = [
+            totals for day, totals in by_day[product_id].items()
+            if last - timedelta(days=PRICE_WINDOW_DAYS) < day <= last
+        ]
+        row["avg_price_7d"] = _price(sum(c for _, c in window), sum(q for q, _ in window))
+        row["updated_at"] = now
+
+    op.bulk_insert(days, [
+        {"product_id": pid, "day": day, "quantity_bought": q, "total_cost_uzs": c}
+        for pid, product_days in by_day.items()
+        for day, (q, c) in product_days.items()
+    ])
+    op.bulk_insert(stats, list(by_product.values()))
+
+
+def downgrade() -> None:
+    op.drop_table("product_price_stats")
+    op.drop_table("product_price_days")
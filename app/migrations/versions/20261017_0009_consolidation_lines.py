@@ -0,0 +1,42 @@
+"""Incrementally maintained consolidation aggregate, built from open orders.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "consolidation_lines",
+        sa.Column("product_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("products.id"), primary_key=True),
+        sa.Column("store_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("stores.id"), primary_key=True),
+        sa.Column("delivery_date", sa.Date, primary_key=True),
+        sa.Column("quantity", sa.Numeric(12, 3), nullable=False, server_default="0"),
+    )
+    # Same rows as app.services.consolidation.rebuild_consolidation(); status is
+    # compared as text so enum names and values both match.
+    op.execute(
+        "INSERT INTO consolidation_lines (product_id, store_id, delivery_date, quantity) "
+        "SELECT oi.product_id, po.store_id, po.delivery_date, "
+        "SUM(oi.quantity_approved - COALESCE(oi.quantity_fulfilled, 0)) "
+        "FROM order_items oi JOIN purchase_orders po ON po.id = oi.purchase_order_id "
+        "WHERE oi.quantity_approved - COALESCE(oi.quantity_fulfilled, 0) > 0 "
+        "AND LOWER(CAST(po.status AS TEXT)) IN ('pending', 'approved', 'purchasing') "
+        "GROUP BY oi.product_id, po.store_id, po.delivery_date"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("consolidation_lines")
@@ -0,0 +1,32 @@
+"""Order change feed positions assigned by the database (purchase_orders.change_seq).
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("purchase_orders", sa.Column("change_seq", sa.BigInteger, nullable=True))
+    # Existing orders all get this transaction's id: one position, committed at once,
+    # below anything written afterwards.
+    op.execute("UPDATE purchase_orders SET change_seq = pg_current_xact_id()::text::bigint")
+    op.alter_column("purchase_orders", "change_seq", nullable=False)
+    op.drop_index("ix_purchase_orders_updated_id", table_name="purchase_orders")
+    op.create_index("ix_purchase_orders_change_seq_id", "purchase_orders", ["change_seq", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_purchase_orders_change_seq_id", table_name="purchase_orders")
+    op.create_index("ix_purchase_orders_updated_id", "purchase_orders", ["updated_at", "id"])
+    op.drop_column("purchase_orders", "change_seq")
@@ -6,11 +6,13 @@ from typing import List, Optional, Dict
 from uuid import UUID, uuid4
 
 from sqlalchemy import (
-    BigInteger, Boolean, Date, DateTime, ForeignKey, String, Text,
-    Enum, Numeric, ARRAY, UniqueConstraint, JSON, TypeDecorator,
+    BigInteger, Boolean, Date, DateTime, ForeignKey, Integer, LargeBinary, String, Text,
+    Enum, Index, Numeric, ARRAY, UniqueConstraint, JSON, TypeDecorator,
 )
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.sql.expression import FunctionElement
 
 from app.database import Base
 
@@ -156,8 +158,48 @@ class Product(Base):
     default_stall: Mapped[Optional["Stall"]] = relationship("Stall", back_populates="products")
 
 
+class change_position(FunctionElement):
+    """Position of a write to purchase_orders in the change feed (app.services.order_changes).
+
+    PostgreSQL: the id of the writing transaction. Elsewhere (SQLite in
+    tests, where writers are serialized) one past the highest position.
+    """
+    type = BigInteger()
+    inherit_cache = True
+
+
+class change_horizon(FunctionElement):
+    """Positions below this belong to finished transactions only."""
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(change_position)
+@compiles(change_horizon)
+def _next_change_seq(element, compiler, **kw):
+    return "(SELECT COALESCE(MAX(change_seq), 0) + 1 FROM purchase_orders)"
+
+
+@compiles(change_position, "postgresql")
+def _pg_change_position(element, compiler, **kw):
+    return "pg_current_xact_id()::text::bigint"
+
+
+@compiles(change_horizon, "postgresql")
+def _pg_change_horizon(element, compiler, **kw):
+    # Oldest transaction still running; every id below it has committed or aborted
+    return "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+
 class PurchaseOrder(Base):
     __tablename__ = "purchase_orders"
+    __table_args__ = (
+        # Match the list_orders filters: store/status scoped history, and per-day demand
+        Index("ix_purchase_orders_store_status_created", "store_id", "status", "created_at"),
+        Index("ix_purchase_orders_delivery_status", "delivery_date", "status"),
+        # Delta sync walks (change_seq, id) from a client cursor
+        Index("ix_purchase_orders_change_seq_id", "change_seq", "id"),
+    )
 
     id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), primary_key=True, default=uuid4)
     store_id: Mapped[UUID] = mapped_column(ForeignKey("stores.id"))
@@ -165,7 +207,11 @@ class PurchaseOrder(Base):
     status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus), default=OrderStatus.PENDING)
     delivery_date: Mapped[date] = mapped_column(Date)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow, index=True)
-    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=_utcnow, nullable=True)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), default=_utcnow, onupdate=_utcnow, nullable=True,
+    )
+    # Set by the database on every insert and update; the change feed orders by it
+    change_seq: Mapped[int] = mapped_column(BigInteger, default=change_position(), onupdate=change_position())
 
     store: Mapped["Store"] = relationship("Store", back_populates="orders")
     requester: Mapped["User"] = relationship("User", back_populates="orders")
@@ -183,6 +229,7 @@ class OrderItem(Base):
     product_id: Mapped[UUID] = mapped_column(ForeignKey("products.id"), index=True)
     quantity_requested: Mapped[Decimal] = mapped_column(Numeric(10, 3))
     quantity_approved: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 3), nullable=True)
+    # Running totals over the item's allocation_entries; None until the first batch
     allocated_cost_uzs: Mapped[Optional[Decimal]] = mapped_column(Numeric(12, 2), nullable=True)
     quantity_fulfilled: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 3), nullable=True)
     notes: Mapped[Optional[Dict[str, str]]] = mapped_column(JSON, nullable=True)
@@ -196,7 +243,7 @@ class PurchaseBatch(Base):
 
     id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), primary_key=True, default=uuid4)
     purchaser_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
-    purchase_date: Mapped[date] = mapped_column(Date, default=lambda: _utcnow().date())
+    purchase_date: Mapped[date] = mapped_column(Date, default=lambda: _utcnow().date(), index=True)
     market_location: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     status: Mapped[BatchStatus] = mapped_column(Enum(BatchStatus), default=BatchStatus.DRAFT)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
@@ -214,7 +261,7 @@ class BatchItem(Base):
 
     id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), primary_key=True, default=uuid4)
     purchase_batch_id: Mapped[UUID] = mapped_column(ForeignKey("purchase_batches.id"))
-    product_id: Mapped[UUID] = mapped_column(ForeignKey("products.id"))
+    product_id: Mapped[UUID] = mapped_column(ForeignKey("products.id"), index=True)
 
     total_quantity_bought: Mapped[Decimal] = mapped_column(Numeric(10, 3))
     total_cost_uzs: Mapped[Decimal] = mapped_column(Numeric(12, 2))
@@ -224,6 +271,56 @@ class BatchItem(Base):
     product: Mapped["Product"] = relationship("Product")
 
 
+class AllocationEntry(Base):
+    """One batch line's share of one order item. Append-only; the item keeps the running totals."""
+    __tablename__ = "allocation_entries"
+
+    id: Mapped[UUID] = mapped_column(PG_UUID(as_uuid=True), primary_key=True, default=uuid4)
+    batch_item_id: Mapped[UUID] = mapped_column(ForeignKey("batch_items.id"), index=True)
+    order_item_id: Mapped[UUID] = mapped_column(ForeignKey("order_items.id"), index=True)
+    quantity: Mapped[Decimal] = mapped_column(Numeric(10, 3))
+    cost_uzs: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
+
+
+class ProductPriceDay(Base):
+    """Quantity and cost of one product bought on one day (see app.services.price_stats)."""
+    __tablename__ = "product_price_days"
+
+    product_id: Mapped[UUID] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    quantity_bought: Mapped[Decimal] = mapped_column(Numeric(12, 3))
+    total_cost_uzs: Mapped[Decimal] = mapped_column(Numeric(14, 2))
+
+
+class ProductPriceStats(Base):
+    """Rolling market prices of one product, updated with every batch (see app.services.price_stats)."""
+    __tablename__ = "product_price_stats"
+
+    product_id: Mapped[UUID] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    last_price: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+    last_purchased_on: Mapped[date] = mapped_column(Date)
+    avg_price_7d: Mapped[Decimal] = mapped_column(Numeric(12, 2))  # 7 days up to last_purchased_on
+    min_price: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+    max_price: Mapped[Decimal] = mapped_column(Numeric(12, 2))
+    purchase_count: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
+
+
+class ConsolidationLine(Base):
+    """Outstanding quantity of one product for one store and delivery date, over open orders.
+
+    Maintained by deltas from the order and allocation write paths (see
+    app.services.consolidation); rows at zero are dropped.
+    """
+    __tablename__ = "consolidation_lines"
+
+    product_id: Mapped[UUID] = mapped_column(ForeignKey("products.id"), primary_key=True)
+    store_id: Mapped[UUID] = mapped_column(ForeignKey("stores.id"), primary_key=True)
+    delivery_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    quantity: Mapped[Decimal] = mapped_column(Numeric(12, 3), default=Decimal("0"))
+
+
 class OrderTemplate(Base):
     __tablename__ = "order_templates"
 
@@ -271,3 +368,27 @@ class DailyBill(Base):
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=_utcnow, nullable=True)
 
     store: Mapped["Store"] = relationship("Store", back_populates="bills")
+
+
+class ResourceVersion(Base):
+    """Change counter per cached resource, shared by all workers (see app.services.versions)."""
+    __tablename__ = "resource_versions"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
+
+
+class IdempotencyKey(Base):
+    """Response stored for a client-supplied Idempotency-Key (see app.services.idempotency)."""
+    __tablename__ = "idempotency_keys"
+
+    user_id: Mapped[UUID] = mapped_column(
+        PG_UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True,
+    )
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64))  # endpoint + body
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # None while in flight
+    response_body: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
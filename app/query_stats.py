@@ -0,0 +1,199 @@
+"""Per-request SQL statement accounting.
+
+SQLAlchemy engine hooks count statements and DB time for whatever request is
+active in the current context, grouped by normalized statement shape. The
+middleware reports the totals in a `Server-Timing` header and the request log,
+and in development/testing flags shapes repeated within one request as likely
+N+1 patterns.
+
+Tests can assert query budgets:
+
+    with capture_queries() as captured:
+        await client.get("/api/orders/")
+    assert captured.last.count <= 3
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+_capture: ContextVar[Optional["QueryCapture"]] = ContextVar("query_capture", default=None)
+
+# --- SQL normalization ---
+
+_POSITIONAL = re.compile(r"\$\d+|%s|%\(\w+\)s")
+_CAST = re.compile(r"\?::\w+(?:\[\])?")
+_NUMBER = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_REPEATED_ROWS = re.compile(r"(\(\?\))(?:\s*,\s*\1)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape: literals and parameter lists collapse to `?`."""
+    shape = _STRING.sub("?", statement)
+    shape = _POSITIONAL.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _CAST.sub("?", shape)
+    shape = _PARAM_LIST.sub("(?)", shape)
+    shape = _REPEATED_ROWS.sub(r"\1", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    """Statement count and DB time for one unit of work (usually a request)."""
+
+    __slots__ = ("count", "total_time", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Dict[str, List[float]] = {}  # shape -> [count, seconds]
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_time += elapsed
+        entry = self.shapes.get(statement)
+        if entry is None:
+            self.shapes[statement] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def by_shape(self) -> Dict[str, tuple[int, float]]:
+        """Statement counts and time grouped by normalized SQL."""
+        grouped: Dict[str, List[float]] = {}
+        for statement, (count, elapsed) in self.shapes.items():
+            entry = grouped.setdefault(normalize_sql(statement), [0, 0.0])
+            entry[0] += count
+            entry[1] += elapsed
+        return {shape: (int(c), t) for shape, (c, t) in grouped.items()}
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Shapes executed at least `threshold` times — likely N+1 loops."""
+        if threshold <= 0:
+            return {}
+        return {
+            shape: count
+            for shape, (count, _) in self.by_shape().items()
+            if count >= threshold
+        }
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_time * 1000:.2f};desc="{self.count} queries"'
+
+
+class QueryCapture:
+    """Collects QueryStats for requests (and direct calls) made inside `capture_queries()`."""
+
+    def __init__(self):
+        self.direct = QueryStats()
+        self.requests: List[QueryStats] = []
+
+    @property
+    def last(self) -> QueryStats:
+        """Stats of the most recent request, or of the direct calls if none."""
+        return self.requests[-1] if self.requests else self.direct
+
+
+@contextmanager
+def capture_queries():
+    """Capture statement stats for the enclosed block. Intended for tests and benchmarks."""
+    capture = QueryCapture()
+    capture_token = _capture.set(capture)
+    stats_token = _current.set(capture.direct)
+    try:
+        yield capture
+    finally:
+        _current.reset(stats_token)
+        _capture.reset(capture_token)
+
+
+# --- Engine hooks (all engines, including test engines) ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "_query_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+# --- Middleware ---
+
+class QueryStatsMiddleware:
+    """Pure ASGI middleware: per-request statement accounting and Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+        self.n_plus_one_threshold = (
+            settings.query_n_plus_one_threshold
+            if settings.is_development or settings.is_testing
+            else 0
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+        repeated: Dict[str, int] = {}
+
+        async def send_with_timing(message):
+            nonlocal repeated
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+                repeated = stats.repeated(self.n_plus_one_threshold)
+                if repeated:
+                    headers.append("X-Query-Repeats", str(max(repeated.values())))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._report(scope, stats, repeated)
+
+    @staticmethod
+    def _report(scope, stats: QueryStats, repeated: Dict[str, int]) -> None:
+        capture = _capture.get()
+        if capture is not None:
+            capture.requests.append(stats)
+
+        if not stats.count:
+            return
+        db_ms = round(stats.total_time * 1000, 2)
+        logger.info(
+            "%s %s: %d queries, %.2f ms db",
+            scope["method"], scope["path"], stats.count, db_ms,
+            extra={"db_queries": stats.count, "db_time_ms": db_ms, "path": scope["path"]},
+        )
+        for shape, count in repeated.items():
+            logger.warning(
+                "Possible N+1 in %s %s: %d× %s",
+                scope["method"], scope["path"], count, shape[:200],
+                extra={"n_plus_one_count": count, "sql_shape": shape, "path": scope["path"]},
+            )
@@ -1,14 +1,16 @@
 import json
 import os
+import time
 from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import User, Product
-from app.dependencies import get_current_user, get_db
-from openai import OpenAI
+from app.models import User
+from app.dependencies import get_current_user, get_read_db
+from app.metrics import AI_PARSE_LATENCY
+from app.services.catalog import catalog_cache
+from app.startup import lazy_import
 
 router = APIRouter(prefix="/ai", tags=["AI Order Parsing"])
 
@@ -29,12 +31,11 @@ class ParseOrderRequest(BaseModel):
 @router.post("/parse-order", response_model=ParsedOrderResponse)
 async def parse_order(
     request: ParseOrderRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     # current_user: User = Depends(get_current_user) # Uncomment when auth is strictly needed
 ):
     # 1. Fetch the active product catalog to provide exact UUIDs to the LLM
-    products_stmt = select(Product).where(Product.is_active == True)
-    active_products = db.scalars(products_stmt).all()
+    active_products = (await catalog_cache.get(db, "products")).listed
     
     # 2. Build a compressed dictionary for the LLM prompt to minimize tokens
     catalog_context = []
@@ -50,7 +51,8 @@ async def parse_order(
     if not api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY environment variable is not set. AI parsing is unavailable.")
         
-    client = OpenAI(api_key=api_key)
+    # openai costs ~0.5 s to import; load it on first use, not on every cold start
+    client = lazy_import("openai").OpenAI(api_key=api_key)
     
     system_prompt = f"""
     You are an expert procurement parsing assistant for a multi-lingual restaurant chain (Uzbek, Russian, English).
@@ -66,6 +68,7 @@ async def parse_order(
     {catalog_text}
     """
     
+    started = time.perf_counter()
     try:
         response = client.beta.chat.completions.parse(
             model="gpt-4o-mini",
@@ -77,8 +80,10 @@ async def parse_order(
         )
         
         parsed_result = response.choices[0].message.parsed
+        AI_PARSE_LATENCY.observe(time.perf_counter() - started, "ok")
         return parsed_result
         
     except Exception as e:
+        AI_PARSE_LATENCY.observe(time.perf_counter() - started, "error")
         print(f"LLM Parsing Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to parse order with AI: {str(e)}")
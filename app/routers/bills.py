@@ -8,11 +8,32 @@ from typing import List, Optional
 from uuid import UUID
 
 from app import models, schemas
-from app.dependencies import get_db, get_current_user, require_role
+from app.dependencies import get_db, get_read_db, get_current_user, require_role
+from app.serialization import ResponseSerializer
 from app.services.billing import generate_bills_for_date
 
 router = APIRouter(prefix="/bills", tags=["bills"])
 
+_bill_json = ResponseSerializer(schemas.DailyBillResponse)
+_bill_list_json = ResponseSerializer(List[schemas.DailyBillResponse])
+_bill_summary_json = ResponseSerializer(schemas.DailyBillSummary)
+
+
+def _bill_payload(bill: models.DailyBill, store_name: Optional[str]) -> dict:
+    """Plain dict for a bill; validated once by the response serializer."""
+    return {
+        "id": bill.id,
+        "store_id": bill.store_id,
+        "store_name": store_name,
+        "bill_date": bill.bill_date,
+        "items_total": bill.items_total,
+        "shared_total": bill.shared_total,
+        "grand_total": bill.grand_total,
+        "status": bill.status,
+        "detail": bill.detail,
+        "created_at": bill.created_at,
+    }
+
 
 @router.post(
     "/generate",
@@ -29,31 +50,17 @@ async def generate_daily_bills(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
-    # Build response
-    bill_responses = [
-        schemas.DailyBillResponse(
-            id=bill.id,
-            store_id=bill.store_id,
-            store_name=store_map.get(bill.store_id, models.Store()).name if store_map.get(bill.store_id) else None,
-            bill_date=bill.bill_date,
-            items_total=bill.items_total,
-            shared_total=bill.shared_total,
-            grand_total=bill.grand_total,
-            status=bill.status,
-            detail=bill.detail,
-            created_at=bill.created_at,
-        )
-        for bill in bills
-    ]
-
-    return schemas.DailyBillSummary(
-        bill_date=bill_date,
-        total_stores=len(bills),
-        total_items_amount=sum(b.items_total for b in bills),
-        total_shared_amount=sum(b.shared_total for b in bills),
-        grand_total=sum(b.grand_total for b in bills),
-        bills=bill_responses,
-    )
+    return _bill_summary_json.response({
+        "bill_date": bill_date,
+        "total_stores": len(bills),
+        "total_items_amount": sum(b.items_total for b in bills),
+        "total_shared_amount": sum(b.shared_total for b in bills),
+        "grand_total": sum(b.grand_total for b in bills),
+        "bills": [
+            _bill_payload(bill, store_map[bill.store_id].name if bill.store_id in store_map else None)
+            for bill in bills
+        ],
+    })
 
 
 @router.get("/", response_model=List[schemas.DailyBillResponse])
@@ -61,7 +68,7 @@ async def list_bills(
     bill_date: Optional[date] = Query(None, description="Filter by date"),
     store_id: Optional[UUID] = Query(None, description="Filter by store"),
     current_user: models.User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """List daily bills, with optional date/store filters. Store managers see only their stores."""
     stmt = select(models.DailyBill).join(models.Store)
@@ -92,28 +99,14 @@ async def list_bills(
     )
     store_map = {s.id: s.name for s in stores_result.scalars().all()}
 
-    return [
-        schemas.DailyBillResponse(
-            id=b.id,
-            store_id=b.store_id,
-            store_name=store_map.get(b.store_id),
-            bill_date=b.bill_date,
-            items_total=b.items_total,
-            shared_total=b.shared_total,
-            grand_total=b.grand_total,
-            status=b.status,
-            detail=b.detail,
-            created_at=b.created_at,
-        )
-        for b in bills
-    ]
+    return _bill_list_json.response([_bill_payload(b, store_map.get(b.store_id)) for b in bills])
 
 
 @router.get("/{bill_id}", response_model=schemas.DailyBillResponse)
 async def get_bill(
     bill_id: UUID,
     current_user: models.User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db),  # primary: clients read their own writes back
 ):
     """Get a single bill by ID."""
     result = await db.execute(
@@ -137,15 +130,4 @@ async def get_bill(
     )
     store = store_result.scalars().first()
 
-    return schemas.DailyBillResponse(
-        id=bill.id,
-        store_id=bill.store_id,
-        store_name=store.name if store else None,
-        bill_date=bill.bill_date,
-        items_total=bill.items_total,
-        shared_total=bill.shared_total,
-        grand_total=bill.grand_total,
-        status=bill.status,
-        detail=bill.detail,
-        created_at=bill.created_at,
-    )
+    return _bill_json.response(_bill_payload(bill, store.name if store else None))
@@ -1,21 +1,20 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from typing import List
+from typing import Dict, List
 
-from app import models, schemas
-from app.dependencies import get_db
+from app import schemas
+from app.dependencies import get_read_db
+from app.serialization import JSONBytesResponse
+from app.services.catalog import catalog_cache, conditional_get
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
 
 @router.get("/", response_model=List[schemas.Category])
-async def list_categories(db: AsyncSession = Depends(get_db)):
+async def list_categories(
+    validators: Dict[str, str] = Depends(conditional_get("categories")),
+    db: AsyncSession = Depends(get_read_db),
+):
     """List all active categories, ordered by sort_order."""
-    stmt = (
-        select(models.Category)
-        .where(models.Category.is_active == True)
-        .order_by(models.Category.sort_order)
-    )
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    entry = await catalog_cache.get(db, "categories")
+    return JSONBytesResponse(entry.json, headers=validators)
@@ -0,0 +1,37 @@
+"""Events API router — server-sent order and allocation events."""
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.dependencies import get_db, get_current_user
+from app.services.events import event_stream
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+@router.get("/stream")
+async def stream_events(
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Server-Sent Events: order.created, order.status_changed, allocation.done, bills.generated.
+
+    Store managers only receive events for their `allowed_store_ids`. Events
+    carry ids, not data: on `ready` and `resync`, and after reconnecting,
+    clients fetch GET /orders/changes.
+    """
+    store_ids = None
+    if (
+        current_user.role == models.UserRole.STORE_MANAGER
+        and current_user.allowed_store_ids
+    ):
+        store_ids = current_user.allowed_store_ids
+    # The stream never queries; don't hold a pooled connection for its lifetime.
+    await db.close()
+
+    return StreamingResponse(
+        event_stream(store_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
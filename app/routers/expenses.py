@@ -6,7 +6,7 @@ from uuid import UUID
 from datetime import date
 
 from app import models, schemas
-from app.dependencies import get_db, get_current_user, require_role
+from app.dependencies import get_db, get_read_db, get_current_user, require_role
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
@@ -14,7 +14,7 @@ router = APIRouter(prefix="/expenses", tags=["expenses"])
 @router.get("/", response_model=List[schemas.SharedExpenseResponse])
 async def list_expenses(
     expense_date: Optional[date] = Query(None, description="Filter by date"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """List shared expenses, optionally filtered by date."""
     stmt = select(models.SharedExpense).order_by(models.SharedExpense.expense_date.desc())
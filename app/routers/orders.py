@@ -1,15 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import case, func, insert, literal, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from uuid import UUID
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Literal, Optional, Union
+from uuid import UUID, uuid4
 
 from app import models, schemas
-from app.dependencies import get_db, get_current_user, require_role, require_store_access
+from app.dependencies import (
+    get_db, get_read_db, get_current_user, require_role, require_store_access, check_store_access,
+)
+from app.serialization import ResponseSerializer
+from app.services.demand import (
+    OPEN_STATUSES, apply_demand_deltas, close_order_demand, lock_order_items,
+)
+from app.services.idempotency import IdempotentRequest, idempotent
+from app.services.events import ORDER_CREATED, ORDER_STATUS_CHANGED, publish_event
+from app.services.order_changes import TOMBSTONE_STATUSES, fetch_changes, touch_orders
+from app.services.pagination import after_cursor_desc, day_end, day_start, page_headers
+from app.services.purchasing import DEMAND
+from app.services.versions import bump_after_commit
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
+_order_json = ResponseSerializer(schemas.OrderResponse)
+_order_list_json = ResponseSerializer(List[schemas.OrderResponse])
+_order_summary_json = ResponseSerializer(List[schemas.OrderSummary])
+_bulk_result_json = ResponseSerializer(List[schemas.BulkUpdateResult])
+_changes_json = ResponseSerializer(schemas.OrderChanges)
+
 # Valid status transitions
 VALID_TRANSITIONS = {
     models.OrderStatus.PENDING: [models.OrderStatus.APPROVED, models.OrderStatus.CANCELLED],
@@ -19,16 +43,27 @@ VALID_TRANSITIONS = {
     models.OrderStatus.CANCELLED: [],
 }
 
+# Approved quantities may change until purchasing starts
+APPROVAL_EDITABLE = (models.OrderStatus.PENDING, models.OrderStatus.APPROVED)
+
 
 @router.post("/", response_model=schemas.OrderResponse)
 async def create_order(
     order_in: schemas.OrderCreate,
     current_user: models.User = Depends(get_current_user),
     _=Depends(require_store_access()),
+    idem: IdempotentRequest = Depends(idempotent("POST /orders")),
     db: AsyncSession = Depends(get_db)
 ):
-    """Create a new purchase order with items."""
-    
+    """Create a new purchase order with items.
+
+    Send an `Idempotency-Key` header to make retries safe.
+    """
+    if idem.replay:
+        return idem.replay
+    # require_store_access() only sees path/query params; the store is in the body here
+    check_store_access(current_user, [order_in.store_id])
+
     # Validate store exists
     store_result = await db.execute(
         select(models.Store).where(models.Store.id == order_in.store_id)
@@ -48,6 +83,7 @@ async def create_order(
     await db.flush()
 
     # Create Items — quantity_approved defaults to None until explicitly approved
+    demand = defaultdict(Decimal)
     for item_in in order_in.items:
         new_item = models.OrderItem(
             purchase_order_id=new_order.id,
@@ -57,30 +93,289 @@ async def create_order(
             notes=item_in.notes
         )
         db.add(new_item)
+        demand[item_in.product_id, new_order.store_id, new_order.delivery_date] += new_item.quantity_approved
+    await apply_demand_deltas(db, demand)
 
-    await db.commit()
+    await publish_event(db, ORDER_CREATED, new_order.store_id, order_ids=[new_order.id])
 
-    # Reload with items for response
+    # Reload with items for the response, stored with the order (Idempotency-Key)
+    await db.flush()
     stmt = (
         select(models.PurchaseOrder)
         .options(selectinload(models.PurchaseOrder.items))
         .where(models.PurchaseOrder.id == new_order.id)
     )
     result = await db.execute(stmt)
-    return result.scalars().first()
+    response = await idem.respond(db, _order_json, result.scalars().first())
+    await db.commit()
+    await bump_after_commit(db, DEMAND)
+    return response
+
 
+@router.post("/bulk", response_model=List[schemas.OrderResponse])
+async def create_orders_bulk(
+    bulk_in: schemas.BulkOrderCreate,
+    current_user: models.User = Depends(get_current_user),
+    idem: IdempotentRequest = Depends(idempotent("POST /orders/bulk")),
+    db: AsyncSession = Depends(get_db),
+):
+    """Create orders for many stores and delivery dates in one transaction.
+
+    Stores and products are validated with one query each; orders and items
+    are written with multi-row INSERT ... RETURNING, and the response is
+    built from the returned rows without reloading. Honours `Idempotency-Key`.
+    """
+    if idem.replay:
+        return idem.replay
+    store_ids = {order.store_id for order in bulk_in.orders}
+    check_store_access(current_user, store_ids)
+
+    found_stores = set(await db.scalars(
+        select(models.Store.id).where(models.Store.id.in_(store_ids))
+    ))
+    if store_ids - found_stores:
+        missing = ", ".join(sorted(str(s) for s in store_ids - found_stores))
+        raise HTTPException(status_code=404, detail=f"Store not found: {missing}")
+
+    product_ids = {item.product_id for order in bulk_in.orders for item in order.items}
+    found_products = set(await db.scalars(
+        select(models.Product.id).where(models.Product.id.in_(product_ids))
+    )) if product_ids else set()
+    if product_ids - found_products:
+        missing = ", ".join(sorted(str(p) for p in product_ids - found_products))
+        raise HTTPException(status_code=404, detail=f"Product not found: {missing}")
+
+    now = datetime.now(timezone.utc)
+    order_rows, item_rows = [], []
+    demand = defaultdict(Decimal)
+    for order_in in bulk_in.orders:
+        order_id = uuid4()
+        order_rows.append({
+            "id": order_id,
+            "store_id": order_in.store_id,
+            "user_id": current_user.id,
+            "delivery_date": order_in.delivery_date,
+            "status": models.OrderStatus.PENDING,
+            "created_at": now,
+            "updated_at": now,
+        })
+        for item_in in order_in.items:
+            item_rows.append({
+                "id": uuid4(),
+                "purchase_order_id": order_id,
+                "product_id": item_in.product_id,
+                "quantity_requested": item_in.quantity_requested,
+                "quantity_approved": item_in.quantity_requested,  # Auto-approve for demo phase
+                "notes": item_in.notes,
+            })
+            demand[item_in.product_id, order_in.store_id, order_in.delivery_date] += item_in.quantity_requested
+
+    orders = (await db.scalars(
+        insert(models.PurchaseOrder).returning(models.PurchaseOrder, sort_by_parameter_order=True),
+        order_rows,
+    )).all()
+    items_by_order = defaultdict(list)
+    if item_rows:
+        for item in await db.scalars(
+            insert(models.OrderItem).returning(models.OrderItem, sort_by_parameter_order=True),
+            item_rows,
+        ):
+            items_by_order[item.purchase_order_id].append(item)
+    await apply_demand_deltas(db, demand)
+
+    created_by_store = defaultdict(list)
+    for order in orders:
+        created_by_store[order.store_id].append(order.id)
+    for store_id, ids in created_by_store.items():
+        await publish_event(db, ORDER_CREATED, store_id, order_ids=ids)
+
+    for order in orders:
+        set_committed_value(order, "items", items_by_order[order.id])
+    response = await idem.respond(db, _order_list_json, orders)
+    await db.commit()
+    await bump_after_commit(db, DEMAND)
+    return response
 
-@router.get("/", response_model=List[schemas.OrderResponse])
+
+@router.patch(
+    "/bulk/status",
+    response_model=List[schemas.BulkUpdateResult],
+    dependencies=[Depends(require_role(["admin", "global_purchaser"]))],
+)
+async def update_order_status_bulk(
+    body: schemas.BulkStatusUpdate,
+    db: AsyncSession = Depends(get_db),
+):
+    """Apply one status transition to many orders with a single set-based UPDATE.
+
+    Orders whose current status does not allow the transition are left
+    untouched and reported individually; the rest are committed together.
+    """
+    order_ids = list(dict.fromkeys(body.order_ids))
+    sources = [s for s, targets in VALID_TRANSITIONS.items() if body.status in targets]
+    closing = body.status not in OPEN_STATUSES
+
+    updated = {}
+    if sources:
+        if closing:
+            await lock_order_items(db, order_ids)
+        result = await db.execute(
+            update(models.PurchaseOrder)
+            .where(
+                models.PurchaseOrder.id.in_(order_ids),
+                models.PurchaseOrder.status.in_(sources),
+            )
+            .values(status=body.status)
+            .returning(models.PurchaseOrder.id, models.PurchaseOrder.store_id)
+            .execution_options(synchronize_session=False)
+        )
+        updated = dict(result.all())
+        if closing:
+            await close_order_demand(db, updated)
+
+    current = {}
+    if len(updated) < len(order_ids):
+        rows = await db.execute(
+            select(models.PurchaseOrder.id, models.PurchaseOrder.status)
+            .where(models.PurchaseOrder.id.in_([i for i in order_ids if i not in updated]))
+        )
+        current = dict(rows.all())
+
+    changed_by_store = defaultdict(list)
+    for order_id, store_id in updated.items():
+        changed_by_store[store_id].append(order_id)
+    for store_id, ids in changed_by_store.items():
+        await publish_event(db, ORDER_STATUS_CHANGED, store_id, order_ids=ids, status=body.status.value)
+    await db.commit()
+    if updated:
+        await bump_after_commit(db, DEMAND)
+
+    results = []
+    for order_id in order_ids:
+        if order_id in updated:
+            results.append({"id": order_id, "ok": True, "status": body.status})
+        elif order_id not in current:
+            results.append({"id": order_id, "ok": False, "error": "Order not found"})
+        else:
+            results.append({
+                "id": order_id, "ok": False, "status": current[order_id],
+                "error": f"Cannot transition from {current[order_id].value} to {body.status.value}",
+            })
+    return _bulk_result_json.response(results)
+
+
+@router.patch(
+    "/bulk/approvals",
+    response_model=List[schemas.BulkUpdateResult],
+    dependencies=[Depends(require_role(["admin", "global_purchaser"]))],
+)
+async def update_item_approvals_bulk(
+    body: schemas.BulkApprovalUpdate,
+    db: AsyncSession = Depends(get_db),
+):
+    """Set quantity_approved on many items across orders in a single UPDATE.
+
+    Only items of pending/approved orders that have not been costed yet are
+    changed; everything else is reported per item.
+    """
+    quantities = {a.item_id: a.quantity_approved for a in body.items}  # last edit wins
+    qty_type = models.OrderItem.quantity_approved.type
+    editable_orders = select(models.PurchaseOrder.id).where(
+        models.PurchaseOrder.status.in_(APPROVAL_EDITABLE)
+    )
+    # Previous quantities, for the open demand delta (locked against concurrent edits)
+    previous = {
+        row.id: row for row in await db.execute(
+            select(
+                models.OrderItem.id, models.OrderItem.product_id, models.OrderItem.quantity_approved,
+                models.PurchaseOrder.store_id, models.PurchaseOrder.delivery_date,
+            )
+            .join(models.PurchaseOrder, models.OrderItem.purchase_order_id == models.PurchaseOrder.id)
+            .where(models.OrderItem.id.in_(quantities))
+            .order_by(models.OrderItem.id)
+            .with_for_update(of=models.OrderItem)
+        )
+    }
+    result = await db.execute(
+        update(models.OrderItem)
+        .where(
+            models.OrderItem.id.in_(quantities),
+            models.OrderItem.allocated_cost_uzs.is_(None),
+            models.OrderItem.purchase_order_id.in_(editable_orders),
+        )
+        .values(quantity_approved=case(
+            *[(models.OrderItem.id == item_id, literal(qty, qty_type)) for item_id, qty in quantities.items()],
+        ))
+        .returning(models.OrderItem.id, models.OrderItem.purchase_order_id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = dict(result.all())
+    await touch_orders(db, set(updated.values()))
+
+    demand = defaultdict(Decimal)
+    for item_id in updated:
+        item = previous[item_id]
+        old = item.quantity_approved if item.quantity_approved and item.quantity_approved > 0 else 0
+        demand[item.product_id, item.store_id, item.delivery_date] += quantities[item_id] - old
+    await apply_demand_deltas(db, demand)
+
+    rejected = {}
+    if len(updated) < len(quantities):
+        rows = await db.execute(
+            select(
+                models.OrderItem.id, models.OrderItem.purchase_order_id,
+                models.OrderItem.allocated_cost_uzs, models.PurchaseOrder.status,
+            )
+            .join(models.PurchaseOrder, models.OrderItem.purchase_order_id == models.PurchaseOrder.id)
+            .where(models.OrderItem.id.in_([i for i in quantities if i not in updated]))
+        )
+        rejected = {row.id: row for row in rows}
+    await db.commit()
+    if updated:
+        await bump_after_commit(db, DEMAND)
+
+    results = []
+    for item_id in quantities:
+        if item_id in updated:
+            results.append({"id": item_id, "ok": True, "order_id": updated[item_id]})
+        elif item_id not in rejected:
+            results.append({"id": item_id, "ok": False, "error": "Item not found"})
+        else:
+            row = rejected[item_id]
+            error = (
+                "Item is already costed"
+                if row.allocated_cost_uzs is not None
+                else f"Order is {row.status.value}; approvals are locked"
+            )
+            results.append({
+                "id": item_id, "ok": False, "order_id": row.purchase_order_id,
+                "status": row.status, "error": error,
+            })
+    return _bulk_result_json.response(results)
+
+
+@router.get("/", response_model=Union[List[schemas.OrderResponse], List[schemas.OrderSummary]])
 async def list_orders(
+    request: Request,
     status: Optional[str] = Query(None, description="Filter by order status"),
     store_id: Optional[str] = Query(None, description="Filter by store ID"),
+    delivery_date: Optional[date] = Query(None, description="Filter by delivery date"),
+    created_from: Optional[date] = Query(None, description="Created on or after this date (UTC)"),
+    created_to: Optional[date] = Query(None, description="Created on or before this date (UTC)"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit for the full list"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    view: Literal["full", "summary"] = Query("full", description="summary: headers + item aggregates, no items"),
     current_user: models.User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """List all orders, optionally filtered by status and/or store."""
-    stmt = select(models.PurchaseOrder).options(
-        selectinload(models.PurchaseOrder.items)
-    )
+    """List orders, newest first, optionally filtered and paginated.
+
+    With `limit`, pages are keyset-paginated on (created_at, id): pass the
+    `X-Next-Cursor` response header back as `cursor` to get the next page.
+    `view=summary` returns compact rows with item count and totals instead
+    of item arrays; full items stay on GET /orders/{order_id}.
+    """
+    stmt = select(models.PurchaseOrder)
 
     # Validate status if provided
     if status:
@@ -94,6 +389,14 @@ async def list_orders(
             )
     if store_id:
         stmt = stmt.where(models.PurchaseOrder.store_id == store_id)
+    if delivery_date:
+        stmt = stmt.where(models.PurchaseOrder.delivery_date == delivery_date)
+    if created_from:
+        stmt = stmt.where(models.PurchaseOrder.created_at >= day_start(created_from))
+    if created_to:
+        stmt = stmt.where(models.PurchaseOrder.created_at < day_end(created_to))
+    if cursor:
+        stmt = stmt.where(after_cursor_desc(models.PurchaseOrder.created_at, models.PurchaseOrder.id, cursor))
 
     # Store managers can only see their own stores
     if (
@@ -102,16 +405,80 @@ async def list_orders(
     ):
         stmt = stmt.where(models.PurchaseOrder.store_id.in_(current_user.allowed_store_ids))
 
-    stmt = stmt.order_by(models.PurchaseOrder.created_at.desc())
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    stmt = stmt.order_by(models.PurchaseOrder.created_at.desc(), models.PurchaseOrder.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+
+    if view == "summary":
+        rows = (await db.execute(_summarize(stmt))).all()
+        summaries, headers = page_headers(request, rows, limit)
+        return _order_summary_json.response(summaries, headers=headers)
+
+    result = await db.execute(stmt.options(selectinload(models.PurchaseOrder.items)))
+    orders, headers = page_headers(request, result.scalars().all(), limit)
+    return _order_list_json.response(orders, headers=headers)
+
+
+def _summarize(orders_stmt):
+    """Wrap a filtered/limited order query with per-order item aggregates.
+
+    Only the orders on the page are joined to their items, and all of them
+    are aggregated in one GROUP BY, so the cost follows the page size, not
+    the table size.
+    """
+    page = orders_stmt.subquery()
+    item = models.OrderItem
+    return (
+        select(
+            page.c.id, page.c.store_id, page.c.user_id, page.c.delivery_date,
+            page.c.status, page.c.created_at,
+            func.count(item.id).label("item_count"),
+            func.coalesce(func.sum(item.quantity_requested), 0).label("total_quantity_requested"),
+            func.sum(item.allocated_cost_uzs).label("total_allocated_cost"),
+        )
+        .select_from(page.outerjoin(item, item.purchase_order_id == page.c.id))
+        .group_by(
+            page.c.id, page.c.store_id, page.c.user_id, page.c.delivery_date,
+            page.c.status, page.c.created_at,
+        )
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+    )
+
+
+@router.get("/changes", response_model=schemas.OrderChanges)
+async def list_order_changes(
+    since: Optional[str] = Query(None, description="`cursor` from the previous response; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),  # primary: the horizon must match the data
+):
+    """Orders created or modified after `since`, for incremental client sync.
+
+    Changed orders come back whole, items and allocations included;
+    cancelled orders come back as tombstones. Keep calling with the returned
+    `cursor` while `has_more` is true, then poll with it.
+    """
+    store_ids = None
+    if (
+        current_user.role == models.UserRole.STORE_MANAGER
+        and current_user.allowed_store_ids
+    ):
+        store_ids = current_user.allowed_store_ids
+
+    changed, cursor, has_more = await fetch_changes(db, since, limit, store_ids)
+    return _changes_json.response({
+        "orders": [o for o in changed if o.status not in TOMBSTONE_STATUSES],
+        "tombstones": [o for o in changed if o.status in TOMBSTONE_STATUSES],
+        "cursor": cursor,
+        "has_more": has_more,
+    })
 
 
 @router.get("/{order_id}", response_model=schemas.OrderResponse)
 async def get_order(
     order_id: UUID,
     current_user: models.User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db),  # primary: clients read their own writes back
 ):
     """Get a single order by ID."""
     stmt = (
@@ -137,10 +504,14 @@ async def update_order_status(
     db: AsyncSession = Depends(get_db),
 ):
     """Transition an order to a new status with validation."""
+    closing = body.status not in OPEN_STATUSES
+    if closing:
+        await lock_order_items(db, [order_id])
     stmt = (
         select(models.PurchaseOrder)
         .options(selectinload(models.PurchaseOrder.items))
         .where(models.PurchaseOrder.id == order_id)
+        .with_for_update(of=models.PurchaseOrder)  # concurrent transitions see each other
     )
     result = await db.execute(stmt)
     order = result.scalars().first()
@@ -156,13 +527,10 @@ async def update_order_status(
         )
 
     order.status = body.status
+    if closing:
+        await close_order_demand(db, [order.id])
+    await publish_event(db, ORDER_STATUS_CHANGED, order.store_id, order_ids=[order.id], status=body.status.value)
     await db.commit()
-
-    # Reload with items for response (F19 fix)
-    stmt2 = (
-        select(models.PurchaseOrder)
-        .options(selectinload(models.PurchaseOrder.items))
-        .where(models.PurchaseOrder.id == order_id)
-    )
-    result2 = await db.execute(stmt2)
-    return result2.scalars().first()
+    await bump_after_commit(db, DEMAND)
+    # Items were eager-loaded above and sessions don't expire on commit: no reload needed
+    return order
@@ -2,24 +2,25 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from typing import List
+from typing import Dict, List
 from uuid import UUID
 
 from app import models, schemas
-from app.dependencies import get_db, require_role
+from app.dependencies import get_db, get_read_db, require_role
+from app.serialization import JSONBytesResponse
+from app.services.catalog import catalog_cache, conditional_get
+from app.services.versions import bump_versions
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 
 @router.get("/", response_model=List[schemas.Product])
-async def get_products(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(models.Product)
-        .options(selectinload(models.Product.category))
-        .where(models.Product.is_active == True)
-        .order_by(models.Product.category_id)
-    )
-    return result.scalars().all()
+async def get_products(
+    validators: Dict[str, str] = Depends(conditional_get("products")),
+    db: AsyncSession = Depends(get_read_db),
+):
+    entry = await catalog_cache.get(db, "products")
+    return JSONBytesResponse(entry.json, headers=validators)
 
 
 @router.post("/", response_model=schemas.Product, dependencies=[Depends(require_role(["admin"]))])
@@ -35,6 +36,7 @@ async def create_product(
         is_active=product.is_active
     )
     db.add(new_product)
+    await bump_versions(db, "products")
     await db.commit()
     # Reload with category relationship (F22)
     stmt = (
@@ -75,6 +77,7 @@ async def update_product(
     if product_update.is_active is not None:
         existing_product.is_active = product_update.is_active
         
+    await bump_versions(db, "products")
     await db.commit()
     await db.refresh(existing_product)
     return existing_product
@@ -94,5 +97,6 @@ async def delete_product(
         raise HTTPException(status_code=404, detail="Product not found")
 
     product.is_active = False
+    await bump_versions(db, "products")
     await db.commit()
     return {"ok": True, "id": str(product_id)}
@@ -1,19 +1,32 @@
-"""Purchases API router — batch recording, consolidation, and stall grouping."""
+"""Purchases API router — batch recording and history, spend, consolidation, and stall grouping."""
 from decimal import Decimal
 from datetime import date
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from typing import List, Optional
 
 from app import models, schemas
-from app.dependencies import get_db, get_current_user, require_role
+from app.dependencies import get_db, get_read_db, get_current_user, require_role
+from app.serialization import JSONBytesResponse, ResponseSerializer
+from app.services.allocation_preview import preview_batch_allocation
+from app.services.catalog import catalog_cache
+from app.services.consolidation import consolidation_cache
+from app.services.idempotency import IdempotentRequest, idempotent
+from app.services.pagination import after_cursor_desc, page_headers
 from app.services.purchasing import submit_purchase_batch
 
 router = APIRouter(prefix="/purchases", tags=["purchases"])
 
+_batch_json = ResponseSerializer(schemas.BatchResponse)
+_batch_list_json = ResponseSerializer(List[schemas.BatchResponse])
+_spend_json = ResponseSerializer(schemas.SpendSummary)
+_preview_json = ResponseSerializer(schemas.AllocationPreview)
+
 
 @router.post(
     "/",
@@ -23,77 +36,185 @@ router = APIRouter(prefix="/purchases", tags=["purchases"])
 async def submit_batch(
     batch_in: schemas.BatchCreate,
     current_user: models.User = Depends(get_current_user),
+    idem: IdempotentRequest = Depends(idempotent("POST /purchases")),
     db: AsyncSession = Depends(get_db),
 ):
     """
     Purchaser records what they bought.
     System calculates unit price and allocates costs to APPROVED OrderItems.
+
+    Send an `Idempotency-Key` header: a retried submission replays the
+    stored result instead of recording the batch (and its costs) twice.
     """
-    return await submit_purchase_batch(db, current_user, batch_in)
+    if idem.replay:
+        return idem.replay
+    await submit_purchase_batch(
+        db, current_user, batch_in,
+        before_commit=lambda batch: idem.respond(db, _batch_json, batch),
+    )
+    return idem.response
 
 
-@router.get(
-    "/consolidation",
-    response_model=List[schemas.ConsolidatedItem],
+@router.post(
+    "/preview",
+    response_model=schemas.AllocationPreview,
     dependencies=[Depends(require_role(["global_purchaser", "admin"]))],
 )
-async def get_consolidated_requirements(db: AsyncSession = Depends(get_db)):
+async def preview_batch(
+    batch_in: schemas.BatchPreview,
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    Phase 2: System Consolidation
-    Aggregates all PENDING/APPROVED items by Product.
-    Returns Total Quantity + Per-Store Breakdown.
+    Dry run of POST /purchases: what each store would pay for these lines.
+    Same allocation math, against a cached snapshot of open demand; nothing is written.
     """
+    return _preview_json.response(await preview_batch_allocation(db, batch_in.items))
+
+
+@router.get(
+    "/",
+    response_model=List[schemas.BatchResponse],
+    dependencies=[Depends(require_role(["global_purchaser", "admin"]))],
+)
+async def list_batches(
+    request: Request,
+    date_from: Optional[date] = Query(None, description="Purchased on or after this date"),
+    date_to: Optional[date] = Query(None, description="Purchased on or before this date"),
+    purchaser_id: Optional[UUID] = Query(None),
+    market_location: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Past purchase batches with their lines, newest first.
+
+    Keyset-paginated on (created_at, id) like GET /orders: pass the
+    `X-Next-Cursor` response header back as `cursor` for the next page.
+    """
+    batch = models.PurchaseBatch
+    stmt = select(batch)
+    if date_from:
+        stmt = stmt.where(batch.purchase_date >= date_from)
+    if date_to:
+        stmt = stmt.where(batch.purchase_date <= date_to)
+    if purchaser_id:
+        stmt = stmt.where(batch.purchaser_id == purchaser_id)
+    if market_location:
+        stmt = stmt.where(batch.market_location == market_location)
+    if cursor:
+        stmt = stmt.where(after_cursor_desc(batch.created_at, batch.id, cursor))
+
     stmt = (
-        select(
-            models.Product,
-            models.Category,
-            models.OrderItem.quantity_approved,
-            models.Store.name.label("store_name"),
-        )
-        .join(models.OrderItem, models.Product.id == models.OrderItem.product_id)
-        .join(models.PurchaseOrder, models.OrderItem.purchase_order_id == models.PurchaseOrder.id)
-        .join(models.Store, models.PurchaseOrder.store_id == models.Store.id)
-        .join(models.Category, models.Product.category_id == models.Category.id)
-        .where(
-            models.OrderItem.quantity_approved > 0,
-            models.OrderItem.allocated_cost_uzs == None,  # noqa: E711
-            models.PurchaseOrder.status.in_([
-                models.OrderStatus.APPROVED,
-                models.OrderStatus.PENDING,
-                models.OrderStatus.PURCHASING,
-            ]),
-        )
-        .order_by(models.Category.sort_order, models.Product.name_i18n)
+        stmt.order_by(batch.created_at.desc(), batch.id.desc())
+        .limit(limit + 1)
+        .options(selectinload(batch.items))
     )
+    batches, headers = page_headers(request, (await db.execute(stmt)).scalars().all(), limit)
+    return _batch_list_json.response(batches, headers=headers)
 
-    results = await db.execute(stmt)
 
-    grouped = {}
-    for product, category, qty, store_name in results:
-        pid = product.id
-        if pid not in grouped:
-            grouped[pid] = {
-                "product_id": product.id,
-                "product_name": product.name_i18n,
-                "unit": product.unit_i18n,
-                "category_name": category.name_i18n if category else {"en": "Uncategorized"},
-                "price_reference": product.price_reference,
-                "total_quantity_needed": Decimal("0"),
-                "breakdown": []
-            }
+@router.get(
+    "/spend",
+    response_model=schemas.SpendSummary,
+    dependencies=[Depends(require_role(["global_purchaser", "admin"]))],
+)
+async def get_spend(
+    date_from: date,
+    date_to: date,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Spend of finalized batches between two purchase dates (inclusive),
+    per day, per stall and per product.
 
-        grouped[pid]["total_quantity_needed"] += qty
+    Three GROUP BY queries over the purchase_date index; names come from the
+    catalog cache. Stalls are the products' current default stalls.
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+
+    batch, item = models.PurchaseBatch, models.BatchItem
+    in_range = (
+        batch.purchase_date >= date_from,
+        batch.purchase_date <= date_to,
+        batch.status == models.BatchStatus.FINALIZED,
+    )
+    cost = func.sum(item.total_cost_uzs)
+
+    by_day = await db.execute(
+        select(batch.purchase_date, func.count(func.distinct(batch.id)), cost)
+        .join(item, item.purchase_batch_id == batch.id)
+        .where(*in_range)
+        .group_by(batch.purchase_date)
+        .order_by(batch.purchase_date)
+    )
+    by_stall = await db.execute(
+        select(models.Product.default_stall_id, cost)
+        .select_from(item)
+        .join(batch, item.purchase_batch_id == batch.id)
+        .join(models.Product, item.product_id == models.Product.id)
+        .where(*in_range)
+        .group_by(models.Product.default_stall_id)
+        .order_by(cost.desc())
+    )
+    by_product = await db.execute(
+        select(item.product_id, func.sum(item.total_quantity_bought), cost)
+        .join(batch, item.purchase_batch_id == batch.id)
+        .where(*in_range)
+        .group_by(item.product_id)
+        .order_by(cost.desc())
+    )
+
+    days = [
+        {"purchase_date": day, "batch_count": count, "total_cost_uzs": total}
+        for day, count, total in by_day
+    ]
+    stalls = []
+    for stall_id, total in by_stall:
+        stall = await catalog_cache.lookup(db, "stalls", stall_id) if stall_id else None
+        stalls.append({
+            "stall_id": stall_id,
+            "stall_name": stall.name if stall else "Unassigned",
+            "total_cost_uzs": total,
+        })
+    products = []
+    for product_id, quantity, total in by_product:
+        product = await catalog_cache.lookup(db, "products", product_id)
+        products.append({
+            "product_id": product_id,
+            "product_name": product.name_i18n if product else None,
+            "total_quantity": quantity,
+            "total_cost_uzs": total,
+        })
+
+    return _spend_json.response({
+        "date_from": date_from,
+        "date_to": date_to,
+        "total_cost_uzs": sum((d["total_cost_uzs"] for d in days), Decimal("0")),
+        "by_day": days,
+        "by_stall": stalls,
+        "by_product": products,
+    })
 
-        existing_store = next((b for b in grouped[pid]["breakdown"] if b["store_name"] == store_name), None)
-        if existing_store:
-            existing_store["quantity"] += qty
-        else:
-            grouped[pid]["breakdown"].append({
-                "store_name": store_name,
-                "quantity": qty
-            })
 
-    return list(grouped.values())
+@router.get(
+    "/consolidation",
+    response_model=List[schemas.ConsolidatedItem],
+    dependencies=[Depends(require_role(["global_purchaser", "admin"]))],
+)
+async def get_consolidated_requirements(
+    target_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Phase 2: System Consolidation
+    Aggregates the outstanding quantity (approved - fulfilled) of all
+    PENDING/APPROVED/PURCHASING items by Product.
+    Returns Total Quantity + Per-Store Breakdown, and the expected cost at
+    the product's 7-day market price (app.services.price_stats).
+    Shares its cached computation with /by-stall (app.services.consolidation).
+    """
+    return JSONBytesResponse((await consolidation_cache.get(db, target_date)).by_product_json)
 
 
 @router.get(
@@ -103,93 +224,27 @@ async def get_consolidated_requirements(db: AsyncSession = Depends(get_db)):
 )
 async def get_consolidation_by_stall(
     target_date: Optional[date] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Consolidate requirements grouped by Stall (档口).
     Products without a stall go to "Unassigned" group.
     """
-    stmt = (
-        select(
-            models.Product,
-            models.Stall,
-            models.OrderItem.quantity_approved,
-            models.Store.name.label("store_name"),
-        )
-        .join(models.OrderItem, models.Product.id == models.OrderItem.product_id)
-        .join(models.PurchaseOrder, models.OrderItem.purchase_order_id == models.PurchaseOrder.id)
-        .join(models.Store, models.PurchaseOrder.store_id == models.Store.id)
-        .outerjoin(models.Stall, models.Product.default_stall_id == models.Stall.id)
-        .where(
-            models.OrderItem.quantity_approved > 0,
-            models.OrderItem.allocated_cost_uzs == None,  # noqa: E711
-            models.PurchaseOrder.status.in_([
-                models.OrderStatus.APPROVED,
-                models.OrderStatus.PENDING,
-                models.OrderStatus.PURCHASING,
-            ]),
-        )
-    )
+    return JSONBytesResponse((await consolidation_cache.get(db, target_date)).by_stall_json)
 
-    if target_date:
-        stmt = stmt.where(models.PurchaseOrder.delivery_date == target_date)
-
-    stmt = stmt.order_by(models.Product.name_i18n)
-    results = await db.execute(stmt)
-
-    stall_groups: dict = {}
-    for product, stall, qty, store_name in results:
-        stall_key = str(stall.id) if stall else "__unassigned__"
-        stall_name = stall.name if stall else "Unassigned"
-
-        if stall_key not in stall_groups:
-            stall_groups[stall_key] = {
-                "stall": stall,
-                "stall_name": stall_name,
-                "items": {},
-            }
-
-        pid = str(product.id)
-        if pid not in stall_groups[stall_key]["items"]:
-            stall_groups[stall_key]["items"][pid] = {
-                "product_id": product.id,
-                "product_name": product.name_i18n,
-                "unit": product.unit_i18n,
-                "price_reference": product.price_reference,
-                "total_quantity": Decimal("0"),
-                "breakdown": [],
-            }
-
-        item_data = stall_groups[stall_key]["items"][pid]
-        item_data["total_quantity"] += qty
-
-        existing_store = next(
-            (b for b in item_data["breakdown"] if b["store_name"] == store_name),
-            None,
-        )
-        if existing_store:
-            existing_store["quantity"] += qty
-        else:
-            item_data["breakdown"].append({
-                "store_name": store_name,
-                "quantity": qty,
-            })
-
-    # Build response
-    result_list = []
-    for group in stall_groups.values():
-        stall_resp = None
-        if group["stall"]:
-            stall_resp = schemas.StallResponse.model_validate(group["stall"])
-
-        result_list.append(schemas.StallConsolidation(
-            stall=stall_resp,
-            stall_name=group["stall_name"],
-            items=[
-                schemas.StallConsolidatedProduct(**item_data)
-                for item_data in group["items"].values()
-            ],
-        ))
-
-    result_list.sort(key=lambda x: (x.stall is None, x.stall.sort_order if x.stall else 999))
-    return result_list
+
+@router.get(
+    "/{batch_id}",
+    response_model=schemas.BatchResponse,
+    dependencies=[Depends(require_role(["global_purchaser", "admin"]))],
+)
+async def get_batch(batch_id: UUID, db: AsyncSession = Depends(get_db)):
+    """One purchase batch with its lines."""
+    batch = await db.scalar(
+        select(models.PurchaseBatch)
+        .where(models.PurchaseBatch.id == batch_id)
+        .options(selectinload(models.PurchaseBatch.items))
+    )
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return _batch_json.response(batch)
@@ -1,21 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import Dict, List
 from uuid import UUID
 
 from app import models, schemas
-from app.dependencies import get_db, require_role
+from app.dependencies import get_db, get_read_db, require_role
+from app.serialization import JSONBytesResponse
+from app.services.catalog import catalog_cache, conditional_get
+from app.services.versions import bump_versions
 
 router = APIRouter(prefix="/stalls", tags=["stalls"])
 
 
 @router.get("/", response_model=List[schemas.StallResponse])
-async def list_stalls(db: AsyncSession = Depends(get_db)):
+async def list_stalls(
+    validators: Dict[str, str] = Depends(conditional_get("stalls")),
+    db: AsyncSession = Depends(get_read_db),
+):
     """List all stalls, ordered by sort_order."""
-    stmt = select(models.Stall).order_by(models.Stall.sort_order)
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    entry = await catalog_cache.get(db, "stalls")
+    return JSONBytesResponse(entry.json, headers=validators)
 
 
 @router.post(
@@ -34,6 +39,7 @@ async def create_stall(
         sort_order=stall_in.sort_order,
     )
     db.add(new_stall)
+    await bump_versions(db, "stalls")
     await db.commit()
     await db.refresh(new_stall)
     return new_stall
@@ -61,6 +67,7 @@ async def update_stall(
     for key, value in update_data.items():
         setattr(stall, key, value)
 
+    await bump_versions(db, "stalls")
     await db.commit()
     await db.refresh(stall)
     return stall
@@ -90,5 +97,6 @@ async def delete_stall(
         product.default_stall_id = None
 
     await db.delete(stall)
+    await bump_versions(db, "stalls", "products")
     await db.commit()
     return {"ok": True}
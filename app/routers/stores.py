@@ -1,23 +1,24 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from typing import List
+from typing import Dict, List
 
 from app import models, schemas
-from app.dependencies import get_db, require_role
+from app.dependencies import get_db, get_read_db, require_role
+from app.serialization import JSONBytesResponse
+from app.services.catalog import catalog_cache, conditional_get
+from app.services.versions import bump_versions
 
 router = APIRouter(prefix="/stores", tags=["stores"])
 
 
 @router.get("/", response_model=List[schemas.StoreResponse])
-async def list_stores(db: AsyncSession = Depends(get_db)):
+async def list_stores(
+    validators: Dict[str, str] = Depends(conditional_get("stores")),
+    db: AsyncSession = Depends(get_read_db),
+):
     """List all active stores."""
-    result = await db.execute(
-        select(models.Store)
-        .where(models.Store.is_active == True)
-        .order_by(models.Store.name)
-    )
-    return result.scalars().all()
+    entry = await catalog_cache.get(db, "stores")
+    return JSONBytesResponse(entry.json, headers=validators)
 
 
 @router.post("/", response_model=schemas.StoreResponse, dependencies=[Depends(require_role(["admin"]))])
@@ -27,6 +28,7 @@ async def create_store(store_in: schemas.StoreCreate, db: AsyncSession = Depends
         address=store_in.address,
     )
     db.add(new_store)
+    await bump_versions(db, "stores")
     await db.commit()
     await db.refresh(new_store)
     return new_store
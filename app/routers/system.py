@@ -0,0 +1,30 @@
+"""System API router — operational introspection for admins."""
+from fastapi import APIRouter, Depends
+
+from app.config import get_settings
+from app.database import engine, read_engine, pool_stats
+from app.dependencies import require_role
+from app.startup import startup_timer
+
+settings = get_settings()
+
+router = APIRouter(
+    prefix="/system",
+    tags=["system"],
+    dependencies=[Depends(require_role(["admin"]))],
+)
+
+
+@router.get("/pool")
+async def get_pool_stats():
+    """Database connection pool usage: checked out, overflow, wait time."""
+    return {
+        "primary": pool_stats(engine),
+        "replica": pool_stats(read_engine) if read_engine is not engine else None,
+    }
+
+
+@router.get("/startup")
+async def get_startup_report():
+    """Cold-start timing: per-import and per-lifespan-step durations, time to first response."""
+    return startup_timer.report(budget_ms=settings.cold_start_budget_ms)
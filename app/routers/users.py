@@ -3,7 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
 
-from app.dependencies import get_db, get_current_user, require_role
+from app.dependencies import bump_users_version, get_db, get_current_user, require_role, invalidate_cached_user
 from app import models, schemas
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -32,7 +32,9 @@ async def switch_role(
         raise HTTPException(status_code=400, detail=f"Invalid role: {role}")
 
     current_user.role = new_role
+    await bump_users_version(db)
     await db.commit()
+    invalidate_cached_user(current_user.id)
     return {"ok": True, "role": new_role.value}
 
 
@@ -64,6 +66,8 @@ async def update_user(
     if update.allowed_store_ids is not None:
         user.allowed_store_ids = update.allowed_store_ids
 
+    await bump_users_version(db)
     await db.commit()
     await db.refresh(user)
+    invalidate_cached_user(user.id)
     return user
@@ -106,6 +106,19 @@ class OrderBase(BaseModel):
 class OrderCreate(OrderBase):
     items: List[OrderItemCreate]
 
+class BulkOrderCreate(BaseModel):
+    """Orders for several stores and/or delivery dates, created in one transaction."""
+    orders: List[OrderCreate] = Field(..., min_length=1, max_length=500)
+
+    @field_validator("orders")
+    @classmethod
+    def _unique_products_per_order(cls, orders: List[OrderCreate]) -> List[OrderCreate]:
+        for order in orders:
+            product_ids = [item.product_id for item in order.items]
+            if len(product_ids) != len(set(product_ids)):
+                raise ValueError(f"Duplicate product in order for store {order.store_id}")
+        return orders
+
 class OrderResponse(OrderBase):
     id: UUID
     user_id: UUID
@@ -116,6 +129,36 @@ class OrderResponse(OrderBase):
     class Config:
         from_attributes = True
 
+class OrderSummary(OrderBase):
+    """Order header with item aggregates, for list views (no item array)."""
+    id: UUID
+    user_id: UUID
+    status: OrderStatus
+    created_at: datetime
+    item_count: int
+    total_quantity_requested: Decimal
+    total_allocated_cost: Optional[Decimal] = None  # None until any item is costed
+
+    class Config:
+        from_attributes = True
+
+class OrderTombstone(BaseModel):
+    """A cancelled order in the change feed; clients drop it from their copy."""
+    id: UUID
+    store_id: UUID
+    status: OrderStatus
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class OrderChanges(BaseModel):
+    """One page of the order change feed (GET /orders/changes)."""
+    orders: List[OrderResponse]
+    tombstones: List[OrderTombstone]
+    cursor: Optional[str] = None  # pass back as `since`; None until the first change
+    has_more: bool
+
 # --- Purchase Batch Schemas ---
 
 class BatchItemInput(BaseModel):
@@ -134,6 +177,8 @@ class ConsolidatedItem(BaseModel):
     unit: Dict[str, str]
     category_name: Dict[str, str]
     price_reference: Optional[Decimal] = None
+    expected_unit_price: Optional[Decimal] = None  # 7-day market average, else price_reference
+    expected_cost_uzs: Optional[Decimal] = None
     total_quantity_needed: Decimal
     breakdown: List[StoreNeed] = []
 
@@ -144,6 +189,8 @@ class StallConsolidatedProduct(BaseModel):
     product_name: Dict[str, str]
     unit: Dict[str, str]
     price_reference: Optional[Decimal] = None
+    expected_unit_price: Optional[Decimal] = None  # 7-day market average, else price_reference
+    expected_cost_uzs: Optional[Decimal] = None
     total_quantity: Decimal
     breakdown: List[StoreNeed] = []
 
@@ -155,6 +202,27 @@ class StallConsolidation(BaseModel):
 class OrderStatusUpdate(BaseModel):
     status: OrderStatus
 
+class BulkStatusUpdate(BaseModel):
+    """Apply one status transition to many orders."""
+    order_ids: List[UUID] = Field(..., min_length=1, max_length=500)
+    status: OrderStatus
+
+class ItemApproval(BaseModel):
+    item_id: UUID
+    quantity_approved: Decimal = Field(..., ge=0)
+
+class BulkApprovalUpdate(BaseModel):
+    """Set quantity_approved on many order items (across orders) at once."""
+    items: List[ItemApproval] = Field(..., min_length=1, max_length=2000)
+
+class BulkUpdateResult(BaseModel):
+    """Per-row outcome of a bulk update; `id` is the order or item id."""
+    id: UUID
+    ok: bool
+    order_id: Optional[UUID] = None
+    status: Optional[OrderStatus] = None
+    error: Optional[str] = None
+
 # --- Store Schemas ---
 
 class StoreCreate(BaseModel):
@@ -177,10 +245,21 @@ class UserUpdate(BaseModel):
     role: Optional[str] = None
     allowed_store_ids: Optional[List[UUID]] = None
 
-class BatchCreate(BaseModel):
-    market_location: str
+class BatchPreview(BaseModel):
+    """Batch lines to price out without recording anything."""
     items: List[BatchItemInput]
 
+    @field_validator("items")
+    @classmethod
+    def _unique_products(cls, items: List[BatchItemInput]) -> List[BatchItemInput]:
+        product_ids = [item.product_id for item in items]
+        if len(product_ids) != len(set(product_ids)):
+            raise ValueError("Each product may appear only once per batch")
+        return items
+
+class BatchCreate(BatchPreview):
+    market_location: str
+
 class BatchItemResponse(BatchItemInput):
     id: UUID
     unit_price_calculated: Optional[Decimal] = None
@@ -189,12 +268,59 @@ class BatchResponse(BaseModel):
     id: UUID
     purchaser_id: UUID
     purchase_date: date
+    market_location: Optional[str] = None
     status: BatchStatus
+    created_at: Optional[datetime] = None
     items: List[BatchItemResponse]
 
     class Config:
         from_attributes = True
 
+class ProductAllocationPreview(BaseModel):
+    product_id: UUID
+    quantity_outstanding: Decimal
+    quantity_fulfilled: Decimal
+    cost_uzs: Decimal
+
+class StoreAllocationPreview(BaseModel):
+    store_id: UUID
+    store_name: Optional[str] = None
+    total_cost_uzs: Decimal
+    products: List[ProductAllocationPreview]
+
+class AllocationPreview(BaseModel):
+    """What each store would be charged if the batch were submitted now."""
+    stores: List[StoreAllocationPreview]
+    total_allocated_uzs: Decimal
+    unmatched_product_ids: List[UUID]  # lines no open order is waiting for
+
+# --- Purchase Spend Schemas ---
+
+class DaySpend(BaseModel):
+    purchase_date: date
+    batch_count: int
+    total_cost_uzs: Decimal
+
+class StallSpend(BaseModel):
+    stall_id: Optional[UUID] = None  # None: products without a default stall
+    stall_name: str
+    total_cost_uzs: Decimal
+
+class ProductSpend(BaseModel):
+    product_id: UUID
+    product_name: Optional[Dict[str, str]] = None
+    total_quantity: Decimal
+    total_cost_uzs: Decimal
+
+class SpendSummary(BaseModel):
+    """Finalized purchase batch spend between two dates (inclusive)."""
+    date_from: date
+    date_to: date
+    total_cost_uzs: Decimal
+    by_day: List[DaySpend]
+    by_stall: List[StallSpend]
+    by_product: List[ProductSpend]
+
 # --- Shared Expense Schemas ---
 
 class SharedExpenseCreate(BaseModel):
@@ -0,0 +1,45 @@
+"""Fast JSON responses for large list endpoints.
+
+Returning ORM objects through `response_model` makes FastAPI validate them
+and then serialize the result. For multi-thousand-row payloads (orders, bills,
+consolidation) that second pass is measurable CPU. A `ResponseSerializer`
+compiles a pydantic `TypeAdapter` once at import time, validates the data a
+single time and dumps it to JSON bytes in pydantic's Rust core. The handler
+returns the finished `JSONBytesResponse`, which FastAPI passes through
+untouched. Keep `response_model` on the route for the OpenAPI schema.
+"""
+from typing import Any, Mapping, Optional
+
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+
+class JSONBytesResponse(Response):
+    """application/json response whose body is already-serialized JSON bytes."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        raise TypeError("JSONBytesResponse expects pre-serialized JSON bytes")
+
+
+class ResponseSerializer:
+    """Precompiled validator + JSON encoder for one response type."""
+
+    def __init__(self, response_type: Any):
+        self.adapter = TypeAdapter(response_type)
+
+    def dump(self, data: Any) -> bytes:
+        """Validate `data` (ORM objects, dicts or models) once and encode it."""
+        value = self.adapter.validate_python(data, from_attributes=True)
+        return self.adapter.dump_json(value)
+
+    def response(
+        self,
+        data: Any,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> JSONBytesResponse:
+        return JSONBytesResponse(self.dump(data), status_code=status_code, headers=headers)
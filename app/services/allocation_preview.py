@@ -0,0 +1,111 @@
+"""Allocation preview — what a batch would cost each store, without writing.
+
+Purchasers price a batch line by line while they shop, so the preview is
+called on every keystroke. The candidate order items it allocates against
+are kept per worker in `demand_snapshot`, tagged with the shared "demand"
+version (app.services.versions), which every order and allocation writer
+bumps. A warm preview is pure computation, with no query at all; the math is
+`compute_allocations()`, exactly what `submit_purchase_batch` applies.
+
+Other workers' writes are seen once they reach this worker through
+LISTEN/NOTIFY, or within `versions_poll_interval` when polling.
+"""
+import asyncio
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.metrics import register_cache
+from app.services.catalog import catalog_cache
+from app.services.purchasing import DEMAND, candidate_items_query, compute_allocations
+from app.services.versions import fetch_versions, sync_versions, versions
+
+
+class DemandSnapshot:
+    """Open order items with outstanding quantity, grouped by product, reloaded when the demand version moves."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self._version: Optional[int] = None
+        self._by_product: Dict = {}
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _is_current(self) -> bool:
+        return self._version is not None and self._version >= versions.get(DEMAND)
+
+    async def get(self, db: AsyncSession) -> Dict:
+        if not versions.synced:  # first request before the background sync ran
+            await sync_versions(db)
+        if self._is_current():
+            self.hits += 1
+            return self._by_product
+        async with self._lock:
+            if self._is_current():
+                self.hits += 1
+                return self._by_product
+            self.misses += 1
+            # Version first, rows second: a write in between only makes the tag older
+            observed = await fetch_versions(db)
+            rows = (await db.execute(candidate_items_query())).all()
+            by_product = defaultdict(list)
+            for row in rows:
+                by_product[row.product_id].append(row)
+            versions.apply(observed)
+            self._by_product = dict(by_product)
+            self._version = observed.get(DEMAND, 0)
+            return self._by_product
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": sum(len(items) for items in self._by_product.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+demand_snapshot = DemandSnapshot()
+register_cache("demand", demand_snapshot.stats)
+
+
+async def preview_batch_allocation(db: AsyncSession, lines: List) -> dict:
+    """Per-store, per-product fulfilled quantities and costs for `lines`; nothing is written."""
+    by_product = await demand_snapshot.get(db)
+    candidates = [item for line in lines for item in by_product.get(line.product_id, ())]
+    allocations = compute_allocations(lines, candidates)
+    outstanding = {item.id: item.quantity_outstanding for item in candidates}
+
+    # store -> product -> [outstanding, fulfilled, cost]
+    totals: Dict = defaultdict(lambda: defaultdict(lambda: [Decimal(0), Decimal(0), Decimal(0)]))
+    for a in allocations:
+        entry = totals[a.store_id][a.product_id]
+        entry[0] += outstanding[a.item_id]
+        entry[1] += a.quantity_fulfilled
+        entry[2] += a.cost_uzs
+
+    stores = []
+    for store_id, products in totals.items():
+        store = await catalog_cache.lookup(db, "stores", store_id)
+        stores.append({
+            "store_id": store_id,
+            "store_name": store.name if store else None,
+            "total_cost_uzs": sum(cost for _, _, cost in products.values()),
+            "products": [
+                {"product_id": pid, "quantity_outstanding": qo, "quantity_fulfilled": qf, "cost_uzs": cost}
+                for pid, (qo, qf, cost) in products.items()
+            ],
+        })
+    stores.sort(key=lambda s: (s["store_name"] or "", str(s["store_id"])))
+
+    return {
+        "stores": stores,
+        "total_allocated_uzs": sum(s["total_cost_uzs"] for s in stores),
+        "unmatched_product_ids": [line.product_id for line in lines if line.product_id not in by_product],
+    }
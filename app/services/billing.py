@@ -12,6 +12,7 @@ from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
 from app import models
+from app.services.events import BILLS_GENERATED, publish_event
 
 
 async def calculate_store_item_totals(
@@ -191,6 +192,9 @@ async def generate_bills_for_date(
 
         bills.append(bill)
 
+    await db.flush()  # assigns ids to new bills
+    for bill in bills:
+        await publish_event(db, BILLS_GENERATED, bill.store_id, bill_id=bill.id, bill_date=bill_date)
     await db.commit()
 
     # Refresh all bills for response
@@ -0,0 +1,196 @@
+"""Catalog service — cached reference data and conditional GET.
+
+Products, categories, stalls and stores change rarely but are read on almost
+every screen, by the AI order parser and by consolidation. `catalog_cache`
+keeps each of them validated in memory with an id index, tagged with the
+shared resource versions it was loaded at (see app.services.versions). Write
+handlers call `bump_versions()` before committing, which invalidates the
+entry in this worker at commit and in every other worker via LISTEN/NOTIFY
+or polling.
+
+The same versions drive weak ETags: list endpoints answer `304 Not Modified`
+before touching the database when the client's copy is current.
+"""
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app import models, schemas
+from app.dependencies import get_read_db
+from app.metrics import register_cache
+from app.services.versions import fetch_versions, sync_versions, versions
+
+CATALOG_RESOURCES = ("products", "categories", "stalls", "stores")
+
+# Versions each cached resource (and its ETag) is derived from.
+# Products embed their category, so category edits invalidate them too.
+DEPENDS_ON: Dict[str, Tuple[str, ...]] = {
+    "products": ("products", "categories"),
+    "categories": ("categories",),
+    "stalls": ("stalls",),
+    "stores": ("stores",),
+}
+
+# Clients must revalidate every time, but may keep the body while it matches.
+CACHE_CONTROL = "private, no-cache"
+
+
+# --- Loaders: (statement, response schema, is-listed predicate) ---
+
+_LOADERS: Dict[str, Tuple[Callable[[], Any], Any, Callable[[Any], bool]]] = {
+    "products": (
+        lambda: select(models.Product)
+        .options(selectinload(models.Product.category))
+        .order_by(models.Product.category_id),
+        schemas.Product,
+        lambda p: p.is_active,
+    ),
+    "categories": (
+        lambda: select(models.Category).order_by(models.Category.sort_order),
+        schemas.Category,
+        lambda c: c.is_active,
+    ),
+    "stalls": (
+        lambda: select(models.Stall).order_by(models.Stall.sort_order),
+        schemas.StallResponse,
+        lambda s: True,
+    ),
+    "stores": (
+        lambda: select(models.Store).order_by(models.Store.name),
+        schemas.StoreResponse,
+        lambda s: s.is_active,
+    ),
+}
+
+
+class CatalogEntry:
+    """One cached resource: every row by id, the listed rows and their JSON."""
+
+    __slots__ = ("versions", "by_id", "listed", "_adapter", "_json")
+
+    def __init__(self, versions: Tuple[int, ...], rows: Sequence[Any], listed: List[Any], adapter: TypeAdapter):
+        self.versions = versions
+        self.by_id: Dict[UUID, Any] = {row.id: row for row in rows}
+        self.listed = listed
+        self._adapter = adapter
+        self._json: Optional[bytes] = None
+
+    @property
+    def json(self) -> bytes:
+        """The list endpoint payload, encoded once per entry."""
+        if self._json is None:
+            self._json = self._adapter.dump_json(self.listed)
+        return self._json
+
+
+class CatalogCache:
+    """Per-worker catalog cache, reloaded lazily when a dependency version moves."""
+
+    def __init__(self):
+        self._adapters = {
+            resource: TypeAdapter(List[schema])
+            for resource, (_, schema, _) in _LOADERS.items()
+        }
+        self.clear()
+
+    def clear(self) -> None:
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._locks = {resource: asyncio.Lock() for resource in CATALOG_RESOURCES}
+        self.hits = 0
+        self.misses = 0
+
+    def _is_current(self, resource: str, entry: CatalogEntry) -> bool:
+        latest = versions.snapshot(DEPENDS_ON[resource])
+        return all(have >= want for have, want in zip(entry.versions, latest))
+
+    async def get(self, db: AsyncSession, resource: str) -> CatalogEntry:
+        entry = self._entries.get(resource)
+        if entry is not None and self._is_current(resource, entry):
+            self.hits += 1
+            return entry
+        async with self._locks[resource]:
+            entry = self._entries.get(resource)
+            if entry is not None and self._is_current(resource, entry):
+                self.hits += 1
+                return entry
+            self.misses += 1
+            entry = self._entries[resource] = await self._load(db, resource)
+            return entry
+
+    async def _load(self, db: AsyncSession, resource: str) -> CatalogEntry:
+        # Versions are read before the rows: a write committing in between leaves
+        # the entry tagged older than its data, so it is reloaded, never kept stale.
+        observed = await fetch_versions(db)
+        statement, _, is_listed = _LOADERS[resource]
+        result = await db.execute(statement())
+        adapter = self._adapters[resource]
+        rows = adapter.validate_python(result.scalars().all(), from_attributes=True)
+        versions.apply(observed)
+        return CatalogEntry(
+            tuple(observed.get(name, 0) for name in DEPENDS_ON[resource]),
+            rows,
+            [row for row in rows if is_listed(row)],
+            adapter,
+        )
+
+    async def lookup(self, db: AsyncSession, resource: str, item_id: UUID) -> Optional[Any]:
+        """O(1) lookup by id, including inactive rows."""
+        return (await self.get(db, resource)).by_id.get(item_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+catalog_cache = CatalogCache()
+register_cache("catalog", catalog_cache.stats)
+
+
+# --- Conditional GET ---
+
+def catalog_etag(resource: str) -> str:
+    parts = ".".join(f"{name[0]}{versions.get(name)}" for name in DEPENDS_ON[resource])
+    return f'W/"{resource}-{parts}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an If-None-Match header (RFC 9110 §13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def conditional_get(resource: str):
+    """Dependency: answer 304 when the client's ETag is current, else tag the response.
+
+    Returns the validator headers so handlers that build their own `Response`
+    can pass them on. The ETag is computed before the catalog is read, so a
+    write racing the read can only make the tag older than the body, never newer.
+    """
+    async def check(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)) -> Dict[str, str]:
+        if not versions.synced:  # first request before the background sync ran
+            await sync_versions(db)
+        headers = {"ETag": catalog_etag(resource), "Cache-Control": CACHE_CONTROL}
+        if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return headers
+
+    return check
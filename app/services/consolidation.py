@@ -0,0 +1,319 @@
+"""Purchase consolidation — what the market run still has to buy.
+
+Outstanding quantities (approved − fulfilled) of open orders are read from
+`consolidation_lines`, which the write paths keep current by deltas (see
+app.services.demand), summed per product and store together with the
+product's 7-day market price (app.services.price_stats). Product, category,
+stall and store details come from `catalog_cache`, once per product. The
+cost follows the number of distinct products and stores, not the number of
+order lines.
+
+Both views, per product and per stall, come from that single scan.
+`consolidation_cache` keeps them per target date, tagged with the versions
+they depend on (DEMAND, bumped by every order and allocation writer, and the
+catalog resources), together with their encoded JSON: a warm request runs
+no query at all, and both endpoints share one computation per change.
+
+`rebuild_consolidation()` recomputes the table from the orders (recovery),
+`check_consolidation()` compares the two:
+
+    python -m scripts.rebuild_consolidation [--check]
+"""
+import asyncio
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app import models, schemas
+from app.metrics import register_cache
+from app.serialization import ResponseSerializer
+from app.services.catalog import catalog_cache
+from app.services.demand import OPEN_STATUSES, OUTSTANDING
+from app.services.locking import is_postgres
+from app.services.purchasing import DEMAND
+from app.services.versions import fetch_versions, sync_versions, versions
+
+UNCATEGORIZED = {"en": "Uncategorized"}
+UNASSIGNED = "Unassigned"
+
+# Versions the views are derived from: open demand, and the catalog rows
+# that name, price and group it
+DEPENDS_ON = (DEMAND, "products", "categories", "stalls", "stores")
+MAX_CACHED_DATES = 32
+
+
+def outstanding_query(target_date: Optional[date] = None):
+    """(product_id, store_id, quantity, market_price) of open demand, per product and store."""
+    line = models.ConsolidationLine
+    stmt = (
+        select(
+            line.product_id,
+            line.store_id,
+            func.sum(line.quantity).label("quantity"),
+            models.ProductPriceStats.avg_price_7d.label("market_price"),
+        )
+        .outerjoin(models.ProductPriceStats, line.product_id == models.ProductPriceStats.product_id)
+        .where(line.quantity > 0)
+        .group_by(line.product_id, line.store_id, models.ProductPriceStats.avg_price_7d)
+    )
+    if target_date:
+        stmt = stmt.where(line.delivery_date == target_date)
+    return stmt
+
+
+def recompute_query():
+    """consolidation_lines as computed from the order lines: (product_id, store_id, delivery_date, quantity)."""
+    return (
+        select(
+            models.OrderItem.product_id,
+            models.PurchaseOrder.store_id,
+            models.PurchaseOrder.delivery_date,
+            func.sum(OUTSTANDING).label("quantity"),
+        )
+        .join(models.PurchaseOrder, models.OrderItem.purchase_order_id == models.PurchaseOrder.id)
+        .where(
+            OUTSTANDING > 0,  # approved minus what batches already fulfilled
+            models.PurchaseOrder.status.in_(OPEN_STATUSES),
+        )
+        .group_by(models.OrderItem.product_id, models.PurchaseOrder.store_id, models.PurchaseOrder.delivery_date)
+    )
+
+
+async def rebuild_consolidation(db: AsyncSession) -> int:
+    """Replace consolidation_lines with a fresh computation from the orders. Returns the row count.
+
+    On PostgreSQL the table is locked first, so writers applying deltas wait
+    for the rebuild and then apply theirs on top of it. The caller commits.
+    """
+    lines = models.ConsolidationLine.__table__
+    if is_postgres(db):
+        await db.execute(text("LOCK TABLE consolidation_lines IN EXCLUSIVE MODE"))
+    await db.execute(delete(lines))
+    rows = [dict(row._mapping) for row in await db.execute(recompute_query())]
+    if rows:
+        await db.execute(lines.insert(), rows)
+    return len(rows)
+
+
+async def check_consolidation(db: AsyncSession) -> Dict:
+    """Lines whose stored quantity differs from the recomputation: key -> (stored, expected)."""
+    line = models.ConsolidationLine
+    stored = {
+        (row.product_id, row.store_id, row.delivery_date): row.quantity
+        for row in await db.execute(
+            select(line.product_id, line.store_id, line.delivery_date, line.quantity).where(line.quantity != 0)
+        )
+    }
+    expected = {
+        (row.product_id, row.store_id, row.delivery_date): row.quantity
+        for row in await db.execute(recompute_query())
+    }
+    return {
+        key: (stored.get(key, Decimal("0")), expected.get(key, Decimal("0")))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key, Decimal("0")) != expected.get(key, Decimal("0"))
+    }
+
+
+def expected_cost(unit_price: Optional[Decimal], quantity: Decimal) -> Optional[Decimal]:
+    return (unit_price * quantity).quantize(Decimal("0.01")) if unit_price is not None else None
+
+
+def _name_key(name_i18n: Dict[str, str]) -> str:
+    return name_i18n.get("en") or next(iter(name_i18n.values()), "")
+
+
+async def _products(db: AsyncSession, product_ids: Iterable) -> Dict:
+    """Catalog products by id; ids this worker has not seen yet are loaded directly."""
+    products, missing = {}, []
+    for product_id in product_ids:
+        product = await catalog_cache.lookup(db, "products", product_id)
+        if product is None:
+            missing.append(product_id)
+        else:
+            products[product_id] = product
+    if missing:  # created in another worker, version not propagated yet
+        rows = await db.scalars(
+            select(models.Product)
+            .where(models.Product.id.in_(missing))
+            .options(selectinload(models.Product.category))
+        )
+        products.update((p.id, schemas.Product.model_validate(p)) for p in rows)
+    return products
+
+
+async def _product_lines(db: AsyncSession, target_date: Optional[date]) -> List[dict]:
+    """One entry per product with its per-store breakdown, from one GROUP BY."""
+    rows = (await db.execute(outstanding_query(target_date))).all()
+    by_product: Dict = defaultdict(list)
+    market_prices = {}
+    for product_id, store_id, quantity, market_price in rows:
+        by_product[product_id].append((store_id, quantity))
+        market_prices[product_id] = market_price
+
+    products = await _products(db, by_product)
+    lines = []
+    for product_id, stores in by_product.items():
+        product = products[product_id]
+        breakdown = []
+        for store_id, quantity in stores:
+            store = await catalog_cache.lookup(db, "stores", store_id)
+            breakdown.append({"store_name": store.name if store else str(store_id), "quantity": quantity})
+        breakdown.sort(key=lambda b: b["store_name"])
+        total = sum((b["quantity"] for b in breakdown), Decimal("0"))
+        unit_price = market_prices[product_id] or product.price_reference
+        lines.append({
+            "product": product,
+            "product_id": product_id,
+            "product_name": product.name_i18n,
+            "unit": product.unit_i18n,
+            "price_reference": product.price_reference,
+            "expected_unit_price": unit_price,
+            "expected_cost_uzs": expected_cost(unit_price, total),
+            "total_quantity": total,
+            "breakdown": breakdown,
+        })
+    return lines
+
+
+def _by_product(lines: List[dict]) -> List[dict]:
+    """Product view (schemas.ConsolidatedItem), in category order."""
+    ordered = sorted(lines, key=lambda line: (
+        line["product"].category.sort_order if line["product"].category else 0,
+        _name_key(line["product_name"]),
+    ))
+    return [
+        {
+            **{k: v for k, v in line.items() if k not in ("product", "total_quantity")},
+            "category_name": line["product"].category.name_i18n if line["product"].category else UNCATEGORIZED,
+            "total_quantity_needed": line["total_quantity"],
+        }
+        for line in ordered
+    ]
+
+
+async def _by_stall(db: AsyncSession, lines: List[dict]) -> List[dict]:
+    """Stall view (schemas.StallConsolidation): lines grouped by the products' default stall."""
+    groups: Dict = {}
+    for line in sorted(lines, key=lambda line: _name_key(line["product_name"])):
+        stall_id = line["product"].default_stall_id
+        stall = await catalog_cache.lookup(db, "stalls", stall_id) if stall_id else None
+        group = groups.setdefault(stall.id if stall else None, {
+            "stall": stall,
+            "stall_name": stall.name if stall else UNASSIGNED,
+            "items": [],
+        })
+        group["items"].append({k: v for k, v in line.items() if k != "product"})
+
+    return sorted(
+        groups.values(),
+        key=lambda g: (g["stall"] is None, g["stall"].sort_order if g["stall"] else 999),
+    )
+
+
+class ConsolidationEntry:
+    """Both views of one scan of open demand, each encoded to JSON once."""
+
+    __slots__ = ("versions", "by_product", "by_stall", "_json")
+
+    def __init__(self, versions: Tuple[int, ...], by_product: List[dict], by_stall: List[dict]):
+        self.versions = versions
+        self.by_product = by_product
+        self.by_stall = by_stall
+        self._json: Dict[str, bytes] = {}
+
+    def _encode(self, view: str) -> bytes:
+        if view not in self._json:
+            self._json[view] = _SERIALIZERS[view].dump(getattr(self, view))
+        return self._json[view]
+
+    @property
+    def by_product_json(self) -> bytes:
+        return self._encode("by_product")
+
+    @property
+    def by_stall_json(self) -> bytes:
+        return self._encode("by_stall")
+
+
+_SERIALIZERS = {
+    "by_product": ResponseSerializer(List[schemas.ConsolidatedItem]),
+    "by_stall": ResponseSerializer(List[schemas.StallConsolidation]),
+}
+
+
+class ConsolidationCache:
+    """Per-worker consolidation views per target date, recomputed when a dependency version moves."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self._entries: Dict[Optional[date], ConsolidationEntry] = {}
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _current(self, target_date: Optional[date]) -> Optional[ConsolidationEntry]:
+        entry = self._entries.get(target_date)
+        if entry is None:
+            return None
+        latest = versions.snapshot(DEPENDS_ON)
+        return entry if all(have >= want for have, want in zip(entry.versions, latest)) else None
+
+    async def get(self, db: AsyncSession, target_date: Optional[date] = None) -> ConsolidationEntry:
+        if not versions.synced:  # first request before the background sync ran
+            await sync_versions(db)
+        entry = self._current(target_date)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        async with self._lock:
+            entry = self._current(target_date)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            # Version first, rows second: a write in between only makes the tag older
+            observed = await fetch_versions(db)
+            lines = await _product_lines(db, target_date)
+            versions.apply(observed)
+            entry = ConsolidationEntry(
+                tuple(observed.get(name, 0) for name in DEPENDS_ON),
+                _by_product(lines),
+                await _by_stall(db, lines),
+            )
+            self._entries.pop(target_date, None)
+            self._entries[target_date] = entry
+            while len(self._entries) > MAX_CACHED_DATES:  # oldest computed first
+                del self._entries[next(iter(self._entries))]
+            return entry
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+consolidation_cache = ConsolidationCache()
+register_cache("consolidation", consolidation_cache.stats)
+
+
+async def consolidate_by_product(db: AsyncSession, target_date: Optional[date] = None) -> List[dict]:
+    """Open demand per product (schemas.ConsolidatedItem), in category order."""
+    return (await consolidation_cache.get(db, target_date)).by_product
+
+
+async def consolidate_by_stall(db: AsyncSession, target_date: Optional[date] = None) -> List[dict]:
+    """Open demand grouped by the products' default stall (schemas.StallConsolidation)."""
+    return (await consolidation_cache.get(db, target_date)).by_stall
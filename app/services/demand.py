@@ -0,0 +1,106 @@
+"""Open demand — outstanding quantities of open orders, kept up to date by deltas.
+
+`consolidation_lines` holds the outstanding quantity (approved − fulfilled)
+per product, store and delivery date over open orders. Every write path
+that changes it applies the change as a delta in its own transaction:
+
+- order creation: + approved quantities (app.routers.orders)
+- approval edits: + new − old approved quantity
+- closing an order (delivered/cancelled with quantities outstanding): − the rest
+- cost allocation: − the quantity each batch fulfilled (app.services.purchasing)
+
+Deltas are added in place (`quantity = quantity + :delta`), so concurrent
+writers commute. The consolidation endpoints read the table instead of the
+order lines; `rebuild_consolidation()` / `check_consolidation()` in
+app.services.consolidation recompute it from the orders.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import delete, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import models
+from app.database import dialect_insert
+from app.services.locking import is_postgres
+
+# Orders whose outstanding quantities are still to be bought
+OPEN_STATUSES = (
+    models.OrderStatus.APPROVED,
+    models.OrderStatus.PURCHASING,
+    models.OrderStatus.PENDING,
+)
+
+# Approved quantity no batch has covered yet
+OUTSTANDING = models.OrderItem.quantity_approved - func.coalesce(models.OrderItem.quantity_fulfilled, 0)
+
+# (product_id, store_id, delivery_date); writers collect deltas in a defaultdict(Decimal)
+DemandKey = Tuple[object, object, date]
+
+
+async def apply_demand_deltas(db: AsyncSession, deltas: Dict[DemandKey, Decimal]) -> None:
+    """Add `deltas` to consolidation_lines in one upsert; lines that reach zero are removed."""
+    changes = sorted(((k, v) for k, v in deltas.items() if v), key=lambda kv: tuple(map(str, kv[0])))
+    if not changes:
+        return
+    lines = models.ConsolidationLine.__table__
+    insert = dialect_insert(db, lines)
+    # Keys in a fixed order: concurrent writers lock shared rows in the same sequence
+    await db.execute(
+        insert.on_conflict_do_update(
+            index_elements=[lines.c.product_id, lines.c.store_id, lines.c.delivery_date],
+            set_={"quantity": lines.c.quantity + insert.excluded.quantity},
+        ),
+        [
+            {"product_id": product_id, "store_id": store_id, "delivery_date": day, "quantity": quantity}
+            for (product_id, store_id, day), quantity in changes
+        ],
+    )
+    decreased = [key for key, quantity in changes if quantity < 0]
+    if decreased:
+        await db.execute(
+            delete(lines).where(
+                tuple_(lines.c.product_id, lines.c.store_id, lines.c.delivery_date).in_(decreased),
+                lines.c.quantity <= 0,
+            )
+        )
+
+
+async def lock_order_items(db: AsyncSession, order_ids: Iterable) -> None:
+    """PostgreSQL: lock the orders' items before their status changes.
+
+    Allocation locks items before orders; taking them in the same order
+    keeps a closing order and a concurrent batch from both subtracting the
+    same outstanding quantity.
+    """
+    if not is_postgres(db):
+        return
+    await db.execute(
+        select(models.OrderItem.id)
+        .where(models.OrderItem.purchase_order_id.in_(list(order_ids)))
+        .order_by(models.OrderItem.id)
+        .with_for_update()
+    )
+
+
+async def close_order_demand(db: AsyncSession, order_ids: Iterable) -> None:
+    """Remove what is still outstanding on orders that just left the open statuses."""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    rows = await db.execute(
+        select(
+            models.OrderItem.product_id,
+            models.PurchaseOrder.store_id,
+            models.PurchaseOrder.delivery_date,
+            func.sum(OUTSTANDING),
+        )
+        .join(models.PurchaseOrder, models.OrderItem.purchase_order_id == models.PurchaseOrder.id)
+        .where(models.OrderItem.purchase_order_id.in_(order_ids), OUTSTANDING > 0)
+        .group_by(models.OrderItem.product_id, models.PurchaseOrder.store_id, models.PurchaseOrder.delivery_date)
+    )
+    await apply_demand_deltas(db, {
+        (product_id, store_id, day): -quantity for product_id, store_id, day, quantity in rows
+    })
@@ -0,0 +1,168 @@
+"""Server-push events — order and allocation notifications for stream clients.
+
+Writers call `publish_event()` inside their transaction; nothing is sent
+unless it commits:
+- with LISTEN available (direct PostgreSQL) the event is queued as a NOTIFY
+  on EVENTS_CHANNEL, and every worker, this one included, receives it on
+  `version_sync`'s listener connection and hands it to its `broker`;
+- otherwise (SQLite, or a PgBouncer/Neon transaction pooler without
+  DATABASE_LISTEN_URL) the committing worker hands it to its own `broker`
+  from an `after_commit` hook, so only clients connected to that worker
+  hear about it. Run a single worker there, or set DATABASE_LISTEN_URL:
+  NOTIFY is sent through the pooler, only the listener needs a direct
+  connection.
+
+Events are notifications, not a replication log: they carry ids and a
+status, nothing is replayed, and clients fetch the data itself from
+GET /api/orders/changes, including after every (re)connect.
+"""
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, FrozenSet, Iterable, Iterator, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.metrics import EVENT_SUBSCRIBERS, EVENTS_DROPPED
+from app.services.versions import version_sync
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+EVENTS_CHANNEL = "eden_events"
+_PENDING = "pending_events"
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+NOTIFY_MAX_BYTES = 7900
+
+ORDER_CREATED = "order.created"
+ORDER_STATUS_CHANGED = "order.status_changed"
+ALLOCATION_DONE = "allocation.done"
+BILLS_GENERATED = "bills.generated"
+RESYNC = "resync"
+
+
+class Subscription:
+    """One stream client: its store filter and pending events."""
+
+    def __init__(self, store_ids: Optional[Iterable], maxsize: int):
+        self.store_ids: Optional[FrozenSet[str]] = (
+            frozenset(str(s) for s in store_ids) if store_ids else None
+        )
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def wants(self, evt: dict) -> bool:
+        return self.store_ids is None or evt.get("store_id") in self.store_ids
+
+
+class EventBroker:
+    """Fans committed events out to this worker's stream clients."""
+
+    def __init__(self, queue_size: int = settings.events_queue_size):
+        self.queue_size = queue_size
+        self._subscriptions: set = set()
+
+    @contextmanager
+    def subscribe(self, store_ids: Optional[Iterable] = None) -> Iterator[Subscription]:
+        """Receive events for `store_ids` (all stores when empty) while the block runs."""
+        sub = Subscription(store_ids, self.queue_size)
+        self._subscriptions.add(sub)
+        EVENT_SUBSCRIBERS.inc()
+        try:
+            yield sub
+        finally:
+            self._subscriptions.discard(sub)
+            EVENT_SUBSCRIBERS.dec()
+
+    def publish(self, evt: dict) -> None:
+        for sub in self._subscriptions:
+            if not sub.wants(evt):
+                continue
+            try:
+                sub.queue.put_nowait(evt)
+            except asyncio.QueueFull:
+                # Never block the writer on a slow client; it resyncs instead.
+                sub.overflowed = True
+                EVENTS_DROPPED.inc()
+
+    def deliver(self, payload: str) -> None:
+        try:
+            self.publish(json.loads(payload))
+        except (ValueError, TypeError) as e:
+            logger.warning("Dropping malformed event payload: %s", e)
+
+
+broker = EventBroker()
+
+
+def _encode(evt: dict) -> str:
+    payload = json.dumps(evt, default=str, separators=(",", ":"))
+    if len(payload.encode()) > NOTIFY_MAX_BYTES:
+        # Too many ids to carry: tell the client to pull the changes instead.
+        payload = json.dumps(
+            {"type": evt["type"], "store_id": evt["store_id"], "resync": True},
+            separators=(",", ":"),
+        )
+    return payload
+
+
+async def publish_event(db: AsyncSession, event_type: str, store_id, **data) -> None:
+    """Announce `event_type` to clients of `store_id` once the caller's transaction commits."""
+    payload = _encode({"type": event_type, "store_id": str(store_id), **data})
+    if db.get_bind().dialect.name == "postgresql" and version_sync.mode == "listen":
+        await db.execute(select(func.pg_notify(EVENTS_CHANNEL, payload)))
+    else:
+        db.sync_session.info.setdefault(_PENDING, []).append(payload)
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_committed_events(session):
+    for payload in session.info.pop(_PENDING, ()):
+        broker.deliver(payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_events(session):
+    session.info.pop(_PENDING, None)
+
+
+version_sync.relay(EVENTS_CHANNEL, lambda connection, pid, channel, payload: broker.deliver(payload))
+
+
+# --- Server-Sent Events ---
+
+def format_sse(evt: dict) -> str:
+    return f"event: {evt['type']}\ndata: {json.dumps(evt, separators=(',', ':'))}\n\n"
+
+
+async def event_stream(
+    store_ids: Optional[Iterable] = None,
+    heartbeat: float = settings.events_heartbeat_seconds,
+) -> AsyncIterator[str]:
+    """SSE body for one client; runs until the client disconnects.
+
+    Starts with a `ready` event (fetch GET /orders/changes now), then relays
+    events, with comment lines as heartbeats. A client that fell behind gets
+    a `resync` event in place of what it missed.
+    """
+    with broker.subscribe(store_ids) as sub:
+        yield "retry: 3000\n" + format_sse({"type": "ready"})
+        while True:
+            try:
+                evt = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if sub.overflowed:
+                sub.overflowed = False
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                yield format_sse({"type": RESYNC})
+                continue
+            yield format_sse(evt)
@@ -0,0 +1,205 @@
+"""Idempotency keys — safe retries for POST endpoints.
+
+A client that sends an `Idempotency-Key` header may repeat the request
+(flaky mobile connections in the market) without the work being done twice:
+
+1. `idempotent()` claims the key by inserting a row in the request's own
+   transaction, so the claim commits or rolls back together with the work.
+   A concurrent retry blocks on that row (PostgreSQL) and then sees it.
+2. Before the handler commits, `IdempotentRequest.respond()` stores the
+   response bytes on the row: work, claim and response commit together.
+3. A retry finds the row and gets the stored response back, marked with
+   `Idempotent-Replayed: true`.
+
+Failed requests roll their claim back, so they can be retried with the
+same key. A claim committed without a response (written before responses
+were stored with the work) answers 409 for `idempotency_in_progress_seconds`
+and is then free again. Keys are per user, expire after
+`idempotency_ttl_hours`, and are deleted in batches over the `expires_at`
+index by `KeySweeper`.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import and_, delete, or_, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import models
+from app.config import get_settings
+from app.database import AsyncSessionLocal, dialect_insert
+from app.dependencies import get_current_user, get_db
+from app.serialization import JSONBytesResponse, ResponseSerializer
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+SWEEP_BATCH = 1000
+
+
+class IdempotentRequest:
+    """The claim held by one request; inert when the client sent no key."""
+
+    def __init__(self, user_id=None, key: Optional[str] = None, replay: Optional[Response] = None):
+        self.user_id = user_id
+        self.key = key
+        self.replay = replay
+        self.response: Optional[Response] = None
+
+    async def respond(
+        self,
+        db: AsyncSession,
+        serializer: ResponseSerializer,
+        data,
+        status_code: int = 200,
+    ) -> Response:
+        """Encode the response and, with a key, store it for replays.
+
+        Call in the work's transaction, before its commit; the caller commits.
+        The response is also kept as `self.response`.
+        """
+        body = serializer.dump(data)
+        if self.key is not None:
+            await db.execute(
+                update(models.IdempotencyKey)
+                .where(
+                    models.IdempotencyKey.user_id == self.user_id,
+                    models.IdempotencyKey.key == self.key,
+                )
+                .values(status_code=status_code, response_body=body)
+            )
+        self.response = JSONBytesResponse(body, status_code=status_code)
+        return self.response
+
+
+def _request_hash(endpoint: str, body: bytes) -> str:
+    return hashlib.sha256(endpoint.encode() + b"\n" + body).hexdigest()
+
+
+def idempotent(endpoint: str):
+    """Dependency: claim the request's Idempotency-Key, or return the stored response as `replay`."""
+    async def claim(
+        request: Request,
+        current_user: models.User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db),
+    ) -> IdempotentRequest:
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return IdempotentRequest()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+
+        request_hash = _request_hash(endpoint, await request.body())
+        now = datetime.now(timezone.utc)
+        row = models.IdempotencyKey
+        insert = dialect_insert(db, row)
+        stmt = (
+            insert.values(
+                user_id=current_user.id, key=key, request_hash=request_hash,
+                created_at=now, expires_at=now + timedelta(hours=settings.idempotency_ttl_hours),
+            )
+            # An expired key is free again, even before the sweep removed it,
+            # and so is a claim left without a response for too long
+            .on_conflict_do_update(
+                index_elements=[row.user_id, row.key],
+                set_={
+                    "request_hash": insert.excluded.request_hash,
+                    "status_code": None,
+                    "response_body": None,
+                    "created_at": insert.excluded.created_at,
+                    "expires_at": insert.excluded.expires_at,
+                },
+                where=or_(
+                    row.expires_at < now,
+                    and_(
+                        row.response_body.is_(None),
+                        row.created_at < now - timedelta(seconds=settings.idempotency_in_progress_seconds),
+                    ),
+                ),
+            )
+            .returning(row.key)
+        )
+        if (await db.execute(stmt)).first() is not None:
+            return IdempotentRequest(current_user.id, key)
+
+        stored = (await db.execute(
+            select(row.request_hash, row.status_code, row.response_body)
+            .where(row.user_id == current_user.id, row.key == key)
+        )).one()
+        await db.rollback()
+        if stored.request_hash != request_hash:
+            raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different request")
+        if stored.response_body is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        return IdempotentRequest(replay=JSONBytesResponse(
+            stored.response_body, status_code=stored.status_code, headers={REPLAYED_HEADER: "true"},
+        ))
+
+    return claim
+
+
+async def purge_expired_keys(db: AsyncSession, batch_size: int = SWEEP_BATCH) -> int:
+    """Delete expired keys in short batches (oldest first). Returns the number deleted."""
+    row = models.IdempotencyKey
+    total = 0
+    while True:
+        expired = (
+            select(row.user_id, row.key)
+            .where(row.expires_at < datetime.now(timezone.utc))
+            .order_by(row.expires_at)
+            .limit(batch_size)
+        )
+        result = await db.execute(
+            delete(row)
+            .where(tuple_(row.user_id, row.key).in_(expired))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+
+class KeySweeper:
+    """Background task deleting expired idempotency keys in this worker."""
+
+    def __init__(self, interval: float = settings.idempotency_sweep_interval):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="idempotency-sweep")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    deleted = await purge_expired_keys(db)
+                if deleted:
+                    logger.info("Swept %d expired idempotency keys", deleted)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Idempotency key sweep failed: %s", e)
+
+
+key_sweeper = KeySweeper()
@@ -0,0 +1,110 @@
+"""Locking helpers for writers that must not interleave (cost allocation, ...).
+
+- `advisory_xact_locks()`: PostgreSQL transaction-scoped advisory locks on
+  a set of keys, taken in sorted order so concurrent writers cannot
+  deadlock on them. Released at commit/rollback (or at rollback to a
+  savepoint taken before them).
+- `KeyedLocks`: the in-process equivalent for SQLite, where there is one
+  writer process and no advisory locks.
+- `retry_on_conflict()`: runs a unit of work in a SAVEPOINT and repeats it
+  when PostgreSQL reports a serialization failure or deadlock, without
+  losing what the outer transaction already did.
+"""
+import asyncio
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Iterable, List, TypeVar
+from uuid import UUID
+from weakref import WeakValueDictionary
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+def is_postgres(db: AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def lock_key(value: UUID) -> int:
+    """32-bit advisory lock key for a UUID; a collision only serializes two unrelated keys."""
+    return int.from_bytes(value.bytes[:4], "big", signed=True)
+
+
+async def advisory_xact_locks(db: AsyncSession, namespace: int, keys: Iterable[int]) -> None:
+    """Take `pg_advisory_xact_lock(namespace, key)` for every key, in ascending order. No-op off PostgreSQL."""
+    keys = sorted(set(keys))
+    if not keys or not is_postgres(db):
+        return
+    await db.execute(
+        text(
+            "SELECT count(pg_advisory_xact_lock(:namespace, k)) "
+            "FROM (SELECT unnest(CAST(:keys AS integer[])) AS k ORDER BY 1) AS ordered"
+        ),
+        {"namespace": namespace, "keys": keys},
+    )
+
+
+class KeyedLocks:
+    """asyncio locks by key, created on demand and dropped once unused."""
+
+    def __init__(self):
+        self._locks: "WeakValueDictionary[object, asyncio.Lock]" = WeakValueDictionary()
+
+    def _lock(self, key) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def hold(self, keys: Iterable):
+        """Hold the locks of all `keys` (acquired in sorted order) for the block."""
+        locks: List[asyncio.Lock] = [self._lock(key) for key in sorted(set(keys), key=str)]
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+def _sqlstate(exc: DBAPIError):
+    return getattr(exc.orig, "sqlstate", None) or getattr(exc.orig, "pgcode", None)
+
+
+async def retry_on_conflict(
+    db: AsyncSession,
+    work: Callable[[], Awaitable[T]],
+    attempts: int = settings.db_conflict_retries,
+) -> T:
+    """Run `work()` in a SAVEPOINT, retrying serialization failures and deadlocks (PostgreSQL).
+
+    Elsewhere `work()` simply runs once.
+    """
+    if not is_postgres(db):
+        return await work()
+    for attempt in range(1, attempts + 1):
+        try:
+            async with db.begin_nested():
+                return await work()
+        except DBAPIError as e:
+            if attempt == attempts or _sqlstate(e) not in RETRYABLE_SQLSTATES:
+                raise
+            logger.warning("Retrying after %s (attempt %d/%d)", _sqlstate(e), attempt, attempts)
+            await asyncio.sleep(random.uniform(0, 0.05 * 2 ** attempt))
@@ -0,0 +1,94 @@
+"""Keyset (cursor) pagination helpers.
+
+Pages are sliced by the last row seen instead of an OFFSET, so every page
+costs the same index range scan however deep into the history it is.
+Cursors are opaque to clients: url-safe base64 of the sort key of the last
+row on the page.
+
+List endpoints keep returning a plain JSON array; the cursor for the next
+page travels in the `X-Next-Cursor` and `Link` response headers.
+"""
+import base64
+import json
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Optional, Sequence, Tuple, Union
+from uuid import UUID
+
+from fastapi import HTTPException, Request
+from sqlalchemy import and_, or_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+Position = Union[datetime, int]
+
+
+def encode_cursor(position: Position, row_id: UUID) -> str:
+    """Cursor for a row sorted by (timestamp or sequence number, id)."""
+    value = position.isoformat() if isinstance(position, datetime) else position
+    raw = json.dumps([value, str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: Optional[type] = datetime) -> Tuple[Position, UUID]:
+    """Inverse of `encode_cursor`; a malformed cursor, or one of another `kind`, is a 400, not a 500."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(position, int):
+            position = datetime.fromisoformat(position)
+        if kind is not None and not isinstance(position, kind):
+            raise ValueError(position)
+        return position, UUID(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor_desc(ts_col, id_col, cursor: str):
+    """WHERE clause for rows after `cursor` in `ORDER BY ts DESC, id DESC`.
+
+    Spelled out instead of a row-value comparison so the dialects agree on
+    parameter typing; PostgreSQL still satisfies it from a (…, ts) index.
+    """
+    position, row_id = decode_cursor(cursor)
+    return or_(
+        ts_col < position,
+        and_(ts_col == position, id_col < row_id),
+    )
+
+
+def after_cursor_asc(ts_col, id_col, cursor: str, kind: type = datetime):
+    """WHERE clause for rows after `cursor` in `ORDER BY ts ASC, id ASC`."""
+    position, row_id = decode_cursor(cursor, kind)
+    return or_(
+        ts_col > position,
+        and_(ts_col == position, id_col > row_id),
+    )
+
+
+def day_start(day: date) -> datetime:
+    """UTC midnight at the start of `day`."""
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def day_end(day: date) -> datetime:
+    """UTC midnight after `day` (exclusive upper bound)."""
+    return day_start(day) + timedelta(days=1)
+
+
+def page_headers(request: Request, rows: Sequence, limit: Optional[int]) -> Tuple[Sequence, Dict[str, str]]:
+    """Trim the extra look-ahead row and build next-page headers.
+
+    Callers fetch `limit + 1` rows; the extra one only signals that another
+    page exists.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, {}
+    rows = rows[:limit]
+    last = rows[-1]
+    cursor = encode_cursor(last.created_at, last.id)
+    next_url = request.url.include_query_params(cursor=cursor)
+    return rows, {
+        NEXT_CURSOR_HEADER: cursor,
+        "Link": f'<{next_url}>; rel="next"',
+    }
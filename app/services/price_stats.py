@@ -0,0 +1,124 @@
+"""Product price statistics — market prices paid, from purchase batches.
+
+Every batch line is a real price paid. `record_batch_prices()` folds a batch
+into two compact tables instead of rescanning batch_items:
+
+- product_price_days: quantity and cost bought per product and day, added
+  to in place (one row per product per purchase day);
+- product_price_stats: per product, the last price paid, the quantity-
+  weighted average over the 7 days up to the last purchase, and the lowest
+  and highest price ever paid.
+
+It runs inside `submit_purchase_batch`, under the same per-product locks as
+cost allocation, in three statements whatever the batch size (four with
+`price_reference_auto_refresh`, which keeps `Product.price_reference` at the
+7-day average).
+"""
+from datetime import date, datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import List
+
+from sqlalchemy import case, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import models
+from app.config import get_settings
+from app.database import dialect_insert
+
+settings = get_settings()
+
+PRICE_WINDOW_DAYS = 7
+PRICE_STEP = Decimal("0.01")
+
+
+def _price(cost: Decimal, quantity: Decimal) -> Decimal:
+    return (Decimal(cost) / Decimal(quantity)).quantize(PRICE_STEP, ROUND_HALF_UP)
+
+
+async def record_batch_prices(db: AsyncSession, purchase_date: date, lines: List[models.BatchItem]) -> bool:
+    """Add a batch's lines to the price statistics.
+
+    Returns True when product price references were refreshed (the caller
+    bumps the "products" version).
+    """
+    if not lines:
+        return False
+    product_ids = [line.product_id for line in lines]
+
+    days = models.ProductPriceDay.__table__
+    insert = dialect_insert(db, days)
+    await db.execute(
+        insert.on_conflict_do_update(
+            index_elements=[days.c.product_id, days.c.day],
+            set_={
+                "quantity_bought": days.c.quantity_bought + insert.excluded.quantity_bought,
+                "total_cost_uzs": days.c.total_cost_uzs + insert.excluded.total_cost_uzs,
+            },
+        ),
+        [
+            {
+                "product_id": line.product_id, "day": purchase_date,
+                "quantity_bought": line.total_quantity_bought, "total_cost_uzs": line.total_cost_uzs,
+            }
+            for line in lines
+        ],
+    )
+
+    # At most PRICE_WINDOW_DAYS rows per product, over the primary key
+    window = await db.execute(
+        select(days.c.product_id, func.sum(days.c.quantity_bought), func.sum(days.c.total_cost_uzs))
+        .where(
+            days.c.product_id.in_(product_ids),
+            days.c.day > purchase_date - timedelta(days=PRICE_WINDOW_DAYS),
+            days.c.day <= purchase_date,
+        )
+        .group_by(days.c.product_id)
+    )
+    averages = {product_id: _price(cost, quantity) for product_id, quantity, cost in window}
+
+    prices = {line.product_id: _price(line.total_cost_uzs, line.total_quantity_bought) for line in lines}
+    stats = models.ProductPriceStats.__table__
+    insert = dialect_insert(db, stats)
+    now = datetime.now(timezone.utc)
+    await db.execute(
+        insert.on_conflict_do_update(
+            index_elements=[stats.c.product_id],
+            set_={
+                "last_price": insert.excluded.last_price,
+                "last_purchased_on": insert.excluded.last_purchased_on,
+                "avg_price_7d": insert.excluded.avg_price_7d,
+                "min_price": case(
+                    (insert.excluded.min_price < stats.c.min_price, insert.excluded.min_price),
+                    else_=stats.c.min_price,
+                ),
+                "max_price": case(
+                    (insert.excluded.max_price > stats.c.max_price, insert.excluded.max_price),
+                    else_=stats.c.max_price,
+                ),
+                "purchase_count": stats.c.purchase_count + 1,
+                "updated_at": insert.excluded.updated_at,
+            },
+        ),
+        [
+            {
+                "product_id": product_id,
+                "last_price": price,
+                "last_purchased_on": purchase_date,
+                "avg_price_7d": averages[product_id],
+                "min_price": price,
+                "max_price": price,
+                "purchase_count": 1,
+                "updated_at": now,
+            }
+            for product_id, price in prices.items()
+        ],
+    )
+
+    if not settings.price_reference_auto_refresh:
+        return False
+    await db.execute(
+        update(models.Product),
+        [{"id": product_id, "price_reference": average} for product_id, average in averages.items()],
+    )
+    return True
@@ -1,151 +1,313 @@
 """Purchasing service — handles purchase batch recording and cost allocation.
 
 Extracted from app.routers.purchases to separate business logic from HTTP handling.
+
+Concurrent purchasers: allocation of a product is serialized by a per-product
+lock (PostgreSQL advisory lock, or an in-process lock on SQLite), and the
+candidate rows are locked FOR UPDATE against other writers. Batches for
+unrelated products proceed in parallel. On PostgreSQL the allocation runs
+in a savepoint and is retried on deadlocks and serialization failures.
+
+Allocations are appended to the `allocation_entries` ledger, one row per
+batch line and order item; the item's `quantity_fulfilled` and
+`allocated_cost_uzs` are running totals over its entries, incremented in
+place. An item keeps taking from later batches (a second trip to the
+market) until its approved quantity is fulfilled.
 """
-from decimal import Decimal
-from typing import List, Set
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Awaitable, Callable, Iterable, List, NamedTuple, Optional, Set
+from uuid import uuid4
 
+from sqlalchemy import bindparam, case, exists, func, insert, literal, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app import models, schemas
+from app.services.demand import OPEN_STATUSES, OUTSTANDING, apply_demand_deltas
+from app.services.events import ALLOCATION_DONE, publish_event
+from app.services.locking import KeyedLocks, advisory_xact_locks, is_postgres, lock_key, retry_on_conflict
+from app.services.price_stats import record_batch_prices
+from app.services.versions import bump_after_commit
 
+# Orders whose items still take costs from new batches
+ALLOCATABLE_STATUSES = OPEN_STATUSES
 
-async def allocate_costs_for_batch_item(
-    db: AsyncSession,
-    product_id,
-    total_quantity_bought: Decimal,
-    total_cost_uzs: Decimal,
-) -> Set:
+# Scale of OrderItem.quantity_fulfilled / allocated_cost_uzs (and the ledger)
+QUANTITY_STEP = Decimal("0.001")
+COST_STEP = Decimal("0.01")
+
+# Shared version (app.services.versions) of everything allocation reads:
+# open orders and their outstanding items. Bumped by every writer
+# that changes them; cached demand (the allocation preview) follows it.
+DEMAND = "demand"
+
+# pg_advisory_xact_lock(namespace, key) namespace for per-product allocation locks
+ALLOCATION_LOCK_NAMESPACE = 0x414C4C4F  # "ALLO"
+
+# SQLite: one process, so per-product asyncio locks held until commit
+_local_product_locks = KeyedLocks()
+
+
+class BatchLine(NamedTuple):
+    product_id: object
+    total_quantity_bought: Decimal
+    total_cost_uzs: Decimal
+
+
+class Allocation(NamedTuple):
+    item_id: object
+    order_id: object
+    store_id: object
+    product_id: object
+    quantity_fulfilled: Decimal
+    cost_uzs: Decimal
+
+
+def compute_allocations(lines: Iterable, candidates: Iterable) -> List[Allocation]:
     """
-    Allocate costs from a purchased batch item to pending order items.
+    Distribute each batch line's cost over the candidate order items of its product.
 
-    1. Calculate unit price
-    2. Find all unallocated order items for this product
-    3. Distribute cost proportionally based on fulfillment ratio
+    Pure function: `lines` need product_id, total_quantity_bought and
+    total_cost_uzs; `candidates` need id, purchase_order_id, store_id,
+    product_id and quantity_outstanding (rows of `candidate_items_query()`).
 
-    Returns:
-        Set of affected order IDs
+    Per product:
+    1. unit price = cost / quantity bought
+    2. fulfillment ratio = bought / total outstanding, capped at 1.0
+    3. each item gets outstanding × ratio, costed at the unit price
+
+    Quantities and costs are rounded to the columns' scale, so a fully
+    covered item ends up with exactly its approved quantity.
     """
-    affected_order_ids = set()
-    unit_price = total_cost_uzs / total_quantity_bought
+    by_product = defaultdict(list)
+    for item in candidates:
+        by_product[item.product_id].append(item)
+
+    allocations = []
+    for line in lines:
+        items = by_product.get(line.product_id)
+        if not items:
+            continue
+        total_requested = sum(item.quantity_outstanding for item in items)
+        if total_requested <= 0:
+            continue
 
-    # Find unallocated order items for this product
+        unit_price = line.total_cost_uzs / line.total_quantity_bought
+        fulfillment_ratio = min(line.total_quantity_bought / total_requested, Decimal("1.0"))
+        for item in items:
+            qty_fulfilled = (item.quantity_outstanding * fulfillment_ratio).quantize(QUANTITY_STEP, ROUND_HALF_UP)
+            if qty_fulfilled <= 0:
+                continue
+            allocations.append(Allocation(
+                item.id, item.purchase_order_id, item.store_id, item.product_id,
+                qty_fulfilled, (qty_fulfilled * unit_price).quantize(COST_STEP, ROUND_HALF_UP),
+            ))
+    return allocations
+
+
+def candidate_items_query(product_ids: Optional[Iterable] = None):
+    """Order items of open orders with outstanding quantity (for the given products, or all)."""
     stmt = (
-        select(models.OrderItem)
+        select(
+            models.OrderItem.id,
+            models.OrderItem.purchase_order_id,
+            models.OrderItem.product_id,
+            OUTSTANDING.label("quantity_outstanding"),
+            models.PurchaseOrder.store_id,
+            models.PurchaseOrder.delivery_date,
+        )
         .join(models.PurchaseOrder)
         .where(
-            models.OrderItem.product_id == product_id,
-            models.OrderItem.quantity_approved > 0,
-            models.OrderItem.allocated_cost_uzs == None,  # noqa: E711
-            models.PurchaseOrder.status.in_([
-                models.OrderStatus.APPROVED,
-                models.OrderStatus.PURCHASING,
-                models.OrderStatus.PENDING,
-            ]),
+            OUTSTANDING > 0,
+            models.PurchaseOrder.status.in_(ALLOCATABLE_STATUSES),
         )
     )
-    result = await db.execute(stmt)
-    order_items = result.scalars().all()
+    if product_ids is not None:
+        stmt = stmt.where(models.OrderItem.product_id.in_(list(product_ids)))
+    return stmt
 
-    if not order_items:
-        return affected_order_ids
 
-    total_requested = sum(oi.quantity_approved for oi in order_items)
-    if total_requested <= 0:
-        return affected_order_ids
+async def allocate_batch_costs(db: AsyncSession, lines: List[models.BatchItem]) -> List[Allocation]:
+    """
+    Allocate every line of a batch in a constant number of statements.
 
-    # Cap fulfillment ratio at 1.0
-    fulfillment_ratio = min(total_quantity_bought / total_requested, Decimal("1.0"))
+    `lines` are the batch's flushed BatchItems. One SELECT loads (and locks)
+    the candidate items of all products, the allocations are computed in
+    memory, appended to the ledger with one INSERT, added to the items'
+    totals with one executemany UPDATE and taken off the open demand
+    (app.services.demand) with one upsert. On PostgreSQL the products' advisory
+    locks are taken first and held until the transaction ends.
+    """
+    if not lines:
+        return []
+    product_ids = {line.product_id for line in lines}
+    await advisory_xact_locks(db, ALLOCATION_LOCK_NAMESPACE, (lock_key(pid) for pid in product_ids))
+    candidates = (await db.execute(
+        candidate_items_query(product_ids).with_for_update(of=models.OrderItem)
+    )).all()
+    allocations = compute_allocations(lines, candidates)
+    if not allocations:
+        return allocations
 
-    for oi in order_items:
-        qty_fulfilled = oi.quantity_approved * fulfillment_ratio
-        cost_for_store = qty_fulfilled * unit_price
+    batch_item_ids = {line.product_id: line.id for line in lines}
+    now = datetime.now(timezone.utc)
+    await db.execute(insert(models.AllocationEntry), [
+        {
+            "id": uuid4(), "batch_item_id": batch_item_ids[a.product_id], "order_item_id": a.item_id,
+            "quantity": a.quantity_fulfilled, "cost_uzs": a.cost_uzs, "created_at": now,
+        }
+        for a in allocations
+    ])
 
-        oi.quantity_fulfilled = qty_fulfilled
-        oi.allocated_cost_uzs = cost_for_store
-        db.add(oi)
-        affected_order_ids.add(oi.purchase_order_id)
+    items = models.OrderItem.__table__
+    await db.execute(
+        update(items)
+        .where(items.c.id == bindparam("item_id", type_=items.c.id.type))
+        .values(
+            quantity_fulfilled=func.coalesce(items.c.quantity_fulfilled, 0)
+            + bindparam("quantity", type_=items.c.quantity_fulfilled.type),
+            allocated_cost_uzs=func.coalesce(items.c.allocated_cost_uzs, 0)
+            + bindparam("cost", type_=items.c.allocated_cost_uzs.type),
+        ),
+        [{"item_id": a.item_id, "quantity": a.quantity_fulfilled, "cost": a.cost_uzs} for a in allocations],
+    )
 
-    return affected_order_ids
+    delivery_dates = {item.id: item.delivery_date for item in candidates}
+    fulfilled = defaultdict(Decimal)
+    for a in allocations:
+        fulfilled[a.product_id, a.store_id, delivery_dates[a.item_id]] -= a.quantity_fulfilled
+    await apply_demand_deltas(db, fulfilled)
+    return allocations
 
 
-async def update_order_statuses(db: AsyncSession, order_ids: Set) -> None:
+async def allocate_costs_for_batch_item(db: AsyncSession, batch_item: models.BatchItem) -> Set:
     """
-    Update order statuses based on allocation completeness.
-    Orders with all items allocated → DELIVERED, otherwise → PURCHASING.
+    Allocate costs from a single purchased batch item to pending order items.
+
+    Returns:
+        Set of affected order IDs
     """
-    for order_id in order_ids:
-        order_result = await db.execute(
-            select(models.PurchaseOrder)
-            .options(selectinload(models.PurchaseOrder.items))
-            .where(models.PurchaseOrder.id == order_id)
-        )
-        order = order_result.scalars().first()
-        if not order:
-            continue
+    allocations = await allocate_batch_costs(db, [batch_item])
+    return {a.order_id for a in allocations}
 
-        all_allocated = all(
-            item.allocated_cost_uzs is not None for item in order.items
+
+async def update_order_statuses(db: AsyncSession, order_ids: Set) -> None:
+    """
+    Update order statuses based on allocation completeness, in one UPDATE.
+    Orders with all items fulfilled → DELIVERED, otherwise → PURCHASING.
+
+    Also moves `change_seq`: item allocations changed even where the status
+    stays the same (see app.services.order_changes).
+    """
+    if not order_ids:
+        return
+    if is_postgres(db):
+        # Wait for other batches touching these orders to commit (locking in id
+        # order), so the EXISTS below sees their allocations.
+        await db.execute(
+            select(models.PurchaseOrder.id)
+            .where(models.PurchaseOrder.id.in_(list(order_ids)))
+            .order_by(models.PurchaseOrder.id)
+            .with_for_update()
         )
-        order.status = models.OrderStatus.DELIVERED if all_allocated else models.OrderStatus.PURCHASING
+    status_type = models.PurchaseOrder.status.type
+    outstanding = exists().where(
+        models.OrderItem.purchase_order_id == models.PurchaseOrder.id,
+        OUTSTANDING > 0,
+    )
+    await db.execute(
+        update(models.PurchaseOrder)
+        .where(models.PurchaseOrder.id.in_(list(order_ids)))
+        .values(status=case(
+            (outstanding, literal(models.OrderStatus.PURCHASING, status_type)),
+            else_=literal(models.OrderStatus.DELIVERED, status_type),
+        ))
+        .execution_options(synchronize_session=False)
+    )
 
 
 async def submit_purchase_batch(
     db: AsyncSession,
     current_user: models.User,
     batch_in: schemas.BatchCreate,
+    before_commit: Optional[Callable[[models.PurchaseBatch], Awaitable]] = None,
 ) -> models.PurchaseBatch:
     """
     Record a purchase batch and allocate costs to pending orders.
 
     1. Create PurchaseBatch record
-    2. For each item, calculate unit price and allocate to order items
+    2. Allocate every line to order items (constant statement count)
     3. Update affected order statuses
-    4. Return the completed batch
+    4. Fold the prices paid into the product price statistics
+    5. Notify the affected stores (allocation.done events)
+    6. Return the completed batch
+
+    `before_commit` is awaited with the completed batch inside the
+    transaction, e.g. to store the response for Idempotency-Key replays.
 
     Returns:
         The created PurchaseBatch with items loaded.
     """
-    # 1. Create batch
-    new_batch = models.PurchaseBatch(
-        purchaser_id=current_user.id,
-        market_location=batch_in.market_location,
-        status=models.BatchStatus.FINALIZED,
-    )
-    db.add(new_batch)
-    await db.flush()
-
-    # 2. Process items and allocate costs
-    all_affected_order_ids = set()
-    for item_in in batch_in.items:
-        unit_price = item_in.total_cost_uzs / item_in.total_quantity_bought
-
-        new_batch_item = models.BatchItem(
-            purchase_batch_id=new_batch.id,
-            product_id=item_in.product_id,
-            total_quantity_bought=item_in.total_quantity_bought,
-            total_cost_uzs=item_in.total_cost_uzs,
-            unit_price_calculated=unit_price,
-        )
-        db.add(new_batch_item)
+    product_ids = [item_in.product_id for item_in in batch_in.items]
 
-        affected = await allocate_costs_for_batch_item(
-            db, item_in.product_id, item_in.total_quantity_bought, item_in.total_cost_uzs
+    async def record_and_allocate():
+        # 1. Create batch
+        new_batch = models.PurchaseBatch(
+            purchaser_id=current_user.id,
+            market_location=batch_in.market_location,
+            status=models.BatchStatus.FINALIZED,
         )
-        all_affected_order_ids |= affected
+        db.add(new_batch)
+        await db.flush()
 
-    # 3. Update order statuses
-    await update_order_statuses(db, all_affected_order_ids)
+        batch_items = [
+            models.BatchItem(
+                purchase_batch_id=new_batch.id,
+                product_id=item_in.product_id,
+                total_quantity_bought=item_in.total_quantity_bought,
+                total_cost_uzs=item_in.total_cost_uzs,
+                unit_price_calculated=item_in.total_cost_uzs / item_in.total_quantity_bought,
+            )
+            for item_in in batch_in.items
+        ]
+        db.add_all(batch_items)
+        await db.flush()
 
-    await db.commit()
+        # 2. Allocate costs for all lines at once
+        allocations = await allocate_batch_costs(db, batch_items)
 
-    # 4. Reload with items
-    stmt = (
-        select(models.PurchaseBatch)
-        .options(selectinload(models.PurchaseBatch.items))
-        .where(models.PurchaseBatch.id == new_batch.id)
-    )
-    result = await db.execute(stmt)
-    return result.scalars().first()
+        # 3. Update order statuses
+        await update_order_statuses(db, {a.order_id for a in allocations})
+
+        # 4. Price statistics (under the same product locks as the allocation)
+        prices_refreshed = await record_batch_prices(db, new_batch.purchase_date, batch_items)
+        return new_batch, batch_items, allocations, prices_refreshed
+
+    # Advisory locks are taken inside the savepoint on PostgreSQL; the local
+    # locks (SQLite) cover everything up to the commit.
+    async with _local_product_locks.hold([] if is_postgres(db) else product_ids):
+        new_batch, batch_items, allocations, prices_refreshed = await retry_on_conflict(db, record_and_allocate)
+
+        # 5. Notify affected stores
+        orders_by_store = defaultdict(set)
+        for a in allocations:
+            orders_by_store[a.store_id].add(a.order_id)
+        for store_id, order_ids in orders_by_store.items():
+            await publish_event(
+                db, ALLOCATION_DONE, store_id, batch_id=new_batch.id, order_ids=sorted(order_ids, key=str),
+            )
+
+        # 6. Items are known already; attach them instead of reloading
+        set_committed_value(new_batch, "items", batch_items)
+        if before_commit is not None:
+            await before_commit(new_batch)
+        await db.commit()
+
+    # Outside the product locks and the work's transaction: the version rows are shared by all writers
+    changed = ([DEMAND] if allocations else []) + (["products"] if prices_refreshed else [])
+    if changed:
+        await bump_after_commit(db, *changed)
+    return new_batch
@@ -0,0 +1,226 @@
+"""Shared resource versions — cross-worker cache invalidation.
+
+Cached data (the catalog, ...) is tagged with the versions of the resources it
+was built from. Writers call `bump_versions()` inside their transaction: the
+counters in `resource_versions` are incremented and, on PostgreSQL, a NOTIFY
+is queued that the server delivers only if the transaction commits.
+
+Every worker keeps the newest versions it has seen in `versions`:
+- the committing worker applies its own bump from an `after_commit` hook;
+- other workers hear about it over LISTEN, or by polling the table when
+  LISTEN is unavailable (SQLite, or a PgBouncer/Neon transaction pooler
+  without DATABASE_LISTEN_URL).
+
+Versions only ever move forward locally, so a late notification or a poll
+racing a commit cannot roll a cache back.
+
+A bump row-locks its `resource_versions` row until the transaction ends.
+Hot write paths (orders, cost allocation: "demand") must not hold that lock
+for their whole transaction, so they call `bump_after_commit()` instead: the
+bump runs in a short transaction of its own right after the work committed.
+Caches loaded in between are tagged with the old version and reload once
+the bump lands; a bump lost to a crash in that gap leaves caches stale until
+the resource's next write.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import dialect_insert, listen_engine, supports_listen
+from app.models import ResourceVersion
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+CHANNEL = "eden_resource_versions"
+_PENDING = "pending_resource_versions"
+
+
+class VersionRegistry:
+    """The newest resource versions this worker knows of."""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self.synced = False  # True once loaded from the database
+
+    def get(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def snapshot(self, names: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._versions.get(name, 0) for name in names)
+
+    def apply(self, observed: Dict[str, int]) -> List[str]:
+        """Merge observed versions, keeping the higher of old and new. Returns changed names."""
+        changed = []
+        for name, version in observed.items():
+            if version > self._versions.get(name, 0):
+                self._versions[name] = version
+                changed.append(name)
+        return changed
+
+    def reset(self) -> None:
+        self._versions.clear()
+        self.synced = False
+
+
+versions = VersionRegistry()
+
+
+def _encode(bumped: Dict[str, int]) -> str:
+    return ",".join(f"{name}={version}" for name, version in bumped.items())
+
+
+def _decode(payload: str) -> Dict[str, int]:
+    observed = {}
+    for part in payload.split(","):
+        name, _, version = part.partition("=")
+        if name and version.isdigit():
+            observed[name] = int(version)
+    return observed
+
+
+async def bump_versions(db: AsyncSession, *names: str) -> None:
+    """Increment resource versions as part of the caller's transaction.
+
+    Call before `commit()`; nothing becomes visible (locally or to other
+    workers) unless the transaction commits.
+    """
+    names = tuple(sorted(set(names)))  # fixed lock order for concurrent writers
+    insert = dialect_insert(db, ResourceVersion)
+    stmt = (
+        insert.values([{"name": name, "version": 1} for name in names])
+        .on_conflict_do_update(
+            index_elements=[ResourceVersion.name],
+            set_={"version": ResourceVersion.version + 1, "updated_at": func.current_timestamp()},
+        )
+        .returning(ResourceVersion.name, ResourceVersion.version)
+    )
+    bumped = dict((await db.execute(stmt)).all())
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(select(func.pg_notify(CHANNEL, _encode(bumped))))
+    db.sync_session.info.setdefault(_PENDING, {}).update(bumped)
+
+
+async def bump_after_commit(db: AsyncSession, *names: str) -> None:
+    """Increment resource versions in a transaction of their own; call after `commit()`.
+
+    Runs on a session of its own, so a failure cannot expire the caller's
+    objects; the work is committed already, so it is logged, not raised.
+    """
+    try:
+        async with AsyncSession(db.bind, expire_on_commit=False, autoflush=False) as bump_db:
+            await bump_versions(bump_db, *names)
+            await bump_db.commit()
+    except Exception as e:
+        logger.warning("Resource version bump %s failed after commit: %s", ",".join(names), e)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_versions(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        versions.apply(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_versions(session):
+    session.info.pop(_PENDING, None)
+
+
+async def fetch_versions(conn) -> Dict[str, int]:
+    """Current versions from the database (`conn`: AsyncSession or AsyncConnection)."""
+    result = await conn.execute(select(ResourceVersion.name, ResourceVersion.version))
+    return dict(result.all())
+
+
+async def sync_versions(conn) -> List[str]:
+    """Pull versions from the database into this worker. Returns changed names."""
+    changed = versions.apply(await fetch_versions(conn))
+    versions.synced = True
+    return changed
+
+
+class VersionSync:
+    """Background task keeping `versions` current in this worker.
+
+    In listen mode its connection also carries other NOTIFY channels
+    registered with `relay()` (see app.services.events).
+    """
+
+    def __init__(self, target: AsyncEngine = listen_engine, poll_interval: float = settings.versions_poll_interval):
+        self.target = target
+        self.poll_interval = poll_interval
+        self.mode = "listen" if supports_listen(target) else "poll"
+        self._channels: Dict[str, Callable] = {CHANNEL: self._on_notify}
+        self._task: Optional[asyncio.Task] = None
+
+    def relay(self, channel: str, callback: Callable) -> None:
+        """Also LISTEN on `channel`; call before `start()`. Only used in listen mode."""
+        self._channels[channel] = callback
+
+    async def start(self) -> None:
+        try:
+            async with self.target.connect() as conn:
+                await sync_versions(conn)
+        except Exception as e:
+            logger.warning("Initial resource version sync failed: %s", e)
+        self._task = asyncio.create_task(self._run(), name="version-sync")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.mode == "listen":
+                    await self._listen()
+                else:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Resource version sync (%s) failed, retrying: %s", self.mode, e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            async with self.target.connect() as conn:
+                await sync_versions(conn)
+
+    async def _listen(self) -> None:
+        # Holds one connection for the lifetime of the worker (DATABASE_LISTEN_URL when set).
+        async with self.target.connect() as conn:
+            driver = (await conn.get_raw_connection()).driver_connection
+            for channel, callback in self._channels.items():
+                await driver.add_listener(channel, callback)
+            try:
+                # Catch up on anything committed while we were not listening.
+                await sync_versions(conn)
+                await conn.rollback()
+                while not driver.is_closed():
+                    await asyncio.sleep(self.poll_interval)
+            finally:
+                if not driver.is_closed():
+                    for channel, callback in self._channels.items():
+                        await driver.remove_listener(channel, callback)
+
+    @staticmethod
+    def _on_notify(connection, pid, channel, payload) -> None:
+        versions.apply(_decode(payload))
+
+
+version_sync = VersionSync()
@@ -0,0 +1,96 @@
+"""Cold-start profiling and lazy loading of optional heavy dependencies.
+
+Cloud Run scales to zero, so every import and lifespan step sits on the path
+of the first request after idle. `startup_timer` records how long each step
+takes and when the first response went out; the report is logged and served
+at /api/system/startup.
+"""
+import importlib
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Taken when app.startup is first imported — app.main imports it before anything heavy.
+_PROCESS_STARTED = time.perf_counter()
+
+
+class StartupTimer:
+    """Records named startup steps and the time to first response."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.steps: List[Tuple[str, float]] = []
+        self.ready_at: Optional[float] = None
+        self.first_response_at: Optional[float] = None
+
+    @contextmanager
+    def step(self, name: str):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - began))
+
+    def mark_ready(self) -> None:
+        """Call when the lifespan startup has finished."""
+        self.ready_at = time.perf_counter()
+        logger.info("Startup finished in %.0f ms: %s", self._ms(self.ready_at), self._summary())
+
+    def mark_first_response(self) -> None:
+        if self.first_response_at is not None:
+            return
+        self.first_response_at = time.perf_counter()
+        logger.info("Cold start to first response: %.0f ms", self._ms(self.first_response_at))
+
+    def report(self, budget_ms: Optional[float] = None) -> dict:
+        first_ms = self._ms(self.first_response_at) if self.first_response_at else None
+        return {
+            "steps": [{"name": name, "ms": round(seconds * 1000, 2)} for name, seconds in self.steps],
+            "ready_ms": self._ms(self.ready_at) if self.ready_at else None,
+            "first_response_ms": first_ms,
+            "budget_ms": budget_ms,
+            "within_budget": (first_ms <= budget_ms) if (first_ms is not None and budget_ms) else None,
+        }
+
+    def _ms(self, at: float) -> float:
+        return round((at - self.started) * 1000, 2)
+
+    def _summary(self) -> str:
+        slowest = sorted(self.steps, key=lambda s: s[1], reverse=True)[:5]
+        return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in slowest)
+
+
+startup_timer = StartupTimer(_PROCESS_STARTED)
+
+
+def lazy_import(module_name: str) -> ModuleType:
+    """Import an optional heavy dependency on first use, recording the cost once."""
+    module = sys.modules.get(module_name)
+    if module is None:
+        with startup_timer.step(f"lazy import {module_name}"):
+            module = importlib.import_module(module_name)
+    return module
+
+
+class FirstResponseMiddleware:
+    """Pure ASGI middleware stamping the first response; a bool check afterwards."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if startup_timer.first_response_at is not None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_and_mark(message):
+            await send(message)
+            if message["type"] == "http.response.start":
+                startup_timer.mark_first_response()
+
+        await self.app(scope, receive, send_and_mark)
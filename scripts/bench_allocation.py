@@ -0,0 +1,84 @@
+"""Benchmark batch cost allocation: statements and time per batch size.
+
+Runs `submit_purchase_batch` against a throwaway in-memory SQLite database
+(or BENCH_DATABASE_URL) with one approved order per store wanting every
+product, and prints the statement count per batch. The count should not
+grow with the number of batch lines.
+
+    python -m scripts.bench_allocation [--stores 20] [--sizes 10 50 150]
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import date
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", os.environ.get("BENCH_DATABASE_URL", "sqlite+aiosqlite://"))
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from app import models, schemas  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.query_stats import capture_queries  # noqa: E402
+from app.services.purchasing import submit_purchase_batch  # noqa: E402
+
+
+async def seed(session_factory, products: int, stores: int):
+    async with session_factory() as db:
+        user = models.User(id=uuid4(), telegram_id=1, username="bench", role=models.UserRole.GLOBAL_PURCHASER)
+        category = models.Category(id=uuid4(), name_i18n={"en": "Bench"})
+        product_ids = [uuid4() for _ in range(products)]
+        db.add_all([user, category])
+        db.add_all([
+            models.Product(id=pid, category_id=category.id, name_i18n={"en": f"P{i}"}, unit_i18n={"en": "kg"})
+            for i, pid in enumerate(product_ids)
+        ])
+        for s in range(stores):
+            store = models.Store(id=uuid4(), name=f"Store {s}")
+            order = models.PurchaseOrder(
+                id=uuid4(), store_id=store.id, user_id=user.id,
+                status=models.OrderStatus.APPROVED, delivery_date=date.today(),
+            )
+            db.add_all([store, order])
+            db.add_all([
+                models.OrderItem(purchase_order_id=order.id, product_id=pid, quantity_requested=3, quantity_approved=3)
+                for pid in product_ids
+            ])
+        await db.commit()
+    return user, product_ids
+
+
+async def main(stores: int, sizes: list):
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    user, product_ids = await seed(session_factory, sum(sizes), stores)
+
+    print(f"{'lines':>6} {'items':>6} {'queries':>8} {'ms':>9}")
+    offset = 0
+    for size in sizes:
+        batch = schemas.BatchCreate(market_location="bench", items=[
+            schemas.BatchItemInput(product_id=pid, total_quantity_bought=2 * stores, total_cost_uzs=100000)
+            for pid in product_ids[offset:offset + size]
+        ])
+        offset += size
+        async with session_factory() as db:
+            with capture_queries() as captured:
+                started = time.perf_counter()
+                await submit_purchase_batch(db, user, batch)
+                elapsed = (time.perf_counter() - started) * 1000
+        print(f"{size:>6} {size * stores:>6} {captured.direct.count:>8} {elapsed:>9.1f}")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stores", type=int, default=20)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 150])
+    args = parser.parse_args()
+    asyncio.run(main(args.stores, args.sizes))
@@ -0,0 +1,41 @@
+"""Rebuild consolidation_lines from the order lines, or check it for drift.
+
+The write paths keep consolidation_lines current by deltas; this recomputes
+it from the orders (after a manual data fix, or if `--check` reports drift).
+With `--check` nothing is written and the exit status is 1 on any mismatch.
+
+    python -m scripts.rebuild_consolidation [--check]
+"""
+import argparse
+import asyncio
+import sys
+
+from app.database import AsyncSessionLocal, engine
+from app.services.consolidation import check_consolidation, rebuild_consolidation
+from app.services.purchasing import DEMAND
+from app.services.versions import bump_versions
+
+
+async def main(check: bool) -> int:
+    async with AsyncSessionLocal() as db:
+        if check:
+            drift = await check_consolidation(db)
+            for (product_id, store_id, day), (stored, expected) in sorted(drift.items(), key=lambda kv: str(kv[0])):
+                print(f"{product_id} {store_id} {day}: stored {stored}, expected {expected}")
+            print(f"{len(drift)} line(s) out of date")
+            status = 1 if drift else 0
+        else:
+            rows = await rebuild_consolidation(db)
+            await bump_versions(db, DEMAND)
+            await db.commit()
+            print(f"rebuilt {rows} line(s)")
+            status = 0
+    await engine.dispose()
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="report drift without writing")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.check)))
@@ -4,6 +4,8 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import models
 from app.database import engine, AsyncSessionLocal
+from app.services.catalog import CATALOG_RESOURCES
+from app.services.versions import bump_versions
 
 
 DATA = {
@@ -186,6 +188,8 @@ async def seed_products():
                     session.add(product)
                     print(f"  . Updated: {item['names']['en']}")
         
+        # Running workers drop their cached catalog (and ETags) when this commits
+        await bump_versions(session, *CATALOG_RESOURCES)
         await session.commit()
         print("--- Seeding Complete ---")
 
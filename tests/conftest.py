@@ -16,10 +16,14 @@ os.environ["BOT_TOKEN"] = ""
 from httpx import ASGITransport, AsyncClient  # noqa: E402
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker  # noqa: E402
 
-from app.database import Base  # noqa: E402
-from app.models import User, UserRole, Store  # noqa: E402
-from app.dependencies import get_db, get_current_user  # noqa: E402
+from app.database import Base, ReadOnlySession  # noqa: E402
+from app.models import Category, Product, User, UserRole, Store  # noqa: E402
+from app.dependencies import get_db, get_read_db, get_current_user  # noqa: E402
 from app.main import app  # noqa: E402
+from app.services.allocation_preview import demand_snapshot  # noqa: E402
+from app.services.catalog import catalog_cache  # noqa: E402
+from app.services.consolidation import consolidation_cache  # noqa: E402
+from app.services.versions import versions  # noqa: E402
 
 
 # --- In-memory SQLite engine for tests ---
@@ -36,6 +40,14 @@ TestSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+TestReadSessionLocal = async_sessionmaker(
+    bind=test_engine,
+    class_=AsyncSession,
+    sync_session_class=ReadOnlySession,
+    expire_on_commit=False,
+    autoflush=False,
+)
+
 
 # --- Fixtures ---
 
@@ -49,12 +61,28 @@ async def setup_database():
         await conn.run_sync(Base.metadata.drop_all)
 
 
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """Start every test with empty in-process caches; the database is recreated per test."""
+    catalog_cache.clear()
+    consolidation_cache.clear()
+    demand_snapshot.clear()
+    versions.reset()
+    yield
+
+
 async def override_get_db():
     """Dependency override: yield a test database session."""
     async with TestSessionLocal() as session:
         yield session
 
 
+async def override_get_read_db():
+    """Dependency override: yield a read-only test database session."""
+    async with TestReadSessionLocal() as session:
+        yield session
+
+
 # Test admin user
 _test_user = None
 
@@ -90,10 +118,42 @@ async def seed_test_data(setup_database):
         _test_user = user
 
 
+@pytest.fixture
+async def order_fixtures():
+    """Seed a category, product, and store for order tests. Returns (store_id, product_id)."""
+    cat_id = uuid4()
+    prod_id = uuid4()
+    store_id = uuid4()
+
+    async with TestSessionLocal() as session:
+        cat = Category(
+            id=cat_id,
+            name_i18n={"en": "Meat"},
+            sort_order=2,
+        )
+        prod = Product(
+            id=prod_id,
+            category_id=cat_id,
+            name_i18n={"en": "Chicken"},
+            unit_i18n={"en": "kg"},
+            price_reference=25000,
+            is_active=True,
+        )
+        store = Store(
+            id=store_id,
+            name="Order Test Store",
+        )
+        session.add_all([cat, prod, store])
+        await session.commit()
+
+    return store_id, prod_id
+
+
 @pytest.fixture
 def app_with_overrides():
     """Return the FastAPI app with dependency overrides applied."""
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_read_db
     app.dependency_overrides[get_current_user] = override_get_current_user
     yield app
     app.dependency_overrides.clear()
@@ -0,0 +1,119 @@
+"""Tests for Telegram initData authentication and its cache."""
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+from starlette.requests import Request
+
+from tests.conftest import TestSessionLocal
+from app import dependencies
+from app.dependencies import get_current_user, invalidate_cached_user, auth_cache_stats
+from app.models import User, UserRole
+from app.services.versions import sync_versions, versions
+
+BOT_TOKEN = "123456:TEST-TOKEN"
+
+
+def _signed_init_data(telegram_id: int, auth_date: int | None = None) -> str:
+    """Build initData the way the Telegram client would sign it."""
+    fields = {
+        "auth_date": str(auth_date or int(time.time())),
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps({"id": telegram_id, "first_name": "Test", "username": "test_admin"}),
+    }
+    check_string = "\n".join(f"{k}={fields[k]}" for k in sorted(fields))
+    secret = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def _request(init_data: str) -> Request:
+    return Request({
+        "type": "http",
+        "headers": [(b"x-telegram-init-data", init_data.encode())],
+    })
+
+
+@pytest.fixture(autouse=True)
+def telegram_auth(monkeypatch):
+    """Enable the initData path and start every test with an empty cache."""
+    monkeypatch.setattr(dependencies.settings, "bot_token", BOT_TOKEN)
+    dependencies._auth_cache.clear()
+    yield
+    dependencies._auth_cache.clear()
+
+
+async def test_valid_init_data_resolves_user():
+    async with TestSessionLocal() as db:
+        user = await get_current_user(_request(_signed_init_data(123456789)), db)
+    assert user.telegram_id == 123456789
+    assert user.username == "test_admin"
+
+
+async def test_invalid_signature_rejected():
+    tampered = _signed_init_data(123456789).replace("hash=", "hash=00")
+    async with TestSessionLocal() as db:
+        with pytest.raises(HTTPException) as exc:
+            await get_current_user(_request(tampered), db)
+    assert exc.value.status_code == 401
+
+
+async def test_repeated_init_data_served_from_cache():
+    init_data = _signed_init_data(123456789)
+    async with TestSessionLocal() as db:
+        first = await get_current_user(_request(init_data), db)
+    before = auth_cache_stats()
+
+    async with TestSessionLocal() as db:
+        second = await get_current_user(_request(init_data), db)
+        assert second in db  # re-attached to the new session
+
+    after = auth_cache_stats()
+    assert second.id == first.id
+    assert after["hits"] == before["hits"] + 1
+
+
+async def test_invalidate_cached_user():
+    init_data = _signed_init_data(123456789)
+    async with TestSessionLocal() as db:
+        user = await get_current_user(_request(init_data), db)
+
+    assert invalidate_cached_user(user.id) == 1
+    assert auth_cache_stats()["size"] == 0
+
+
+async def test_users_version_sync_reloads_cached_user():
+    """A user edit committed by another worker is served from cache until the sync delivers its version."""
+    init_data = _signed_init_data(123456789)
+    async with TestSessionLocal() as db:
+        user = await get_current_user(_request(init_data), db)
+        original_role = user.role
+
+    async with TestSessionLocal() as db:
+        await db.execute(update(User).where(User.id == user.id).values(role=UserRole.STORE_MANAGER))
+        await dependencies.bump_users_version(db)
+        await db.commit()
+    versions.reset()  # forget the local apply, as another worker would not have it
+
+    async with TestSessionLocal() as db:
+        hits = auth_cache_stats()["hits"]
+        assert (await get_current_user(_request(init_data), db)).role == original_role
+        assert auth_cache_stats()["hits"] == hits + 1
+
+        assert "users" in await sync_versions(db)
+        reloaded = await get_current_user(_request(init_data), db)
+    assert reloaded.role == UserRole.STORE_MANAGER
+    assert auth_cache_stats()["hits"] == hits + 1
+
+
+async def test_expired_init_data_not_cached():
+    stale = _signed_init_data(123456789, auth_date=int(time.time()) - 2 * dependencies.settings.init_data_max_age)
+    async with TestSessionLocal() as db:
+        with pytest.raises(HTTPException):
+            await get_current_user(_request(stale), db)
+    assert auth_cache_stats()["size"] == 0
@@ -0,0 +1,62 @@
+"""Tests for the catalog cache and shared resource versions."""
+from uuid import uuid4
+
+from sqlalchemy import update
+
+from tests.conftest import TestSessionLocal
+from app.models import ResourceVersion, Stall
+from app.services.catalog import catalog_cache
+from app.services.versions import bump_versions, sync_versions, versions, _decode
+
+
+async def test_bump_applies_on_commit_only():
+    async with TestSessionLocal() as db:
+        await bump_versions(db, "stalls")
+        assert versions.get("stalls") == 0
+        await db.commit()
+    assert versions.get("stalls") == 1
+
+    async with TestSessionLocal() as db:
+        await bump_versions(db, "stalls", "products")
+        await db.rollback()
+    assert versions.get("stalls") == 1
+    assert versions.get("products") == 0
+
+
+async def test_write_endpoint_invalidates_cache(client):
+    assert (await client.get("/api/stalls/")).json() == []
+
+    created = await client.post("/api/stalls/", json={"name": "Fish Row"})
+    listed = (await client.get("/api/stalls/")).json()
+    assert [s["id"] for s in listed] == [created.json()["id"]]
+
+
+async def test_other_worker_bump_seen_after_sync(client):
+    """A bump committed elsewhere reaches this worker through sync (poll/NOTIFY)."""
+    await client.get("/api/stalls/")
+    stall_id = uuid4()
+    async with TestSessionLocal() as db:
+        db.add(Stall(id=stall_id, name="Spice Corner"))
+        await bump_versions(db, "stalls")
+        await db.commit()
+    versions.reset()  # forget the local apply, as another worker would not have it
+
+    async with TestSessionLocal() as db:
+        assert "stalls" in await sync_versions(db)
+        assert (await catalog_cache.lookup(db, "stalls", stall_id)).name == "Spice Corner"
+
+
+async def test_versions_never_move_backwards():
+    async with TestSessionLocal() as db:
+        await bump_versions(db, "stores")
+        await bump_versions(db, "stores")
+        await db.commit()
+        await db.execute(update(ResourceVersion).values(version=1))
+        await db.commit()
+        await sync_versions(db)
+    assert versions.get("stores") == 2
+
+
+def test_decode_notify_payload():
+    assert _decode("products=4,categories=2") == {"products": 4, "categories": 2}
+    assert _decode("garbage,stalls=x") == {}
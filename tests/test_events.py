@@ -0,0 +1,66 @@
+"""Tests for server-push events (app.services.events)."""
+import json
+from uuid import uuid4
+
+from tests.conftest import TestSessionLocal
+from app.services.events import ORDER_CREATED, broker, event_stream, publish_event
+
+
+def _drain(sub):
+    events = []
+    while not sub.queue.empty():
+        events.append(sub.queue.get_nowait())
+    return events
+
+
+async def test_events_delivered_on_commit_only():
+    store_id = uuid4()
+    with broker.subscribe() as sub:
+        async with TestSessionLocal() as db:
+            await publish_event(db, ORDER_CREATED, store_id, order_ids=[])
+            assert _drain(sub) == []
+            await db.rollback()
+        assert _drain(sub) == []
+
+        async with TestSessionLocal() as db:
+            await publish_event(db, ORDER_CREATED, store_id, order_ids=[])
+            await db.commit()
+        assert _drain(sub) == [{"type": ORDER_CREATED, "store_id": str(store_id), "order_ids": []}]
+
+
+async def test_order_endpoints_publish_filtered_by_store(client, order_fixtures):
+    store_id, product_id = order_fixtures
+    with broker.subscribe([store_id]) as mine, broker.subscribe([uuid4()]) as other:
+        created = (await client.post("/api/orders/", json={
+            "store_id": str(store_id), "delivery_date": "2026-03-01",
+            "items": [{"product_id": str(product_id), "quantity_requested": 1}],
+        })).json()
+        await client.patch("/api/orders/bulk/status", json={
+            "order_ids": [created["id"]], "status": "approved",
+        })
+
+        events = _drain(mine)
+        assert [e["type"] for e in events] == ["order.created", "order.status_changed"]
+        assert all(e["order_ids"] == [created["id"]] for e in events)
+        assert events[1]["status"] == "approved"
+        assert _drain(other) == []
+
+
+async def test_event_stream_heartbeat_and_resync(monkeypatch):
+    """A client that falls behind gets one `resync` instead of a blocked writer."""
+    monkeypatch.setattr(broker, "queue_size", 1)
+    store = str(uuid4())
+    stream = event_stream([store], heartbeat=0.01)
+
+    assert "event: ready" in await anext(stream)
+    assert await anext(stream) == ": ping\n\n"
+
+    broker.publish({"type": ORDER_CREATED, "store_id": store, "order_ids": []})
+    frame = await anext(stream)
+    assert frame.startswith("event: order.created\n")
+    assert json.loads(frame.split("data: ", 1)[1])["store_id"] == store
+
+    for _ in range(3):
+        broker.publish({"type": ORDER_CREATED, "store_id": store, "order_ids": []})
+    assert await anext(stream) == 'event: resync\ndata: {"type":"resync"}\n\n'
+    await stream.aclose()
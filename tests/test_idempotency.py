@@ -0,0 +1,116 @@
+"""Tests for Idempotency-Key replay (app.services.idempotency)."""
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy import func, select, update
+
+from tests.conftest import TestSessionLocal
+from app.models import IdempotencyKey, PurchaseBatch, PurchaseOrder
+from app.services.idempotency import purge_expired_keys
+
+
+def _order(store_id, product_id, qty=1):
+    return {
+        "store_id": str(store_id), "delivery_date": "2026-03-01",
+        "items": [{"product_id": str(product_id), "quantity_requested": qty}],
+    }
+
+
+async def _count(model):
+    async with TestSessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(model))
+
+
+async def test_retry_replays_stored_response(client, order_fixtures):
+    store_id, product_id = order_fixtures
+    headers = {"Idempotency-Key": "order-1"}
+    first = await client.post("/api/orders/", json=_order(store_id, product_id), headers=headers)
+    retry = await client.post("/api/orders/", json=_order(store_id, product_id), headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert await _count(PurchaseOrder) == 1
+
+    other = await client.post("/api/orders/", json=_order(store_id, product_id, qty=2), headers=headers)
+    assert other.status_code == 422
+
+
+async def test_without_key_each_request_runs(client, order_fixtures):
+    store_id, product_id = order_fixtures
+    await client.post("/api/orders/", json=_order(store_id, product_id))
+    await client.post("/api/orders/", json=_order(store_id, product_id))
+    assert await _count(PurchaseOrder) == 2
+
+
+async def test_failed_request_releases_key(client, order_fixtures):
+    _, product_id = order_fixtures
+    headers = {"Idempotency-Key": "order-2"}
+    body = _order(uuid4(), product_id)
+    assert (await client.post("/api/orders/", json=body, headers=headers)).status_code == 404
+    assert (await client.post("/api/orders/", json=body, headers=headers)).status_code == 404
+    assert await _count(IdempotencyKey) == 0
+
+
+async def test_purchase_batch_retry_records_once(client, order_fixtures):
+    _, product_id = order_fixtures
+    body = {"market_location": "Chorsu", "items": [
+        {"product_id": str(product_id), "total_quantity_bought": 10, "total_cost_uzs": 250000},
+    ]}
+    headers = {"Idempotency-Key": "batch-1"}
+    first = await client.post("/api/purchases/", json=body, headers=headers)
+    retry = await client.post("/api/purchases/", json=body, headers=headers)
+
+    assert first.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+    assert await _count(PurchaseBatch) == 1
+
+
+async def test_claim_without_response_is_reclaimed_after_timeout(client, order_fixtures):
+    """A key committed without its response answers 409 only for a short while, not until it expires."""
+    store_id, product_id = order_fixtures
+    headers = {"Idempotency-Key": "order-5"}
+    await client.post("/api/orders/", json=_order(store_id, product_id), headers=headers)
+
+    async def lose_response(age: timedelta):
+        async with TestSessionLocal() as db:
+            await db.execute(update(IdempotencyKey).where(IdempotencyKey.key == "order-5").values(
+                status_code=None, response_body=None, created_at=datetime.now(timezone.utc) - age,
+            ))
+            await db.commit()
+
+    await lose_response(timedelta(0))
+    assert (await client.post("/api/orders/", json=_order(store_id, product_id), headers=headers)).status_code == 409
+
+    await lose_response(timedelta(minutes=5))
+    again = await client.post("/api/orders/", json=_order(store_id, product_id), headers=headers)
+    assert again.status_code == 200 and "idempotent-replayed" not in again.headers
+    assert await _count(PurchaseOrder) == 2
+
+
+async def test_expired_keys_reclaimed_and_swept(client, order_fixtures):
+    store_id, product_id = order_fixtures
+    headers = {"Idempotency-Key": "order-3"}
+    await client.post("/api/orders/", json=_order(store_id, product_id), headers=headers)
+    await client.post("/api/orders/", json=_order(store_id, product_id), headers={"Idempotency-Key": "order-4"})
+
+    async with TestSessionLocal() as db:
+        await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == "order-3")
+            .values(expires_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+        )
+        await db.commit()
+
+    again = await client.post("/api/orders/", json=_order(store_id, product_id), headers=headers)
+    assert "idempotent-replayed" not in again.headers
+    assert await _count(PurchaseOrder) == 3
+
+    async with TestSessionLocal() as db:
+        await db.execute(update(IdempotencyKey).values(
+            expires_at=datetime.now(timezone.utc) - timedelta(minutes=1),
+        ).where(IdempotencyKey.key == "order-4"))
+        await db.commit()
+        assert await purge_expired_keys(db, batch_size=1) == 1
+    assert await _count(IdempotencyKey) == 1
@@ -0,0 +1,40 @@
+"""Tests for the Prometheus endpoint (/metrics)."""
+from uuid import uuid4
+
+from app.metrics import Histogram
+
+
+async def test_metrics_labelled_by_route_template(client):
+    await client.get("/api/stores/")
+    await client.get(f"/api/orders/{uuid4()}")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'eden_http_requests_total{method="GET",route="/api/stores/",status="200"}' in body
+    assert 'route="/api/orders/{order_id}",status="404"' in body
+    assert "eden_http_requests_in_flight" in body
+    assert 'eden_cache_hit_ratio{cache="auth"}' in body
+
+
+async def test_metrics_token_rejects_non_ascii_header(client, monkeypatch):
+    from app import main
+    monkeypatch.setattr(main.settings, "metrics_token", "s3cret")
+
+    assert (await client.get("/metrics", headers={"Authorization": "Bearer s3cret"})).status_code == 200
+    bad = await client.get("/metrics", headers={"Authorization": "Bearer s3cr\u00e9t".encode("latin-1")})
+    assert bad.status_code == 401
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("t_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        hist.observe(value, "/x")
+
+    samples = {(suffix, labels.get("le")): value for suffix, labels, value in hist.samples()}
+    assert samples[("_bucket", "0.1")] == 2
+    assert samples[("_bucket", "1")] == 3
+    assert samples[("_bucket", "+Inf")] == 4
+    assert samples[("_count", None)] == 4
+    assert samples[("_sum", None)] == 2.65
@@ -1,40 +1,16 @@
 """Tests for the Orders API (/api/orders/)."""
 import pytest
-from uuid import uuid4
-
-from tests.conftest import TestSessionLocal
-from app.models import Category, Product, Store
+from datetime import datetime, timezone
+from uuid import UUID, uuid4
 
+from fastapi import HTTPException
+from sqlalchemy import func, select
 
-@pytest.fixture
-async def order_fixtures():
-    """Seed a category, product, and store for order tests. Returns (store_id, product_id)."""
-    cat_id = uuid4()
-    prod_id = uuid4()
-    store_id = uuid4()
-
-    async with TestSessionLocal() as session:
-        cat = Category(
-            id=cat_id,
-            name_i18n={"en": "Meat"},
-            sort_order=2,
-        )
-        prod = Product(
-            id=prod_id,
-            category_id=cat_id,
-            name_i18n={"en": "Chicken"},
-            unit_i18n={"en": "kg"},
-            price_reference=25000,
-            is_active=True,
-        )
-        store = Store(
-            id=store_id,
-            name="Order Test Store",
-        )
-        session.add_all([cat, prod, store])
-        await session.commit()
-
-    return store_id, prod_id
+from tests.conftest import TestSessionLocal
+from app.dependencies import get_current_user, get_read_db
+from app.models import Product, PurchaseOrder, User, UserRole
+from app.query_stats import capture_queries
+from app.services.pagination import encode_cursor
 
 
 async def test_create_order(client, order_fixtures):
@@ -58,6 +34,45 @@ async def test_create_order(client, order_fixtures):
     assert float(data["items"][0]["quantity_requested"]) == 5.0
 
 
+async def test_demand_version_bumped_after_commit(client, order_fixtures, monkeypatch):
+    """Order writes bump "demand" outside their transaction; a failed bump does not undo the order."""
+    from app.services import versions as versions_module
+
+    store_id, product_id = order_fixtures
+    body = {
+        "store_id": str(store_id), "delivery_date": "2026-02-23",
+        "items": [{"product_id": str(product_id), "quantity_requested": 1}],
+    }
+    assert (await client.post("/api/orders/", json=body)).status_code == 200
+    assert versions_module.versions.get("demand") == 1
+
+    async def unavailable(db, *names):
+        raise RuntimeError("resource_versions unavailable")
+
+    monkeypatch.setattr(versions_module, "bump_versions", unavailable)
+    assert (await client.post("/api/orders/", json=body)).status_code == 200
+    assert versions_module.versions.get("demand") == 1
+    async with TestSessionLocal() as db:
+        assert await db.scalar(select(func.count()).select_from(PurchaseOrder)) == 2
+
+
+async def test_get_order_reads_primary(client, app_with_overrides, order_fixtures):
+    """An order read back right after its creation does not depend on the (possibly lagging) replica."""
+    store_id, product_id = order_fixtures
+    created = (await client.post("/api/orders/", json={
+        "store_id": str(store_id), "delivery_date": "2026-02-23",
+        "items": [{"product_id": str(product_id), "quantity_requested": 1}],
+    })).json()
+
+    async def replica_without_the_order():
+        raise HTTPException(status_code=503, detail="replica not caught up")
+        yield
+
+    app_with_overrides.dependency_overrides[get_read_db] = replica_without_the_order
+    response = await client.get(f"/api/orders/{created['id']}")
+    assert response.status_code == 200 and response.json()["id"] == created["id"]
+
+
 async def test_list_orders(client, order_fixtures):
     """GET /api/orders/ returns created orders."""
     store_id, product_id = order_fixtures
@@ -100,3 +115,281 @@ async def test_create_order_invalid_store(client):
     }
     response = await client.post("/api/orders/", json=payload)
     assert response.status_code == 404
+
+
+async def test_list_orders_query_budget(client, order_fixtures):
+    """GET /api/orders/ issues a constant number of statements regardless of order count."""
+    store_id, product_id = order_fixtures
+    for _ in range(3):
+        await client.post("/api/orders/", json={
+            "store_id": str(store_id),
+            "delivery_date": "2026-02-23",
+            "items": [{"product_id": str(product_id), "quantity_requested": 1.0}],
+        })
+
+    with capture_queries() as captured:
+        response = await client.get("/api/orders/")
+
+    assert len(response.json()) == 3
+    assert captured.last.count <= 2  # orders + selectinload(items)
+
+
+async def test_list_orders_matches_response_model(client, order_fixtures):
+    """The pre-serialized list payload matches the response_model output of GET /{id}."""
+    store_id, product_id = order_fixtures
+    created = await client.post("/api/orders/", json={
+        "store_id": str(store_id),
+        "delivery_date": "2026-02-23",
+        "items": [{"product_id": str(product_id), "quantity_requested": 1.5}],
+    })
+    order_id = created.json()["id"]
+
+    response = await client.get("/api/orders/")
+    assert response.headers["content-type"] == "application/json"
+    listed = next(o for o in response.json() if o["id"] == order_id)
+    single = (await client.get(f"/api/orders/{order_id}")).json()
+    assert listed == single
+
+
+async def test_bulk_create_orders(client, order_fixtures):
+    """POST /api/orders/bulk creates orders for several stores/dates in a few statements."""
+    store_id, product_id = order_fixtures
+    stores = (await client.get("/api/stores/")).json()
+    other_store = next(s["id"] for s in stores if s["id"] != str(store_id))
+
+    payload = {"orders": [
+        {"store_id": str(store_id), "delivery_date": "2026-03-01",
+         "items": [{"product_id": str(product_id), "quantity_requested": 2}]},
+        {"store_id": str(store_id), "delivery_date": "2026-03-02",
+         "items": [{"product_id": str(product_id), "quantity_requested": 4}]},
+        {"store_id": other_store, "delivery_date": "2026-03-01",
+         "items": [{"product_id": str(product_id), "quantity_requested": 1}]},
+    ]}
+    with capture_queries() as captured:
+        response = await client.post("/api/orders/bulk", json=payload)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [o["delivery_date"] for o in data] == ["2026-03-01", "2026-03-02", "2026-03-01"]
+    assert [float(o["items"][0]["quantity_approved"]) for o in data] == [2.0, 4.0, 1.0]
+    assert captured.last.count <= 6  # stores, products, orders INSERT, items INSERT, open demand, demand version
+
+    listed = (await client.get("/api/orders/")).json()
+    assert {o["id"] for o in data} <= {o["id"] for o in listed}
+
+
+async def test_bulk_create_orders_validates_all_or_nothing(client, order_fixtures):
+    store_id, product_id = order_fixtures
+    payload = {"orders": [
+        {"store_id": str(store_id), "delivery_date": "2026-03-01",
+         "items": [{"product_id": str(product_id), "quantity_requested": 2}]},
+        {"store_id": str(uuid4()), "delivery_date": "2026-03-01",
+         "items": [{"product_id": str(product_id), "quantity_requested": 2}]},
+    ]}
+    response = await client.post("/api/orders/bulk", json=payload)
+    assert response.status_code == 404
+    assert (await client.get("/api/orders/")).json() == []
+
+
+async def test_bulk_create_orders_checks_store_access(client, app_with_overrides, order_fixtures):
+    store_id, product_id = order_fixtures
+    manager = User(
+        id=uuid4(), telegram_id=42, role=UserRole.STORE_MANAGER, allowed_store_ids=[uuid4()],
+    )
+    app_with_overrides.dependency_overrides[get_current_user] = lambda: manager
+    response = await client.post("/api/orders/bulk", json={"orders": [
+        {"store_id": str(store_id), "delivery_date": "2026-03-01",
+         "items": [{"product_id": str(product_id), "quantity_requested": 2}]},
+    ]})
+    assert response.status_code == 403
+
+
+async def test_list_orders_keyset_pagination(client, order_fixtures):
+    """limit + cursor walks every order exactly once, even with equal created_at."""
+    store_id, product_id = order_fixtures
+    orders = [
+        {"store_id": str(store_id), "delivery_date": f"2026-03-0{day}",
+         "items": [{"product_id": str(product_id), "quantity_requested": 1}]}
+        for day in range(1, 6)
+    ]
+    created = (await client.post("/api/orders/bulk", json={"orders": orders})).json()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/orders/", params=params)
+        assert response.status_code == 200
+        seen += [o["id"] for o in response.json()]
+        pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+        assert 'rel="next"' in response.headers["link"]
+
+    assert pages == 3
+    assert sorted(seen) == sorted(o["id"] for o in created)
+
+
+async def test_list_orders_date_filters(client, order_fixtures):
+    store_id, product_id = order_fixtures
+    await client.post("/api/orders/bulk", json={"orders": [
+        {"store_id": str(store_id), "delivery_date": day,
+         "items": [{"product_id": str(product_id), "quantity_requested": 1}]}
+        for day in ("2026-03-01", "2026-03-02")
+    ]})
+
+    by_delivery = (await client.get("/api/orders/", params={"delivery_date": "2026-03-02"})).json()
+    assert [o["delivery_date"] for o in by_delivery] == ["2026-03-02"]
+
+    assert (await client.get("/api/orders/", params={"created_to": "2000-01-01"})).json() == []
+    assert len((await client.get("/api/orders/", params={"created_from": "2000-01-01"})).json()) == 2
+
+
+async def test_list_orders_invalid_cursor(client):
+    response = await client.get("/api/orders/", params={"limit": 10, "cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+async def test_list_orders_summary_view(client, order_fixtures):
+    """view=summary returns per-order aggregates without item arrays, in one query."""
+    store_id, product_id = order_fixtures
+    async with TestSessionLocal() as session:
+        other = Product(category_id=(await session.get(Product, product_id)).category_id,
+                        name_i18n={"en": "Beef"}, unit_i18n={"en": "kg"}, is_active=True)
+        session.add(other)
+        await session.commit()
+    await client.post("/api/orders/bulk", json={"orders": [
+        {"store_id": str(store_id), "delivery_date": "2026-03-01", "items": [
+            {"product_id": str(product_id), "quantity_requested": 2.5},
+            {"product_id": str(other.id), "quantity_requested": 1},
+        ]},
+        {"store_id": str(store_id), "delivery_date": "2026-03-02", "items": []},
+    ]})
+
+    with capture_queries() as captured:
+        response = await client.get("/api/orders/", params={"view": "summary", "limit": 10})
+    assert response.status_code == 200
+    assert captured.last.count == 1
+
+    by_date = {o["delivery_date"]: o for o in response.json()}
+    assert "items" not in by_date["2026-03-01"]
+    assert by_date["2026-03-01"]["item_count"] == 2
+    assert float(by_date["2026-03-01"]["total_quantity_requested"]) == 3.5
+    assert by_date["2026-03-01"]["total_allocated_cost"] is None
+    assert by_date["2026-03-02"]["item_count"] == 0
+
+
+async def _bulk_orders(client, store_id, product_id, count):
+    response = await client.post("/api/orders/bulk", json={"orders": [
+        {"store_id": str(store_id), "delivery_date": f"2026-03-{day:02d}",
+         "items": [{"product_id": str(product_id), "quantity_requested": 2}]}
+        for day in range(1, count + 1)
+    ]})
+    return response.json()
+
+
+async def test_bulk_status_transition(client, order_fixtures):
+    """One UPDATE moves every eligible order; the rest are reported per order."""
+    store_id, product_id = order_fixtures
+    orders = await _bulk_orders(client, store_id, product_id, 3)
+    ids = [o["id"] for o in orders]
+    await client.patch(f"/api/orders/{ids[2]}/status", json={"status": "cancelled"})
+
+    missing = str(uuid4())
+    with capture_queries() as captured:
+        response = await client.patch("/api/orders/bulk/status", json={
+            "order_ids": ids + [missing], "status": "approved",
+        })
+    assert response.status_code == 200
+    results = {r["id"]: r for r in response.json()}
+    assert results[ids[0]]["ok"] and results[ids[1]]["ok"]
+    assert not results[ids[2]]["ok"] and "cancelled" in results[ids[2]]["error"]
+    assert results[missing]["error"] == "Order not found"
+    assert captured.last.count <= 3  # UPDATE ... RETURNING + failure lookup + demand version
+
+    approved = (await client.get("/api/orders/", params={"status": "approved"})).json()
+    assert sorted(o["id"] for o in approved) == sorted(ids[:2])
+
+
+async def test_bulk_item_approvals(client, order_fixtures):
+    store_id, product_id = order_fixtures
+    orders = await _bulk_orders(client, store_id, product_id, 2)
+    open_item = orders[0]["items"][0]["id"]
+    locked_item = orders[1]["items"][0]["id"]
+    await client.patch(f"/api/orders/{orders[1]['id']}/status", json={"status": "approved"})
+    await client.patch(f"/api/orders/{orders[1]['id']}/status", json={"status": "purchasing"})
+
+    response = await client.patch("/api/orders/bulk/approvals", json={"items": [
+        {"item_id": open_item, "quantity_approved": 1.25},
+        {"item_id": locked_item, "quantity_approved": 9},
+    ]})
+    results = {r["id"]: r for r in response.json()}
+    assert results[open_item]["ok"] and results[open_item]["order_id"] == orders[0]["id"]
+    assert not results[locked_item]["ok"] and results[locked_item]["status"] == "purchasing"
+
+    first = (await client.get(f"/api/orders/{orders[0]['id']}")).json()
+    second = (await client.get(f"/api/orders/{orders[1]['id']}")).json()
+    assert float(first["items"][0]["quantity_approved"]) == 1.25
+    assert float(second["items"][0]["quantity_approved"]) == 2.0
+
+
+async def test_order_changes_delta_sync(client, order_fixtures):
+    """Full sync, then only orders touched since the cursor; cancellations as tombstones."""
+    store_id, product_id = order_fixtures
+    orders = await _bulk_orders(client, store_id, product_id, 3)
+
+    full = (await client.get("/api/orders/changes")).json()
+    assert sorted(o["id"] for o in full["orders"]) == sorted(o["id"] for o in orders)
+    assert full["tombstones"] == [] and not full["has_more"]
+    cursor = full["cursor"]
+
+    idle = (await client.get("/api/orders/changes", params={"since": cursor})).json()
+    assert idle == {"orders": [], "tombstones": [], "cursor": cursor, "has_more": False}
+
+    await client.patch("/api/orders/bulk/approvals", json={"items": [
+        {"item_id": orders[0]["items"][0]["id"], "quantity_approved": 1},
+    ]})
+    await client.patch(f"/api/orders/{orders[1]['id']}/status", json={"status": "cancelled"})
+
+    delta = (await client.get("/api/orders/changes", params={"since": cursor})).json()
+    assert [o["id"] for o in delta["orders"]] == [orders[0]["id"]]
+    assert float(delta["orders"][0]["items"][0]["quantity_approved"]) == 1.0
+    assert [t["id"] for t in delta["tombstones"]] == [orders[1]["id"]]
+    assert delta["tombstones"][0]["status"] == "cancelled"
+
+
+async def test_order_changes_paging(client, order_fixtures):
+    store_id, product_id = order_fixtures
+    orders = await _bulk_orders(client, store_id, product_id, 3)
+
+    seen, since = [], None
+    while True:
+        params = {"limit": 2, **({"since": since} if since else {})}
+        page = (await client.get("/api/orders/changes", params=params)).json()
+        seen += [o["id"] for o in page["orders"]]
+        since = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert sorted(seen) == sorted(o["id"] for o in orders)
+
+
+async def test_order_changes_cursor_ignores_the_clock(client, order_fixtures):
+    """Positions come from the database: a write stamped with an old clock still lands after the cursor."""
+    store_id, product_id = order_fixtures
+    orders = await _bulk_orders(client, store_id, product_id, 2)
+    cursor = (await client.get("/api/orders/changes")).json()["cursor"]
+
+    async with TestSessionLocal() as db:
+        order = await db.get(PurchaseOrder, UUID(orders[0]["id"]))
+        order.updated_at = datetime(2000, 1, 1, tzinfo=timezone.utc)  # a worker with a skewed clock
+        await db.commit()
+
+    delta = (await client.get("/api/orders/changes", params={"since": cursor})).json()
+    assert [o["id"] for o in delta["orders"]] == [orders[0]["id"]]
+
+    # Timestamp cursors from before change_seq restart a full sync
+    old = encode_cursor(datetime(2026, 1, 1, tzinfo=timezone.utc), uuid4())
+    full = (await client.get("/api/orders/changes", params={"since": old})).json()
+    assert len(full["orders"]) == 2
+
+    assert (await client.get("/api/orders/changes", params={"since": "garbage"})).status_code == 400
@@ -80,3 +80,21 @@ async def test_delete_product_soft(client, seed_product):
     # Verify it's no longer in the active list
     list_resp = await client.get("/api/products/")
     assert len(list_resp.json()) == 0
+
+
+async def test_list_products_conditional_get(client, seed_product):
+    """A matching If-None-Match gets 304 until a product write bumps the version."""
+    first = await client.get("/api/products/")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    cached = await client.get("/api/products/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    await client.delete(f"/api/products/{seed_product}")
+    changed = await client.get("/api/products/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json() == []
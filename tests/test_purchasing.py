@@ -0,0 +1,561 @@
+"""Tests for batch cost allocation (app.services.purchasing)."""
+import asyncio
+import os
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from tests.conftest import TestSessionLocal
+from app import schemas
+from app.database import Base
+from app.models import (
+    AllocationEntry, Category, ConsolidationLine, OrderItem, OrderStatus, Product, ProductPriceStats, PurchaseBatch, PurchaseOrder,
+    Store, User, UserRole,
+)
+from app.query_stats import capture_queries
+from app.services.events import ALLOCATION_DONE, broker
+from app.services.locking import KeyedLocks, retry_on_conflict
+from app.services import price_stats
+from app.services.consolidation import check_consolidation, consolidation_cache, rebuild_consolidation
+from app.services.purchasing import BatchLine, compute_allocations, submit_purchase_batch
+
+
+def test_compute_allocations_caps_ratio_and_splits_cost():
+    product = uuid4()
+    items = [
+        SimpleNamespace(id=i, purchase_order_id=i, store_id=i, product_id=product, quantity_outstanding=Decimal(q))
+        for i, q in ((1, "6"), (2, "2"))
+    ]
+    # Half of what was approved: every store gets half its quantity, at 5000/unit
+    half = compute_allocations([BatchLine(product, Decimal("4"), Decimal("20000"))], items)
+    assert [(a.item_id, a.quantity_fulfilled, a.cost_uzs) for a in half] == [
+        (1, Decimal("3"), Decimal("15000")), (2, Decimal("1"), Decimal("5000")),
+    ]
+    # Bought more than approved: nobody gets more than they asked for
+    extra = compute_allocations([BatchLine(product, Decimal("16"), Decimal("32000"))], items)
+    assert [a.quantity_fulfilled for a in extra] == [Decimal("6"), Decimal("2")]
+    assert compute_allocations([BatchLine(uuid4(), Decimal("1"), Decimal("1"))], items) == []
+    # Thirds are rounded to the columns' scale
+    third = compute_allocations([BatchLine(product, Decimal("1"), Decimal("1000"))], items[:1] * 3)
+    assert {(a.quantity_fulfilled, a.cost_uzs) for a in third} == {(Decimal("0.333"), Decimal("333.00"))}
+
+
+async def _seed(products: int, stores: int = 2):
+    """One approved order per store, each wanting 2 units of every product."""
+    async with TestSessionLocal() as db:
+        user_id = await db.scalar(select(User.id))
+        category = Category(id=uuid4(), name_i18n={"en": "Vegetables"})
+        product_ids = [uuid4() for _ in range(products)]
+        db.add(category)
+        db.add_all([
+            Product(id=pid, category_id=category.id, name_i18n={"en": f"P{i}"}, unit_i18n={"en": "kg"})
+            for i, pid in enumerate(product_ids)
+        ])
+        order_ids = []
+        for s in range(stores):
+            store = Store(id=uuid4(), name=f"Store {s}")
+            order = PurchaseOrder(
+                id=uuid4(), store_id=store.id, user_id=user_id,
+                status=OrderStatus.APPROVED, delivery_date=date(2026, 3, 1),
+            )
+            db.add_all([store, order])
+            db.add_all([
+                OrderItem(purchase_order_id=order.id, product_id=pid, quantity_requested=2, quantity_approved=2)
+                for pid in product_ids
+            ])
+            order_ids.append(order.id)
+        await db.flush()
+        await rebuild_consolidation(db)  # orders written directly, not through the API
+        await db.commit()
+    return product_ids, order_ids
+
+
+def _batch(product_ids, quantity=4, cost=40000):
+    return {"market_location": "Chorsu", "items": [
+        {"product_id": str(pid), "total_quantity_bought": quantity, "total_cost_uzs": cost}
+        for pid in product_ids
+    ]}
+
+
+async def test_submit_batch_allocates_and_settles_statuses(client):
+    product_ids, order_ids = await _seed(products=2)
+
+    # Only the first product is bought: orders stay in purchasing
+    response = await client.post("/api/purchases/", json=_batch(product_ids[:1], quantity=2, cost=20000))
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 1
+    orders = [(await client.get(f"/api/orders/{oid}")).json() for oid in order_ids]
+    assert {o["status"] for o in orders} == {"purchasing"}
+    costed = [i for o in orders for i in o["items"] if i["allocated_cost_uzs"] is not None]
+    assert [(float(i["quantity_fulfilled"]), float(i["allocated_cost_uzs"])) for i in costed] == [(1.0, 10000.0)] * 2
+
+    await client.post("/api/purchases/", json=_batch(product_ids[1:]))
+    orders = [(await client.get(f"/api/orders/{oid}")).json() for oid in order_ids]
+    assert {o["status"] for o in orders} == {"purchasing"}  # first product is half fulfilled
+
+    # Second trip for the rest of the first product, at a different price
+    await client.post("/api/purchases/", json=_batch(product_ids[:1], quantity=2, cost=30000))
+    orders = [(await client.get(f"/api/orders/{oid}")).json() for oid in order_ids]
+    assert {o["status"] for o in orders} == {"delivered"}
+    first = [i for o in orders for i in o["items"] if i["product_id"] == str(product_ids[0])]
+    assert [(float(i["quantity_fulfilled"]), float(i["allocated_cost_uzs"])) for i in first] == [(2.0, 25000.0)] * 2
+
+    async with TestSessionLocal() as db:
+        entries = (await db.execute(
+            select(AllocationEntry.order_item_id, AllocationEntry.quantity, AllocationEntry.cost_uzs)
+            .where(AllocationEntry.order_item_id.in_([UUID(i["id"]) for i in first]))
+        )).all()
+    assert sorted((float(q), float(c)) for _, q, c in entries) == [(1.0, 10000.0)] * 2 + [(1.0, 15000.0)] * 2
+
+
+async def test_consolidation_shows_outstanding_quantity(client):
+    product_ids, _ = await _seed(products=1, stores=2)
+    await client.post("/api/purchases/", json=_batch(product_ids, quantity=1, cost=10000))
+
+    consolidated = (await client.get("/api/purchases/consolidation")).json()
+    row = next(r for r in consolidated if r["product_id"] == str(product_ids[0]))
+    assert float(row["total_quantity_needed"]) == 3.0
+    assert sorted(float(b["quantity"]) for b in row["breakdown"]) == [1.5, 1.5]
+
+    preview = (await client.post("/api/purchases/preview", json=_batch(product_ids, quantity=3, cost=1))).json()
+    assert [float(p["quantity_outstanding"]) for s in preview["stores"] for p in s["products"]] == [1.5, 1.5]
+
+    await client.post("/api/purchases/", json=_batch(product_ids, quantity=3, cost=30000))
+    consolidated = (await client.get("/api/purchases/consolidation")).json()
+    assert all(r["product_id"] != str(product_ids[0]) for r in consolidated)
+
+
+async def test_submit_batch_query_count_is_constant(client):
+    product_ids, _ = await _seed(products=30)
+
+    counts = []
+    for chunk in (product_ids[:3], product_ids[3:30]):
+        with capture_queries() as captured:
+            response = await client.post("/api/purchases/", json=_batch(chunk))
+        assert response.status_code == 200
+        counts.append(captured.last.count)
+    assert counts[0] == counts[1] <= 12
+
+
+async def test_duplicate_batch_lines_rejected(client):
+    product_ids, _ = await _seed(products=1)
+    response = await client.post("/api/purchases/", json=_batch(product_ids * 2))
+    assert response.status_code == 422
+
+
+async def test_concurrent_batches_allocate_each_item_once(client):
+    """N purchasers buying the same product at once: exactly one batch gets the items."""
+    product_ids, order_ids = await _seed(products=1, stores=3)
+
+    with broker.subscribe() as events:
+        responses = await asyncio.gather(*[
+            client.post("/api/purchases/", json=_batch(product_ids, quantity=6, cost=60000 + i))
+            for i in range(8)
+        ])
+    assert all(r.status_code == 200 for r in responses)
+
+    allocated_by = set()
+    while not events.queue.empty():
+        event = events.queue.get_nowait()
+        if event["type"] == ALLOCATION_DONE:
+            allocated_by.add(event["batch_id"])
+    assert len(allocated_by) == 1
+
+    async with TestSessionLocal() as db:
+        costs = (await db.scalars(select(OrderItem.allocated_cost_uzs))).all()
+    assert len(costs) == 3 and len(set(costs)) == 1 and sum(costs) >= 60000
+
+
+async def test_keyed_locks_serialize_only_shared_keys():
+    locks = KeyedLocks()
+    async with locks.hold(["meat"]):
+        async with locks.hold(["vegetables"]):  # unrelated key: not blocked
+            pass
+        waiter = asyncio.create_task(locks.hold(["vegetables", "meat"]).__aenter__())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+    await asyncio.wait_for(waiter, 1)
+
+
+class _FakePostgresSession:
+    """Just enough of AsyncSession for retry_on_conflict's PostgreSQL path."""
+
+    def __init__(self):
+        self.savepoints = 0
+
+    def get_bind(self):
+        return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+    def begin_nested(self):
+        session = self
+
+        class Savepoint:
+            async def __aenter__(self):
+                session.savepoints += 1
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Savepoint()
+
+
+def _conflict(sqlstate):
+    return DBAPIError("UPDATE ...", {}, SimpleNamespace(sqlstate=sqlstate))
+
+
+async def test_retry_on_conflict_retries_deadlocks_only():
+    db = _FakePostgresSession()
+    failures = [_conflict("40P01"), _conflict("40001")]
+
+    async def work():
+        if failures:
+            raise failures.pop(0)
+        return "done"
+
+    assert await retry_on_conflict(db, work, attempts=3) == "done"
+    assert db.savepoints == 3
+
+    async def broken():
+        raise _conflict("23505")  # unique violation: not retried
+
+    with pytest.raises(DBAPIError):
+        await retry_on_conflict(db, broken, attempts=3)
+    assert db.savepoints == 4
+
+
+async def test_preview_matches_submit_and_writes_nothing(client):
+    product_ids, order_ids = await _seed(products=1, stores=2)
+    unknown = uuid4()
+    body = _batch(product_ids + [unknown], quantity=3, cost=30000)
+
+    preview = (await client.post("/api/purchases/preview", json=body)).json()
+    assert [str(p) for p in preview["unmatched_product_ids"]] == [str(unknown)]
+    assert float(preview["total_allocated_uzs"]) == 30000.0
+    assert [(s["store_name"], float(s["total_cost_uzs"])) for s in preview["stores"]] == [
+        ("Store 0", 15000.0), ("Store 1", 15000.0),
+    ]
+    line = preview["stores"][0]["products"][0]
+    assert (float(line["quantity_outstanding"]), float(line["quantity_fulfilled"])) == (2.0, 1.5)
+    assert await _count_batches() == 0
+
+    await client.post("/api/purchases/", json=_batch(product_ids, quantity=3, cost=30000))
+    orders = [(await client.get(f"/api/orders/{oid}")).json() for oid in order_ids]
+    charged = [float(item["allocated_cost_uzs"]) for order in orders for item in order["items"]]
+    assert charged == [15000.0, 15000.0]
+
+
+async def test_preview_snapshot_cached_until_demand_changes(client):
+    product_ids, _ = await _seed(products=1, stores=1)
+    body = _batch(product_ids, quantity=1, cost=10000)
+    await client.post("/api/purchases/preview", json=body)
+
+    with capture_queries() as captured:
+        warm = (await client.post("/api/purchases/preview", json=body)).json()
+    assert captured.last.count == 0
+    assert len(warm["stores"]) == 1
+
+    # A new order bumps the demand version: the next preview sees it
+    stores = (await client.get("/api/stores/")).json()
+    store_id = next(s["id"] for s in stores if s["name"] == "Test Store")
+    await client.post("/api/orders/", json={
+        "store_id": store_id, "delivery_date": "2026-03-01",
+        "items": [{"product_id": str(product_ids[0]), "quantity_requested": 2}],
+    })
+    fresh = (await client.post("/api/purchases/preview", json=body)).json()
+    assert len(fresh["stores"]) == 2
+
+
+async def _count_batches():
+    async with TestSessionLocal() as db:
+        return len((await db.scalars(select(PurchaseBatch.id))).all())
+
+
+async def _set_purchase_date(batch_id, day):
+    async with TestSessionLocal() as db:
+        batch = await db.get(PurchaseBatch, UUID(batch_id))
+        batch.purchase_date = day
+        await db.commit()
+
+
+async def test_batch_history_filters_and_pages(client):
+    product_ids, _ = await _seed(products=3, stores=1)
+    ids = []
+    for i, pid in enumerate(product_ids):
+        body = {**_batch([pid]), "market_location": "Chorsu" if i < 2 else "Alay"}
+        ids.append((await client.post("/api/purchases/", json=body)).json()["id"])
+    await _set_purchase_date(ids[0], date(2026, 3, 1))
+
+    first = await client.get("/api/purchases/", params={"limit": 2})
+    assert [b["id"] for b in first.json()] == ids[:0:-1]
+    rest = await client.get("/api/purchases/", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert [b["id"] for b in rest.json()] == ids[:1] and "X-Next-Cursor" not in rest.headers
+    assert len(rest.json()[0]["items"]) == 1
+
+    chorsu = (await client.get("/api/purchases/", params={"market_location": "Chorsu"})).json()
+    assert {b["id"] for b in chorsu} == set(ids[:2])
+    march = (await client.get("/api/purchases/", params={"date_to": "2026-03-31"})).json()
+    assert [b["id"] for b in march] == ids[:1]
+
+    detail = await client.get(f"/api/purchases/{ids[2]}")
+    assert detail.json()["market_location"] == "Alay"
+    assert (await client.get(f"/api/purchases/{uuid4()}")).status_code == 404
+
+
+async def test_spend_aggregates_per_day_stall_and_product(client):
+    product_ids, _ = await _seed(products=2, stores=1)
+    stall = (await client.post("/api/stalls/", json={"name": "Vegetables"})).json()
+    async with TestSessionLocal() as db:
+        product = await db.get(Product, product_ids[0])
+        product.default_stall_id = UUID(stall["id"])
+        await db.commit()
+
+    first = (await client.post("/api/purchases/", json=_batch(product_ids, quantity=2, cost=10000))).json()
+    second = (await client.post("/api/purchases/", json=_batch(product_ids[:1], quantity=1, cost=7000))).json()
+    await _set_purchase_date(first["id"], date(2026, 3, 1))
+    await _set_purchase_date(second["id"], date(2026, 3, 2))
+
+    march = {"date_from": "2026-03-01", "date_to": "2026-03-31"}
+    await client.get("/api/purchases/spend", params=march)  # warm the catalog cache
+    with capture_queries() as captured:
+        spend = (await client.get("/api/purchases/spend", params=march)).json()
+    assert captured.last.count == 3  # one GROUP BY each; names from the catalog cache
+    assert float(spend["total_cost_uzs"]) == 27000.0
+    assert [(d["purchase_date"], d["batch_count"], float(d["total_cost_uzs"])) for d in spend["by_day"]] == [
+        ("2026-03-01", 1, 20000.0), ("2026-03-02", 1, 7000.0),
+    ]
+    assert [(s["stall_name"], float(s["total_cost_uzs"])) for s in spend["by_stall"]] == [
+        ("Vegetables", 17000.0), ("Unassigned", 10000.0),
+    ]
+    assert [(p["product_name"]["en"], float(p["total_quantity"])) for p in spend["by_product"]] == [
+        ("P0", 3.0), ("P1", 2.0),
+    ]
+
+    empty = (await client.get("/api/purchases/spend", params={"date_from": "2026-04-01", "date_to": "2026-04-30"}))
+    assert empty.json()["by_day"] == [] and float(empty.json()["total_cost_uzs"]) == 0
+    bad = await client.get("/api/purchases/spend", params={"date_from": "2026-04-02", "date_to": "2026-04-01"})
+    assert bad.status_code == 400
+
+
+async def test_price_stats_roll_forward_with_each_batch(client, monkeypatch):
+    product_ids, _ = await _seed(products=1, stores=1)
+    pid = product_ids[0]
+    async with TestSessionLocal() as db:
+        await db.execute(ProductPriceStats.__table__.insert().values(
+            product_id=pid, last_price=9000, last_purchased_on=date(2026, 1, 1), avg_price_7d=9000,
+            min_price=4000, max_price=9000, purchase_count=5,
+        ))
+        await db.commit()
+
+    monkeypatch.setattr(price_stats.settings, "price_reference_auto_refresh", True)
+    await client.post("/api/purchases/", json=_batch([pid], quantity=1, cost=5000))
+    await client.post("/api/purchases/", json=_batch([pid], quantity=3, cost=21000))
+
+    async with TestSessionLocal() as db:
+        stats = await db.get(ProductPriceStats, pid)
+        product = await db.get(Product, pid)
+    # Today's two purchases: 26000 for 4 units; history only widens min/max
+    assert (stats.last_price, stats.avg_price_7d) == (Decimal("7000"), Decimal("6500"))
+    assert (stats.min_price, stats.max_price, stats.purchase_count) == (Decimal("4000"), Decimal("9000"), 7)
+    assert product.price_reference == Decimal("6500")
+    products = (await client.get("/api/products/")).json()
+    assert float(next(p for p in products if p["id"] == str(pid))["price_reference"]) == 6500.0
+
+
+async def test_consolidation_shows_expected_cost(client):
+    product_ids, _ = await _seed(products=2, stores=2)
+    await client.post("/api/purchases/", json=_batch(product_ids[:1], quantity=2, cost=12000))
+
+    consolidated = {r["product_id"]: r for r in (await client.get("/api/purchases/consolidation")).json()}
+    bought, unbought = consolidated[str(product_ids[0])], consolidated[str(product_ids[1])]
+    assert (float(bought["expected_unit_price"]), float(bought["expected_cost_uzs"])) == (6000.0, 12000.0)
+    assert unbought["expected_unit_price"] is None and unbought["expected_cost_uzs"] is None
+
+    stalls = (await client.get("/api/purchases/by-stall")).json()
+    items = {i["product_id"]: i for group in stalls for i in group["items"]}
+    assert float(items[str(product_ids[0])]["expected_cost_uzs"]) == 12000.0
+
+
+async def test_consolidation_aggregates_in_sql(client):
+    product_ids, order_ids = await _seed(products=3, stores=2)
+    stall = (await client.post("/api/stalls/", json={"name": "Greens"})).json()
+    async with TestSessionLocal() as db:
+        (await db.get(Product, product_ids[0])).default_stall_id = UUID(stall["id"])
+        first = await db.get(PurchaseOrder, order_ids[0])
+        # A second order from the same store merges into its breakdown line
+        extra = PurchaseOrder(
+            id=uuid4(), store_id=first.store_id, user_id=first.user_id,
+            status=OrderStatus.PENDING, delivery_date=date(2026, 3, 2),
+        )
+        db.add_all([extra, OrderItem(
+            purchase_order_id=extra.id, product_id=product_ids[0], quantity_requested=5, quantity_approved=5,
+        )])
+        await db.flush()
+        await rebuild_consolidation(db)
+        await db.commit()
+
+    with capture_queries() as captured:
+        consolidated = (await client.get("/api/purchases/consolidation")).json()
+    assert captured.last.count > 0
+    row = next(r for r in consolidated if r["product_id"] == str(product_ids[0]))
+    assert [(b["store_name"], float(b["quantity"])) for b in row["breakdown"]] == [("Store 0", 7.0), ("Store 1", 2.0)]
+    assert float(row["total_quantity_needed"]) == 9.0
+
+    stalls = (await client.get("/api/purchases/by-stall", params={"target_date": "2026-03-02"})).json()
+    assert [(g["stall_name"], [float(i["total_quantity"]) for i in g["items"]]) for g in stalls] == [("Greens", [5.0])]
+    stalls = (await client.get("/api/purchases/by-stall")).json()
+    assert [(g["stall_name"], len(g["items"])) for g in stalls] == [("Greens", 1), ("Unassigned", 2)]
+
+
+async def test_consolidation_views_share_one_cached_scan(client):
+    product_ids, _ = await _seed(products=2, stores=1)
+    with capture_queries() as captured:
+        await client.get("/api/purchases/by-stall")
+    assert captured.last.count > 0
+
+    # The product view comes from the same computation; repeats are free
+    with capture_queries() as captured:
+        first = (await client.get("/api/purchases/consolidation")).json()
+        await client.get("/api/purchases/by-stall")
+        await client.get("/api/purchases/consolidation")
+    assert [r.count for r in captured.requests] == [0, 0, 0]
+    assert consolidation_cache.stats()["misses"] == 1
+    assert {r["product_id"] for r in first} == {str(p) for p in product_ids}
+
+    # Another date is its own entry
+    dated = (await client.get("/api/purchases/by-stall", params={"target_date": "2026-01-01"})).json()
+    assert dated == [] and consolidation_cache.stats()["misses"] == 2
+
+    # A demand write invalidates the entry: the purchase shows up on the next read
+    await client.post("/api/purchases/", json=_batch(product_ids[:1], quantity=4, cost=40000))
+    consolidated = (await client.get("/api/purchases/consolidation")).json()
+    assert [r["product_id"] for r in consolidated] == [str(product_ids[1])]
+    assert consolidation_cache.stats()["misses"] == 3
+
+
+async def test_consolidation_lines_follow_every_write_path(client):
+    product_ids, order_ids = await _seed(products=2, stores=1)
+    stores = (await client.get("/api/stores/")).json()
+    store_id = next(s["id"] for s in stores if s["name"] == "Test Store")
+
+    async def assert_consistent():
+        async with TestSessionLocal() as db:
+            assert await check_consolidation(db) == {}
+
+    created = (await client.post("/api/orders/", json={
+        "store_id": store_id, "delivery_date": "2026-03-01",
+        "items": [{"product_id": str(product_ids[0]), "quantity_requested": 3}],
+    })).json()
+    await client.post("/api/orders/bulk", json={"orders": [{
+        "store_id": store_id, "delivery_date": "2026-03-02",
+        "items": [{"product_id": str(product_ids[1]), "quantity_requested": 2}],
+    }]})
+    await assert_consistent()
+    await client.patch("/api/orders/bulk/approvals", json={"items": [
+        {"item_id": created["items"][0]["id"], "quantity_approved": 1.5},
+    ]})
+    await assert_consistent()
+    await client.post("/api/purchases/", json=_batch(product_ids[:1], quantity=2, cost=20000))  # 2 of 3.5
+    await assert_consistent()
+    await client.patch(f"/api/orders/{created['id']}/status", json={"status": "cancelled"})
+    await client.patch("/api/orders/bulk/status", json={"order_ids": [str(order_ids[0])], "status": "cancelled"})
+    await assert_consistent()
+
+    consolidated = (await client.get("/api/purchases/consolidation")).json()
+    assert [(r["product_id"], float(r["total_quantity_needed"])) for r in consolidated] == [(str(product_ids[1]), 2.0)]
+
+
+async def test_rebuild_consolidation_repairs_drift(client):
+    product_ids, _ = await _seed(products=1, stores=1)
+    async with TestSessionLocal() as db:
+        line = (await db.scalars(select(ConsolidationLine))).one()
+        line.quantity = Decimal("99")
+        await db.commit()
+
+        drift = await check_consolidation(db)
+        assert list(drift.values()) == [(Decimal("99"), Decimal("2"))]
+        assert await rebuild_consolidation(db) == 1
+        await db.commit()
+        assert await check_consolidation(db) == {}
+
+
+# --- PostgreSQL: advisory locks, FOR UPDATE and conflict retries for real ---
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+async def pg_session_factory():
+    """Sessions on a throwaway PostgreSQL database (TEST_DATABASE_URL); its tables are dropped afterwards."""
+    engine = create_async_engine(TEST_DATABASE_URL, pool_size=12)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.mark.postgres
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="needs TEST_DATABASE_URL (PostgreSQL)")
+async def test_concurrent_batches_never_over_allocate_on_postgres(pg_session_factory):
+    """Concurrent submissions on separate sessions: no item gets more than approved, ledger == totals."""
+    async with pg_session_factory() as db:
+        user = User(id=uuid4(), telegram_id=1, username="pg", role=UserRole.GLOBAL_PURCHASER)
+        category = Category(id=uuid4(), name_i18n={"en": "Vegetables"})
+        product_ids = [uuid4() for _ in range(3)]
+        db.add_all([user, category])
+        db.add_all([
+            Product(id=pid, category_id=category.id, name_i18n={"en": f"P{i}"}, unit_i18n={"en": "kg"})
+            for i, pid in enumerate(product_ids)
+        ])
+        await db.flush()
+        for s in range(5):
+            store = Store(id=uuid4(), name=f"Store {s}")
+            order = PurchaseOrder(
+                id=uuid4(), store_id=store.id, user_id=user.id,
+                status=OrderStatus.APPROVED, delivery_date=date(2026, 3, 1),
+            )
+            db.add(store)
+            await db.flush()
+            db.add(order)
+            await db.flush()
+            db.add_all([
+                OrderItem(purchase_order_id=order.id, product_id=pid, quantity_requested=2, quantity_approved=2)
+                for pid in product_ids
+            ])
+        await db.flush()
+        await rebuild_consolidation(db)
+        await db.commit()
+
+    async def submit(i: int):
+        # Overlapping product sets in different orders, 3 units each: far more than the 10 approved
+        lines = product_ids[i % 3:] + product_ids[:i % 3]
+        batch = schemas.BatchCreate(market_location="Chorsu", items=[
+            schemas.BatchItemInput(product_id=pid, total_quantity_bought=3, total_cost_uzs=30000 + i)
+            for pid in lines[:2 + i % 2]
+        ])
+        async with pg_session_factory() as db:
+            return await submit_purchase_batch(db, user, batch)
+
+    batches = await asyncio.gather(*[submit(i) for i in range(10)])
+    assert len({b.id for b in batches}) == 10
+
+    async with pg_session_factory() as db:
+        ledger = dict((await db.execute(
+            select(AllocationEntry.order_item_id, func.sum(AllocationEntry.quantity))
+            .group_by(AllocationEntry.order_item_id)
+        )).all())
+        items = (await db.scalars(select(OrderItem))).all()
+        for item in items:
+            allocated = ledger.get(item.id, Decimal("0"))
+            assert allocated <= item.quantity_approved
+            assert allocated == (item.quantity_fulfilled or Decimal("0"))
+        assert sum(ledger.values()) == sum(item.quantity_approved for item in items)  # 30 units bought
+        assert await check_consolidation(db) == {}
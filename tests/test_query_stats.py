@@ -0,0 +1,35 @@
+"""Tests for per-request SQL accounting (app.query_stats)."""
+from app.query_stats import QueryStats, capture_queries, normalize_sql
+
+
+def test_normalize_sql_collapses_literals_and_lists():
+    a = normalize_sql("SELECT * FROM t WHERE id IN ($1::UUID, $2::UUID) AND qty > 5")
+    b = normalize_sql("SELECT * FROM t WHERE id IN ($1::UUID) AND qty > 7")
+    assert a == b == "SELECT * FROM t WHERE id IN (?) AND qty > ?"
+
+
+def test_repeated_shapes_flagged():
+    stats = QueryStats()
+    for i in range(6):
+        stats.record(f"SELECT * FROM orders WHERE id = {i}", 0.001)
+    stats.record("SELECT 1", 0.001)
+
+    assert stats.count == 7
+    assert stats.repeated(5) == {"SELECT * FROM orders WHERE id = ?": 6}
+    assert stats.repeated(0) == {}
+
+
+async def test_server_timing_header(client):
+    response = await client.get("/api/stores/")
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+
+
+async def test_list_stores_query_budget(client):
+    with capture_queries() as captured:
+        await client.get("/api/stores/")
+        await client.get("/api/stores/")
+
+    assert len(captured.requests) == 2
+    assert captured.requests[0].count <= 3  # version sync + versions + rows
+    assert captured.last.count == 0  # served from the catalog cache
@@ -0,0 +1,48 @@
+"""Cold-start regression checks, run in a fresh interpreter."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Imports the app from scratch, serves one request, prints the startup report.
+_COLD_START_SCRIPT = """
+import asyncio, json, sys
+from httpx import ASGITransport, AsyncClient
+import app.main
+from app.config import get_settings
+from app.startup import startup_timer
+
+async def first_request():
+    transport = ASGITransport(app=app.main.app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        return (await client.get("/metrics")).status_code
+
+status = asyncio.run(first_request())
+report = startup_timer.report(budget_ms=get_settings().cold_start_budget_ms)
+print(json.dumps({"status": status, "openai_loaded": "openai" in sys.modules, **report}))
+"""
+
+
+def _cold_start() -> dict:
+    env = {**os.environ, "DATABASE_URL": "sqlite+aiosqlite://", "APP_ENV": "testing"}
+    out = subprocess.run(
+        [sys.executable, "-c", _COLD_START_SCRIPT],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_cold_start_within_budget():
+    report = _cold_start()
+
+    assert report["status"] == 200
+    assert report["openai_loaded"] is False, "openai must be imported lazily"
+    step_names = {s["name"] for s in report["steps"]}
+    assert "import app.routers.orders" in step_names
+    assert report["within_budget"], (
+        f"cold start to first response took {report['first_response_ms']} ms "
+        f"(budget {report['budget_ms']} ms)"
+    )
@@ -0,0 +1,65 @@
+"""Tests for the System API (/api/system/) and engine configuration."""
+import pytest
+
+from app import database
+
+
+async def test_pool_stats(client):
+    """GET /api/system/pool reports the live pool status."""
+    response = await client.get("/api/system/pool")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["primary"]["pool_class"]
+    assert "status" in data["primary"]
+    assert data["replica"] is None  # no DATABASE_READ_URL in tests
+
+
+@pytest.mark.parametrize("mode,url,expected", [
+    ("auto", "postgresql+asyncpg://u:p@ep-cool-1234-pooler.eu-central-1.aws.neon.tech/db", True),
+    ("auto", "postgresql+asyncpg://u:p@localhost:6432/db", True),
+    ("auto", "postgresql+asyncpg://u:p@ep-cool-1234.eu-central-1.aws.neon.tech/db", False),
+    ("transaction", "postgresql+asyncpg://u:p@localhost/db", True),
+    ("session", "postgresql+asyncpg://u:p@ep-x-pooler.neon.tech/db", False),
+])
+def test_transaction_pooler_detection(monkeypatch, mode, url, expected):
+    monkeypatch.setattr(database.settings, "db_pool_mode", mode)
+    assert database._is_transaction_pooler(url) is expected
+
+
+def test_transaction_pooler_disables_statement_caches(monkeypatch):
+    monkeypatch.setattr(database.settings, "db_pool_mode", "transaction")
+    connect_args: dict = {}
+    options = database._engine_options("postgresql+asyncpg://u:p@localhost/db", connect_args)
+
+    assert options["poolclass"] is database.InstrumentedQueuePool
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    assert callable(connect_args["prepared_statement_name_func"])
+
+
+def test_listen_url_bypasses_transaction_pooler(monkeypatch):
+    """Behind a pooler, LISTEN (version sync, events) runs on DATABASE_LISTEN_URL."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    from app.services.versions import VersionSync
+
+    pooled = create_async_engine("postgresql+asyncpg://u:p@ep-x-pooler.neon.tech/db")
+    direct = create_async_engine("postgresql+asyncpg://u:p@ep-x.neon.tech/db", poolclass=NullPool)
+    monkeypatch.setattr(database.settings, "db_pool_mode", "auto")
+    monkeypatch.setattr(database, "engine", pooled)
+    monkeypatch.setattr(database, "listen_engine", pooled)
+    assert VersionSync(target=pooled).mode == "poll"
+
+    monkeypatch.setattr(database, "listen_engine", direct)
+    assert VersionSync(target=direct).mode == "listen"
+    assert not database.supports_listen(pooled)
+
+
+async def test_read_only_session_refuses_writes():
+    from tests.conftest import TestReadSessionLocal
+    from app.models import Store
+
+    async with TestReadSessionLocal() as db:
+        db.add(Store(name="Should Not Persist"))
+        with pytest.raises(RuntimeError):
+            await db.flush()